@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+API Startup Check
+=================
+Imports the API in a fresh interpreter and fails if that loads one of the
+ML libraries or takes longer than the time budget. The ML libraries are
+only needed by worker.py and process_video.py; an API process that
+imports them takes seconds longer to start.
+
+Usage:
+    python check_startup.py [--budget 1.0] [--runs 3]
+
+Run it from the backend directory, next to main.py. Exits with status 1
+when the check fails, so it can gate CI.
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+
+# Modules the API process must not import
+HEAVY_MODULES = ("torch", "torchvision", "ultralytics", "mediapipe", "cv2", "onnxruntime", "openvino")
+
+DEFAULT_BUDGET_SECONDS = 1.0
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "heavy": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure() -> dict:
+    """Import time and heavy modules loaded by one fresh API import"""
+    result = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the API failed: {result.stderr.strip()[-500:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the API starts without loading ML libraries.')
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=DEFAULT_BUDGET_SECONDS,
+        help=f'Maximum seconds to import the API (default: {DEFAULT_BUDGET_SECONDS})'
+    )
+    parser.add_argument(
+        '--runs',
+        type=int,
+        default=3,
+        help='Imports to measure; the fastest counts, to ignore a cold disk cache (default: 3)'
+    )
+    args = parser.parse_args()
+
+    results = [measure() for _ in range(max(1, args.runs))]
+    seconds = min(result["seconds"] for result in results)
+    heavy = sorted({name for result in results for name in result["heavy"]})
+
+    print(f"API import: {seconds:.3f}s (budget {args.budget:.3f}s)")
+    failed = False
+    if heavy:
+        print(f"FAIL: the API imports ML libraries: {', '.join(heavy)}")
+        failed = True
+    if seconds > args.budget:
+        print("FAIL: the API import is over budget")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
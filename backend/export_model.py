@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Detector Export and Parity Check
+================================
+Exports the YOLOv8 weights to ONNX for the CPU backends of process_video.py
+and worker.py (--backend onnxruntime / openvino), optionally quantized to
+int8 with activation ranges calibrated on frames of a video. It then runs
+the PyTorch model and every exported backend on sampled frames of the
+video, reports how closely their detections agree and how fast each one
+is, and fails when a backend drifts too far from PyTorch.
+
+Usage:
+    python export_model.py --video sample.mp4 [--weights yolov8n.pt] [--int8]
+        [--backends onnxruntime openvino] [--threads 4] [--frames 100]
+
+Writes yolov8n.onnx (and yolov8n.int8.onnx) next to the weights, each with
+a .json sidecar holding the class names. Exits with status 1 when a backend
+is below the agreement thresholds, so it can gate a model upgrade in CI.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List, Any
+
+import cv2
+import numpy as np
+
+from services.inference import (
+    BACKENDS, INPUT_SIZE, CALIBRATION_FRAMES, export_onnx, quantize_int8
+)
+from services.tracking import iou_matrix
+from process_video import ObjectDetector
+
+# A detection matches a PyTorch one of the same label above this overlap
+MATCH_IOU = 0.5
+
+# Minimum F1 of matched detections and mean IoU of matched boxes. int8
+# rounds activations, so its boxes move by a pixel or two and detections
+# near the confidence threshold come and go.
+THRESHOLDS = {
+    False: {"agreement": 0.95, "iou": 0.95},
+    True: {"agreement": 0.85, "iou": 0.85},
+}
+
+
+def sample_frames(video_path: Path, count: int) -> List[np.ndarray]:
+    """Decode count frames spread evenly over the video"""
+    cap = cv2.VideoCapture(str(video_path))
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    try:
+        for frame_num in np.linspace(0, max(0, total - 1), num=min(count, max(1, total)), dtype=int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_num))
+            ok, frame = cap.read()
+            if ok:
+                frames.append(frame)
+    finally:
+        cap.release()
+    return frames
+
+
+def run_detector(detector, frames: List[np.ndarray]) -> Dict[str, Any]:
+    """Detections of every frame and the mean time per frame, after one warm-up batch"""
+    batch_size = detector.batch_size
+    detector.detect_objects_batch(frames[:batch_size])
+
+    detections = []
+    started = time.perf_counter()
+    for start in range(0, len(frames), batch_size):
+        detections.extend(detector.detect_objects_batch(frames[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+    return {"detections": detections, "ms_per_frame": 1000 * elapsed / max(1, len(frames))}
+
+
+def compare(reference: List[List[Dict]], candidate: List[List[Dict]]) -> Dict[str, float]:
+    """How closely candidate detections agree with the reference ones.
+
+    Detections are matched greedily by IoU within each label. Agreement is
+    the F1 score of the matches, so both missed and extra boxes lower it.
+    """
+    matched, reference_count, candidate_count = 0, 0, 0
+    ious, confidence_deltas = [], []
+
+    for expected, actual in zip(reference, candidate):
+        reference_count += len(expected)
+        candidate_count += len(actual)
+        for label in {obj['label'] for obj in expected}:
+            ref = [obj for obj in expected if obj['label'] == label]
+            cand = [obj for obj in actual if obj['label'] == label]
+            if not cand:
+                continue
+            overlap = iou_matrix(np.array([obj['bbox'] for obj in ref]), np.array([obj['bbox'] for obj in cand]))
+            while overlap.size and overlap.max() >= MATCH_IOU:
+                i, j = np.unravel_index(overlap.argmax(), overlap.shape)
+                matched += 1
+                ious.append(float(overlap[i, j]))
+                confidence_deltas.append(abs(ref[i]['confidence'] - cand[j]['confidence']))
+                overlap[i, :] = 0
+                overlap[:, j] = 0
+
+    total = reference_count + candidate_count
+    return {
+        "agreement": 2 * matched / total if total else 1.0,
+        "iou": float(np.mean(ious)) if ious else (1.0 if not total else 0.0),
+        "max_confidence_delta": max(confidence_deltas, default=0.0),
+        "reference_detections": reference_count,
+        "detections": candidate_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the object detector and check it against PyTorch.')
+    parser.add_argument('--video', required=True, help='Video to calibrate int8 and to compare detections on')
+    parser.add_argument('--weights', default='yolov8n.pt', help='YOLOv8 weights to export (default: yolov8n.pt)')
+    parser.add_argument('--int8', action='store_true', help='Also write and check an int8 quantized model')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS[1:], default=list(BACKENDS[1:]),
+                        help='Backends to check (default: onnxruntime openvino)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='Intra-op threads of every backend, for comparable timings (default: all cores)')
+    parser.add_argument('--frames', type=int, default=100, help='Frames sampled from the video (default: 100)')
+    parser.add_argument('--batch-size', type=int, default=8, help='Frames per detector call (default: 8)')
+    parser.add_argument('--imgsz', type=int, default=INPUT_SIZE, help=f'Model input size (default: {INPUT_SIZE})')
+    args = parser.parse_args()
+
+    video_path = Path(args.video)
+    if not video_path.exists():
+        print(f"Error: Video file not found: {video_path}")
+        sys.exit(1)
+
+    print(f"Exporting {args.weights} to ONNX...")
+    models = [(export_onnx(args.weights, args.imgsz), False)]
+    if args.int8:
+        print(f"Calibrating int8 on {CALIBRATION_FRAMES} frames of {video_path}...")
+        models.append((quantize_int8(models[0][0], sample_frames(video_path, CALIBRATION_FRAMES)), True))
+    for model_path, _ in models:
+        print(f"  Wrote {model_path}")
+
+    frames = sample_frames(video_path, args.frames)
+    print(f"Comparing detections on {len(frames)} frames...")
+
+    reference_detector = ObjectDetector(args.batch_size, 'torch', args.weights, args.threads)
+    if reference_detector.model is None:
+        print("Error: the PyTorch model could not be loaded; install ultralytics and torch")
+        sys.exit(1)
+    reference = run_detector(reference_detector, frames)
+    print(f"  {'torch':<12} {'fp32':<5} {reference['ms_per_frame']:8.1f} ms/frame")
+
+    failed = False
+    for backend in args.backends:
+        for model_path, int8 in models:
+            precision = 'int8' if int8 else 'fp32'
+            try:
+                detector = ObjectDetector(args.batch_size, backend, str(model_path), args.threads)
+            except RuntimeError as e:
+                print(f"  {backend:<12} {precision:<5} not available: {e.__cause__}")
+                continue
+
+            result = run_detector(detector, frames)
+            parity = compare(reference['detections'], result['detections'])
+            thresholds = THRESHOLDS[int8]
+            passed = all(parity[name] >= minimum for name, minimum in thresholds.items())
+            failed = failed or not passed
+            print(
+                f"  {backend:<12} {precision:<5} {result['ms_per_frame']:8.1f} ms/frame "
+                f"({reference['ms_per_frame'] / max(result['ms_per_frame'], 1e-9):.2f}x)  "
+                f"agreement {parity['agreement']:.3f}  box IoU {parity['iou']:.3f}  "
+                f"max conf delta {parity['max_confidence_delta']:.3f}  "
+                f"{'ok' if passed else 'FAILED'}"
+            )
+
+    if failed:
+        print("Some backends disagree with PyTorch beyond the thresholds")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
 import json
@@ -10,12 +9,14 @@ import uuid
 import shutil
 from pathlib import Path
 import asyncio
-from concurrent.futures import ProcessPoolExecutor
 
-from routes.upload import router as upload_router
+from routes.upload import router as upload_router, video_media_type
 from routes.extract import router as extract_router
 from routes.annotations import router as annotations_router
 from routes.export import router as export_router
+from routes.render import router as render_router
+from services.byte_range import ranged_file_response
+from services.chunked_upload import ALLOWED_EXTENSIONS
 
 app = FastAPI(title="HumanoSync API", version="1.0.0")
 
@@ -36,9 +37,15 @@ app.include_router(upload_router, prefix="/api")
 app.include_router(extract_router, prefix="/api")
 app.include_router(annotations_router, prefix="/api")
 app.include_router(export_router, prefix="/api")
-
-# Serve uploaded videos
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.include_router(render_router, prefix="/api")
+
+# Serve uploaded videos, with Range requests so players can seek
+@app.get("/uploads/{filename}")
+async def get_upload_file(filename: str, request: Request):
+    video_path = Path("uploads") / filename
+    if video_path.suffix.lower() not in ALLOWED_EXTENSIONS or not video_path.is_file():
+        raise HTTPException(status_code=404, detail="Not Found")
+    return ranged_file_response(request, video_path, video_media_type(video_path))
 
 @app.get("/")
 async def root():
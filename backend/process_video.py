@@ -7,6 +7,9 @@ Processes video files to extract pose, object, and action data for robot trainin
 Usage:
     python process_video.py --video path/to/video.mp4 [--output output_dir]
 
+Long videos are processed in checkpointed chunks; rerunning the same command
+after a crash resumes from the last finished chunk.
+
 Author: HumanoSync
 Date: 2025
 """
@@ -14,13 +17,32 @@ Date: 2025
 import os
 import sys
 import json
+import shutil
+import bisect
+import tempfile
+import time
 import argparse
+import subprocess
+import multiprocessing
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Callable
 import numpy as np
 import cv2
 
+from services.pose_store import LANDMARK_NAMES, LANDMARK_INDEX, pose_to_records, save_pose_records
+from services.pose_window import PoseWindow, keypoints_to_array
+from services.frame_index import build_objects_index, build_actions_index
+from services.job_queue import JobQueue, DEFAULT_DB_PATH
+from services.sampling import MotionSampler, thumbnail, DEFAULT_MOTION_THRESHOLD
+from services.tracking import track_objects
+from services.frames import PrefetchDecoder
+from services.renditions import (
+    PROXY_FILE, SPRITES_FILE, start_proxy, finish_proxy, cancel_proxy, make_sprites
+)
+from services.inference import BACKENDS, DEFAULT_BACKEND, OnnxDetector, set_torch_threads
+
 # ML Libraries
 try:
     import mediapipe as mp
@@ -40,6 +62,129 @@ except ImportError:
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+RIGHT_WRIST = LANDMARK_INDEX['right_wrist']
+RIGHT_SHOULDER = LANDMARK_INDEX['right_shoulder']
+RIGHT_HIP = LANDMARK_INDEX['right_hip']
+LEFT_HIP = LANDMARK_INDEX['left_hip']
+
+# Frames processed between checkpoints (30 seconds at 30fps)
+DEFAULT_CHUNK_SIZE = 900
+CHECKPOINT_DIR = 'checkpoints'
+
+# Object detection runs on every OBJECT_STRIDE-th frame while the scene
+# moves; in static stretches both detectors are refreshed at least this often
+OBJECT_STRIDE = 5
+POSE_MAX_GAP = 10
+OBJECT_MAX_GAP = 30
+
+# Pipeline stages timed for progress reports
+STAGES = ('decode', 'pose', 'objects', 'actions')
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+
+def _write_json_atomic(path: Path, data: Any, indent: Optional[int] = None):
+    """Write a JSON file so that readers never see a partial file.
+
+    The file is replaced rather than rewritten in place, which also keeps
+    hard links to the previous version (see services/result_cache.py) intact.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def probe_keyframes(video_path: str, fps: float) -> Optional[List[int]]:
+    """
+    Find the frame numbers of the video's keyframes with ffprobe.
+    
+    Returns:
+        Sorted keyframe numbers, or None if ffprobe is unavailable or fails
+    """
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+             '-show_entries', 'frame=pts_time', '-of', 'csv=p=0', video_path],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.debug(f"Keyframe probe failed: {e}")
+        return None
+    
+    keyframes = set()
+    for line in result.stdout.split():
+        try:
+            keyframes.add(int(round(float(line.strip(',')) * fps)))
+        except ValueError:
+            continue
+    return sorted(keyframes) or None
+
+
+# Models of a chunk worker process, loaded once by _init_chunk_worker
+_chunk_models: Dict[str, Any] = {}
+
+
+def _init_chunk_worker(batch_size: int = 8, detector_options: Optional[Dict[str, Any]] = None):
+    """
+    Prepare a chunk process: one thread, so N processes use N cores, and
+    models loaded once for every chunk the process will run.
+    """
+    cv2.setNumThreads(1)
+    _chunk_models['pose'] = PoseExtractor()
+    _chunk_models['objects'] = ObjectDetector(batch_size=batch_size, **{**(detector_options or {}), 'threads': 1})
+
+
+def chunk_executor(workers: int, batch_size: int = 8,
+                   detector_options: Optional[Dict[str, Any]] = None) -> ProcessPoolExecutor:
+    """
+    Create a pool of chunk processes with warm models.
+    
+    Pass it to several VideoProcessor instances to keep the processes and
+    their models across videos.
+    
+    Args:
+        workers: Number of chunk processes
+        batch_size: Frames per object detection call
+        detector_options: backend and model_path for the ObjectDetector of
+            every process, as in ObjectDetector.options
+    """
+    # Spawned workers do not inherit the model state of this process
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_chunk_worker,
+        initargs=(batch_size, detector_options)
+    )
+
+
+def _run_chunk(video_path: str, output_dir: str, batch_size: int, motion_threshold: float,
+               index: int, start: int, end: Optional[int], total_frames: int,
+               previous_start: Optional[int] = None):
+    """
+    Process and checkpoint one chunk in a worker process.
+    
+    Returns:
+        Number of frames processed and seconds spent per stage
+    """
+    processor = VideoProcessor(
+        video_path, output_dir, batch_size=batch_size, motion_threshold=motion_threshold,
+        pose_extractor=_chunk_models.get('pose'), object_detector=_chunk_models.get('objects')
+    )
+    # Start from a clean tracking state, as a freshly loaded model would
+    processor.pose_extractor.reset()
+    cap = cv2.VideoCapture(video_path)
+    try:
+        processor._process_chunk(cap, index, start, end, total_frames, previous_start)
+    finally:
+        cap.release()
+    return {'frames': processor._frames_done, 'stage_seconds': processor.stage_seconds}
+
 
 class PoseExtractor:
     """Extract pose keypoints from video frames using MediaPipe."""
@@ -78,21 +223,9 @@ class PoseExtractor:
                 confidences = []
                 
                 # MediaPipe provides 33 pose landmarks
-                landmark_names = [
-                    'nose', 'left_eye_inner', 'left_eye', 'left_eye_outer',
-                    'right_eye_inner', 'right_eye', 'right_eye_outer',
-                    'left_ear', 'right_ear', 'mouth_left', 'mouth_right',
-                    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
-                    'left_wrist', 'right_wrist', 'left_pinky', 'right_pinky',
-                    'left_index', 'right_index', 'left_thumb', 'right_thumb',
-                    'left_hip', 'right_hip', 'left_knee', 'right_knee',
-                    'left_ankle', 'right_ankle', 'left_heel', 'right_heel',
-                    'left_foot_index', 'right_foot_index'
-                ]
-                
                 for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                    if idx < len(landmark_names):
-                        keypoints[landmark_names[idx]] = [
+                    if idx < len(LANDMARK_NAMES):
+                        keypoints[LANDMARK_NAMES[idx]] = [
                             landmark.x * frame.shape[1],  # Convert to pixel coordinates
                             landmark.y * frame.shape[0],
                             landmark.z  # Depth coordinate
@@ -133,6 +266,11 @@ class PoseExtractor:
             'confidence': 0.95
         }
     
+    def reset(self):
+        """Forget the tracking state so the next frame is treated as the first of a video."""
+        if MEDIAPIPE_AVAILABLE and self.pose:
+            self.pose.reset()
+    
     def close(self):
         """Clean up resources."""
         if MEDIAPIPE_AVAILABLE and self.pose:
@@ -142,18 +280,52 @@ class PoseExtractor:
 class ObjectDetector:
     """Detect objects in video frames using YOLOv8."""
     
-    def __init__(self):
-        """Initialize YOLOv8 object detection model."""
-        if YOLO_AVAILABLE:
+    def __init__(self, batch_size: int = 8, backend: str = DEFAULT_BACKEND,
+                 model_path: Optional[str] = None, threads: Optional[int] = None):
+        """
+        Initialize YOLOv8 object detection model.
+        
+        Args:
+            batch_size: Number of frames grouped into a single model call
+            backend: 'torch' to run the weights with ultralytics, or
+                'onnxruntime' / 'openvino' to run a model exported with
+                export_model.py on that CPU runtime
+            model_path: Weights for torch or ONNX model for the other
+                backends (default: yolov8n.pt / yolov8n.onnx)
+            threads: Intra-op threads of the model (default: all cores)
+        
+        Raises:
+            RuntimeError: If the model cannot be loaded on an ONNX backend;
+                only the torch backend falls back to mock detections
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
+        self.batch_size = max(1, batch_size)
+        self.backend = backend
+        self.model_path = model_path or ('yolov8n.pt' if backend == 'torch' else 'yolov8n.onnx')
+        self.model = None
+        self.runtime = None
+        
+        if backend != 'torch':
+            # An explicitly chosen backend must not fall back to mock detections
+            try:
+                self.runtime = OnnxDetector(self.model_path, backend, threads)
+            except Exception as e:
+                raise RuntimeError(f"Failed to load {self.model_path} on {backend}: {e}") from e
+            logger.info(f"YOLOv8 model {self.model_path} loaded on {backend}")
+        elif YOLO_AVAILABLE:
+            set_torch_threads(threads)
             try:
                 # Load YOLOv8 model (will download if not present)
-                self.model = YOLO('yolov8n.pt')  # Using nano model for speed
+                self.model = YOLO(self.model_path)  # Nano model by default, for speed
                 logger.info("YOLOv8 model loaded successfully")
             except Exception as e:
                 logger.warning(f"Failed to load YOLOv8: {e}")
-                self.model = None
-        else:
-            self.model = None
+    
+    @property
+    def options(self) -> Dict[str, Any]:
+        """Backend and model, to load the same detector in another process"""
+        return {'backend': self.backend, 'model_path': self.model_path}
     
     def detect_objects(self, frame: np.ndarray) -> List[Dict[str, Any]]:
         """
@@ -165,30 +337,51 @@ class ObjectDetector:
         Returns:
             List of detected objects with bounding boxes and labels
         """
-        if YOLO_AVAILABLE and self.model:
-            results = self.model(frame, verbose=False)
-            detections = []
-            
-            for r in results:
-                if r.boxes is not None:
-                    for box in r.boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = float(box.conf[0])
-                        class_id = int(box.cls[0])
-                        
-                        # Get class name from model
-                        class_name = self.model.names[class_id]
-                        
-                        detections.append({
-                            'label': class_name,
-                            'bbox': [float(x1), float(y1), float(x2), float(y2)],
-                            'confidence': confidence
-                        })
+        return self.detect_objects_batch([frame])[0]
+    
+    def detect_objects_batch(self, frames: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """
+        Detect objects in several frames with a single model call.
+        
+        Args:
+            frames: Input video frames as numpy arrays
             
-            return detections
+        Returns:
+            One list of detected objects per input frame, in input order
+        """
+        if not frames:
+            return []
+        
+        if self.runtime is not None:
+            return self.runtime(frames)
+        
+        if YOLO_AVAILABLE and self.model:
+            results = self.model(frames, verbose=False)
+            return [self._parse_result(r) for r in results]
         
         # Mock data if YOLO not available
-        return self._mock_detections(frame)
+        return [self._mock_detections(frame) for frame in frames]
+    
+    def _parse_result(self, result) -> List[Dict[str, Any]]:
+        """Convert one YOLOv8 result into a list of detections."""
+        detections = []
+        
+        if result.boxes is not None:
+            for box in result.boxes:
+                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                confidence = float(box.conf[0])
+                class_id = int(box.cls[0])
+                
+                # Get class name from model
+                class_name = self.model.names[class_id]
+                
+                detections.append({
+                    'label': class_name,
+                    'bbox': [float(x1), float(y1), float(x2), float(y2)],
+                    'confidence': confidence
+                })
+        
+        return detections
     
     def _mock_detections(self, frame: np.ndarray) -> List[Dict[str, Any]]:
         """Generate mock object detections for testing."""
@@ -215,8 +408,8 @@ class ActionRecognizer:
     
     def __init__(self):
         """Initialize action recognition."""
-        self.pose_buffer = []
         self.buffer_size = 30  # 1 second at 30fps
+        self.pose_window = PoseWindow(self.buffer_size)
         self.actions_detected = []
         
     def add_pose(self, frame_num: int, keypoints: Dict[str, List[float]]):
@@ -227,14 +420,8 @@ class ActionRecognizer:
             frame_num: Current frame number
             keypoints: Pose keypoints for the frame
         """
-        self.pose_buffer.append({
-            'frame': frame_num,
-            'keypoints': keypoints
-        })
-        
-        # Keep only recent poses
-        if len(self.pose_buffer) > self.buffer_size:
-            self.pose_buffer.pop(0)
+        # The window keeps only recent poses, overwriting the oldest in place
+        self.pose_window.push(frame_num, keypoints_to_array(keypoints))
     
     def recognize_action(self) -> Optional[str]:
         """
@@ -243,7 +430,7 @@ class ActionRecognizer:
         Returns:
             Detected action label or None
         """
-        if len(self.pose_buffer) < 10:
+        if len(self.pose_window) < 10:
             return None
         
         # Extract features from pose sequence
@@ -275,56 +462,37 @@ class ActionRecognizer:
             return 'stand'
     
     def _analyze_movements(self) -> Dict[str, bool]:
-        """Analyze movement patterns from pose buffer."""
-        if not self.pose_buffer:
+        """
+        Analyze movement patterns from the pose window.
+        
+        Missing keypoints are NaN, and every comparison against NaN is False,
+        so a movement is only detected from keypoints that are present.
+        """
+        if not len(self.pose_window):
             return {'arm_raised': False, 'walking': False, 'reaching': False, 
                    'picking': False, 'sitting': False}
         
-        # Get first and last poses for comparison
-        first_pose = self.pose_buffer[0]['keypoints']
-        last_pose = self.pose_buffer[-1]['keypoints']
-        
-        movements = {}
+        # Compare the newest pose with the oldest one in the window
+        last_pose = self.pose_window.last
+        displacement = self.pose_window.displacement()
         
-        # Check if arm is raised (waving)
-        if 'right_wrist' in last_pose and 'right_shoulder' in last_pose:
-            wrist_y = last_pose['right_wrist'][1]
-            shoulder_y = last_pose['right_shoulder'][1]
-            movements['arm_raised'] = wrist_y < shoulder_y - 50
-        else:
-            movements['arm_raised'] = False
-        
-        # Check for walking (hip movement)
-        if 'left_hip' in first_pose and 'left_hip' in last_pose:
-            hip_movement = abs(first_pose['left_hip'][0] - last_pose['left_hip'][0])
-            movements['walking'] = hip_movement > 30
-        else:
-            movements['walking'] = False
+        right_wrist = last_pose[RIGHT_WRIST]
+        right_shoulder = last_pose[RIGHT_SHOULDER]
+        right_hip = last_pose[RIGHT_HIP]
+        left_hip_movement = displacement[LEFT_HIP]
         
-        # Check for reaching (arm extension)
-        if 'right_wrist' in last_pose and 'right_shoulder' in last_pose:
-            wrist_x = last_pose['right_wrist'][0]
-            shoulder_x = last_pose['right_shoulder'][0]
-            movements['reaching'] = abs(wrist_x - shoulder_x) > 100
-        else:
-            movements['reaching'] = False
-        
-        # Check for picking (hand lowered)
-        if 'right_wrist' in last_pose and 'right_hip' in last_pose:
-            wrist_y = last_pose['right_wrist'][1]
-            hip_y = last_pose['right_hip'][1]
-            movements['picking'] = wrist_y > hip_y + 50
-        else:
-            movements['picking'] = False
-        
-        # Check for sitting (hip lowered)
-        if 'left_hip' in first_pose and 'left_hip' in last_pose:
-            hip_drop = last_pose['left_hip'][1] - first_pose['left_hip'][1]
-            movements['sitting'] = hip_drop > 50
-        else:
-            movements['sitting'] = False
-        
-        return movements
+        return {
+            # Arm raised above the shoulder (waving)
+            'arm_raised': bool(right_wrist[1] < right_shoulder[1] - 50),
+            # Hip moved sideways (walking)
+            'walking': bool(abs(left_hip_movement[0]) > 30),
+            # Arm extended away from the body (reaching)
+            'reaching': bool(abs(right_wrist[0] - right_shoulder[0]) > 100),
+            # Hand lowered below the hip (picking)
+            'picking': bool(right_wrist[1] > right_hip[1] + 50),
+            # Hip lowered (sitting)
+            'sitting': bool(left_hip_movement[1] > 50)
+        }
     
     def get_action_segments(self) -> List[Dict[str, Any]]:
         """
@@ -363,33 +531,106 @@ class ActionRecognizer:
 
 
 class VideoProcessor:
-    """Main video processing pipeline."""
+    """Main video processing pipeline.
+    
+    The video is processed in chunks of consecutive frames. Each finished
+    chunk is checkpointed to disk, so a run that crashes or is killed
+    resumes after the last finished chunk instead of starting over. With
+    several workers, chunks are processed in parallel processes and
+    stitched together once all of them are done.
+    
+    Loading the models takes seconds, so long-lived callers such as
+    worker.py pass in extractors and a chunk executor that they keep warm
+    across videos. Injected models and executors are left open.
+    """
     
-    def __init__(self, video_path: str, output_dir: str = 'output'):
+    def __init__(self, video_path: str, output_dir: str = 'output', batch_size: int = 8,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1,
+                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 motion_threshold: float = DEFAULT_MOTION_THRESHOLD,
+                 tracking: bool = True,
+                 renditions: bool = True,
+                 pose_extractor: Optional['PoseExtractor'] = None,
+                 object_detector: Optional['ObjectDetector'] = None,
+                 executor: Optional[ProcessPoolExecutor] = None,
+                 detector_options: Optional[Dict[str, Any]] = None):
         """
         Initialize video processor.
         
         Args:
             video_path: Path to input video file
             output_dir: Directory to save output files
+            batch_size: Number of sampled frames per object detection call,
+                unless object_detector is given
+            chunk_size: Number of frames processed between checkpoints
+            workers: Number of processes that process chunks in parallel
+            progress_callback: Called about once a second with a progress report
+            motion_threshold: Fraction of changed pixels below which the
+                detectors are skipped and their last results reused; 0 runs
+                them on every frame
+            tracking: Link detections into tracks with ids and fill the
+                frames between detector runs with interpolated boxes
+            renditions: Encode a low-resolution proxy and a thumbnail sprite
+                sheet for scrubbing the video in the browser
+            pose_extractor: Loaded pose model to use instead of loading one
+            object_detector: Loaded object detector to use instead of loading one
+            executor: Pool from chunk_executor() for parallel chunks, instead
+                of starting processes for this video only
+            detector_options: backend, model_path and threads of the
+                ObjectDetector, unless object_detector is given
         """
         self.video_path = video_path
         self.output_dir = Path(output_dir)
-        self.output_dir.mkdir(exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = max(1, chunk_size)
+        self.workers = max(1, workers)
+        self.checkpoint_dir = self.output_dir / CHECKPOINT_DIR
         
-        # Initialize components
-        self.pose_extractor = PoseExtractor()
-        self.object_detector = ObjectDetector()
+        # Initialize components, loading the models that were not passed in
+        self._owns_pose_extractor = pose_extractor is None
+        self.pose_extractor = pose_extractor or PoseExtractor()
+        self.object_detector = object_detector or ObjectDetector(batch_size=batch_size, **(detector_options or {}))
         self.action_recognizer = ActionRecognizer()
+        self.executor = executor
         
-        # Data storage
+        # Run the detectors densely only while the scene changes
+        self.motion_threshold = motion_threshold
+        self.pose_sampler = MotionSampler(stride=1, max_gap=POSE_MAX_GAP, threshold=motion_threshold)
+        self.object_sampler = MotionSampler(stride=OBJECT_STRIDE, max_gap=OBJECT_MAX_GAP,
+                                            threshold=motion_threshold)
+        self._last_pose: Optional[Dict[str, Any]] = None
+        self._last_objects_key: Optional[str] = None
+        # (frame_key, source_key) of skipped frames that reuse earlier detections
+        self._carried_objects: List[Tuple[str, str]] = []
+        self.tracking = tracking
+        self.renditions = renditions
+        
+        # Reason the last process() call failed
+        self.error: Optional[str] = None
+        
+        # Data storage for the chunk being processed
         self.pose_data = {}
         self.object_data = {}
         self.action_data = []
         
+        # Sampled frames waiting for a batched object detection call
+        self._pending_objects: List[Tuple[str, np.ndarray]] = []
+        
+        # Frame the capture will return next, so contiguous chunks need no seek
+        self._next_frame = 0
+        
+        # Progress reporting
+        self.progress_callback = progress_callback
+        self.stage_seconds = {stage: 0.0 for stage in STAGES}
+        self._total_frames = 0
+        self._frames_done = 0
+        self._frames_this_run = 0
+        self._started_at = time.monotonic()
+        self._last_report = 0.0
+        
     def process(self) -> bool:
         """
-        Process the entire video.
+        Process the entire video, resuming from existing checkpoints.
         
         Returns:
             True if processing successful, False otherwise
@@ -407,45 +648,323 @@ class VideoProcessor:
         logger.info(f"Processing video: {self.video_path}")
         logger.info(f"FPS: {fps}, Total frames: {total_frames}")
         
-        frame_num = 0
+        self._total_frames = total_frames
+        self._started_at = time.monotonic()
+        
+        # A reused model may still track the person of the previous video
+        if not self._owns_pose_extractor:
+            self.pose_extractor.reset()
+        
+        # The proxy encodes in an ffmpeg process while the models run
+        proxy_process = None
+        if self.renditions and not (self.output_dir / PROXY_FILE).exists():
+            proxy_process = start_proxy(self.video_path, self.output_dir)
         
         try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Process frame
-                self._process_frame(frame, frame_num)
-                
-                # Log progress
-                if frame_num % 30 == 0:
-                    progress = (frame_num / total_frames) * 100
-                    logger.info(f"Processing: {progress:.1f}% complete (frame {frame_num}/{total_frames})")
-                
-                frame_num += 1
-                
-                # Limit processing for very long videos (demo purposes)
-                if frame_num >= 300:  # Process first 10 seconds at 30fps
-                    logger.info("Limiting to first 300 frames for demo")
-                    break
+            chunks = self._plan_chunks(total_frames, probe_keyframes(self.video_path, fps))
+            self._prepare_checkpoints(total_frames, chunks)
             
-            # Get final action segments
+            pending = []
+            for index, (start, end) in enumerate(chunks):
+                if self._chunk_path(index, '.json').exists():
+                    logger.info(f"Chunk {index + 1}/{len(chunks)} already checkpointed, skipping")
+                    self._frames_done += len(np.load(self._chunk_path(index, '.npy'), mmap_mode='r'))
+                else:
+                    pending.append((index, start, end))
+            self._report_progress('processing', force=True)
+            
+            if self.workers > 1 and len(pending) > 1:
+                self._process_chunks_parallel(pending, total_frames, chunks)
+            else:
+                for index, start, end in pending:
+                    previous_start = chunks[index - 1][0] if index > 0 else None
+                    self._process_chunk(cap, index, start, end, total_frames, previous_start)
+            
+            # Stitch the checkpointed chunks into the final results
+            self._report_progress('saving', force=True)
+            pose_records = self._stitch_chunks(len(chunks))
+            if self.tracking:
+                # Runs on the whole video, so tracks continue across chunks
+                self.object_data = track_objects(self.object_data)
             self.action_data = self.action_recognizer.get_action_segments()
             
+            if self.renditions:
+                self._save_renditions(proxy_process)
+                proxy_process = None
+            
             # Save results
-            self._save_results()
+            self._save_results(pose_records)
+            shutil.rmtree(self.checkpoint_dir)
+            self._report_progress('completed', force=True)
             
             logger.info("Processing complete!")
             return True
             
         except Exception as e:
+            self.error = str(e)
             logger.error(f"Error during processing: {e}")
+            logger.info(f"Finished chunks are kept in {self.checkpoint_dir}; rerun to resume")
             return False
             
         finally:
             cap.release()
-            self.pose_extractor.close()
+            if proxy_process is not None:
+                cancel_proxy(proxy_process, self.output_dir)
+            if self._owns_pose_extractor:
+                self.pose_extractor.close()
+    
+    def _plan_chunks(self, total_frames: int,
+                     keyframes: Optional[List[int]] = None) -> List[Tuple[int, Optional[int]]]:
+        """
+        Split the video into (start, end) frame ranges.
+        
+        With several workers, chunks are made small enough that every worker
+        gets one. Chunk starts are moved forward to the next keyframe when
+        keyframes are known, so seeking to a chunk does not decode frames of
+        the previous one. The frame count reported by the container can be
+        off, so the last chunk has no end and runs until the decoder stops
+        returning frames.
+        
+        Args:
+            total_frames: Frame count reported by the container
+            keyframes: Sorted keyframe numbers, if known
+        """
+        if total_frames <= 0:
+            return [(0, None)]
+        
+        chunk_size = min(self.chunk_size, -(-total_frames // self.workers))
+        starts = [0]
+        for target in range(chunk_size, total_frames, chunk_size):
+            start = target
+            if keyframes:
+                position = bisect.bisect_left(keyframes, target)
+                if position == len(keyframes):
+                    break
+                start = keyframes[position]
+            if starts[-1] < start < total_frames:
+                starts.append(start)
+        
+        return [(start, end) for start, end in zip(starts, starts[1:])] + [(starts[-1], None)]
+    
+    def _chunk_path(self, index: int, suffix: str) -> Path:
+        return self.checkpoint_dir / f"chunk_{index:05d}{suffix}"
+    
+    def _prepare_checkpoints(self, total_frames: int, chunks: List[Tuple[int, Optional[int]]]):
+        """Keep existing checkpoints only if they were made for this video and chunking."""
+        video_stat = os.stat(self.video_path)
+        manifest = {
+            'video_path': str(self.video_path),
+            'video_size': video_stat.st_size,
+            'video_mtime_ns': video_stat.st_mtime_ns,
+            'total_frames': total_frames,
+            'chunk_starts': [start for start, _ in chunks]
+        }
+        
+        manifest_path = self.checkpoint_dir / 'manifest.json'
+        if manifest_path.exists():
+            with open(manifest_path, 'r') as f:
+                if json.load(f) == manifest:
+                    logger.info(f"Resuming from checkpoints in {self.checkpoint_dir}")
+                    return
+            logger.info("Discarding checkpoints made for a different video or chunking")
+        
+        if self.checkpoint_dir.exists():
+            shutil.rmtree(self.checkpoint_dir)
+        self.checkpoint_dir.mkdir(parents=True)
+        _write_json_atomic(manifest_path, manifest)
+    
+    def _process_chunk(self, cap: cv2.VideoCapture, index: int, start: int, end: Optional[int],
+                       total_frames: int, previous_start: Optional[int] = None):
+        """
+        Process one chunk of frames and checkpoint its results.
+        
+        Args:
+            cap: Open video capture
+            index: Chunk number
+            start: First frame of the chunk
+            end: Frame after the last one of the chunk, or None for the rest of the video
+            total_frames: Frame count reported by the container, for progress logs
+            previous_start: First frame of the previous chunk, if there is one
+        """
+        if self._next_frame != start:
+            self._seek(cap, start, previous_start)
+        
+        # Per-chunk results; the pose buffer carries over for action recognition
+        self.pose_data = {}
+        self.object_data = {}
+        self.action_recognizer.actions_detected = []
+        
+        # Every chunk starts with fresh detections, so sequential and parallel
+        # runs sample the same frames
+        self.pose_sampler.reset()
+        self.object_sampler.reset()
+        self._carried_objects = []
+        pose_sampled, object_sampled = self.pose_sampler.sampled, self.object_sampler.sampled
+        
+        # Decode ahead on a background thread while the models run; only the
+        # time spent waiting for a frame counts as decode time
+        decoder = PrefetchDecoder(cap, start_frame=start, count=None if end is None else end - start)
+        decode_seconds = self.stage_seconds['decode']
+        next_frame = start
+        for frame_num, frame in decoder:
+            self.stage_seconds['decode'] = decode_seconds + decoder.wait_seconds
+            
+            # Process frame
+            self._process_frame(frame, frame_num)
+            self._frames_done += 1
+            self._frames_this_run += 1
+            self._report_progress('processing')
+            
+            # Log progress
+            if frame_num % 30 == 0 and total_frames > 0:
+                progress = min(frame_num / total_frames, 1.0) * 100
+                logger.info(f"Processing: {progress:.1f}% complete (frame {frame_num}/{total_frames})")
+            
+            next_frame = frame_num + 1
+        
+        self.stage_seconds['decode'] = decode_seconds + decoder.wait_seconds
+        self._next_frame = next_frame
+        
+        # Flush frames still waiting for object detection
+        self._flush_object_batch()
+        for frame_key, source_key in self._carried_objects:
+            self.object_data[frame_key] = self.object_data[source_key]
+        
+        self._write_checkpoint(index)
+        logger.info(
+            f"Checkpointed chunk {index + 1} (frames {start}-{next_frame - 1}; "
+            f"pose ran on {self.pose_sampler.sampled - pose_sampled}, "
+            f"objects on {self.object_sampler.sampled - object_sampled})"
+        )
+    
+    def _process_chunks_parallel(self, pending: List[Tuple[int, int, Optional[int]]], total_frames: int,
+                                 chunks: List[Tuple[int, Optional[int]]]):
+        """
+        Process chunks in a pool of worker processes.
+        
+        Every process loads its own models once and checkpoints the chunks
+        it finishes, so a failure only loses the chunks still running.
+        Progress is reported per finished chunk, with stage times summed
+        over workers.
+        
+        Args:
+            pending: (index, start, end) of each chunk still to process
+            total_frames: Frame count reported by the container, for progress logs
+            chunks: (start, end) of every chunk of the video
+        """
+        executor = self.executor
+        if executor is None:
+            num_workers = min(self.workers, len(pending))
+            logger.info(f"Processing {len(pending)} chunks in {num_workers} worker processes")
+            executor = chunk_executor(num_workers, self.object_detector.batch_size, self.object_detector.options)
+        else:
+            logger.info(f"Processing {len(pending)} chunks in warm worker processes")
+        
+        futures = []
+        try:
+            futures = [
+                executor.submit(
+                    _run_chunk, self.video_path, str(self.output_dir),
+                    self.object_detector.batch_size, self.motion_threshold, index, start, end, total_frames,
+                    chunks[index - 1][0] if index > 0 else None
+                )
+                for index, start, end in pending
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                self._frames_done += result['frames']
+                self._frames_this_run += result['frames']
+                for stage, seconds in result['stage_seconds'].items():
+                    self.stage_seconds[stage] += seconds
+                self._report_progress('processing', force=True)
+        except BaseException:
+            if executor is self.executor:
+                for future in futures:
+                    future.cancel()
+            else:
+                executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        if executor is not self.executor:
+            executor.shutdown(wait=True)
+    
+    def _seek(self, cap: cv2.VideoCapture, start: int, previous_start: Optional[int] = None):
+        """
+        Position the capture at a chunk start after skipping checkpointed chunks.
+        
+        Action recognition looks at the last poses, so the frames just before
+        the chunk are decoded again to refill the pose buffer with the poses
+        a sequential run would have had there. With motion sampling, which
+        frames those are depends on the sampler's decisions since it was
+        reset at the previous chunk's start, so the decisions are replayed
+        from there; pose only runs on the sampled frames whose result
+        reaches the buffer.
+        
+        Args:
+            cap: Open video capture
+            start: First frame of the chunk
+            previous_start: First frame of the previous chunk, if there is one
+        """
+        self.action_recognizer = ActionRecognizer()
+        preroll_start = max(0, start - self.action_recognizer.buffer_size)
+        replay_start = preroll_start
+        if self.pose_sampler.adaptive and previous_start is not None:
+            replay_start = min(previous_start, preroll_start)
+        
+        # The replay is not part of this chunk's sampling counts
+        sampled, skipped = self.pose_sampler.sampled, self.pose_sampler.skipped
+        self.pose_sampler.reset()
+        cap.set(cv2.CAP_PROP_POS_FRAMES, replay_start)
+        
+        sampled_frame = None
+        pose_result = None
+        for frame_num in range(replay_start, start):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            small = thumbnail(frame) if self.pose_sampler.adaptive else None
+            if self.pose_sampler.should_sample(frame_num, small):
+                sampled_frame = frame
+            if frame_num < preroll_start:
+                continue
+            
+            if sampled_frame is not None:
+                pose_result = self.pose_extractor.extract_keypoints(sampled_frame)
+                sampled_frame = None
+            if pose_result['keypoints']:
+                self.action_recognizer.add_pose(frame_num, pose_result['keypoints'])
+        
+        self.pose_sampler.sampled, self.pose_sampler.skipped = sampled, skipped
+        self._next_frame = start
+    
+    def _write_checkpoint(self, index: int):
+        """Write the results of a chunk; the JSON file marks the chunk as done."""
+        with open(self._chunk_path(index, '.npy'), 'wb') as f:
+            np.save(f, pose_to_records(self.pose_data))
+        
+        _write_json_atomic(self._chunk_path(index, '.json'), {
+            'objects': self.object_data,
+            'actions_detected': self.action_recognizer.actions_detected
+        })
+    
+    def _stitch_chunks(self, num_chunks: int) -> np.ndarray:
+        """
+        Combine all chunk checkpoints into whole-video results.
+        
+        Returns:
+            Pose records of the whole video
+        """
+        pose_chunks = []
+        self.object_data = {}
+        self.action_recognizer.actions_detected = []
+        
+        for index in range(num_chunks):
+            pose_chunks.append(np.load(self._chunk_path(index, '.npy')))
+            with open(self._chunk_path(index, '.json'), 'r') as f:
+                chunk = json.load(f)
+            self.object_data.update(chunk['objects'])
+            self.action_recognizer.actions_detected.extend(chunk['actions_detected'])
+        
+        return np.concatenate(pose_chunks)
     
     def _process_frame(self, frame: np.ndarray, frame_num: int):
         """
@@ -457,11 +976,21 @@ class VideoProcessor:
         """
         frame_key = f"frame_{frame_num:03d}"
         
-        # Extract pose
-        pose_result = self.pose_extractor.extract_keypoints(frame)
+        # Thumbnail shared by both samplers' motion tests
+        started = time.perf_counter()
+        small = thumbnail(frame) if self.pose_sampler.adaptive else None
+        self.stage_seconds['decode'] += time.perf_counter() - started
+        
+        # Extract pose, or carry the last one forward while the scene is static
+        started = time.perf_counter()
+        if self.pose_sampler.should_sample(frame_num, small):
+            self._last_pose = self.pose_extractor.extract_keypoints(frame)
+        pose_result = self._last_pose
         self.pose_data[frame_key] = pose_result
+        self.stage_seconds['pose'] += time.perf_counter() - started
         
         # Add pose to action recognizer
+        started = time.perf_counter()
         if pose_result['keypoints']:
             self.action_recognizer.add_pose(frame_num, pose_result['keypoints'])
             
@@ -472,36 +1001,120 @@ class VideoProcessor:
                     'frame': frame_num,
                     'action': action
                 })
+        self.stage_seconds['actions'] += time.perf_counter() - started
+        
+        # Detect objects on sampled frames, reusing the last detections in between
+        if self.object_sampler.on_grid(frame_num):
+            if self.object_sampler.should_sample(frame_num, small):
+                self._last_objects_key = frame_key
+                # The decoder reuses frame buffers; keep a copy until the batch runs
+                self._pending_objects.append((frame_key, frame.copy()))
+                if len(self._pending_objects) >= self.object_detector.batch_size:
+                    self._flush_object_batch()
+            else:
+                self._carried_objects.append((frame_key, self._last_objects_key))
+    
+    def _flush_object_batch(self):
+        """Run object detection on all pending sampled frames in one batch."""
+        if not self._pending_objects:
+            return
         
-        # Detect objects (sample every 5 frames to save computation)
-        if frame_num % 5 == 0:
-            objects = self.object_detector.detect_objects(frame)
-            self.object_data[frame_key] = objects
-    
-    def _save_results(self):
-        """Save processing results to JSON files."""
-        # Save pose data
-        pose_path = self.output_dir / 'pose.json'
-        with open(pose_path, 'w') as f:
-            json.dump(self.pose_data, f, indent=2)
+        started = time.perf_counter()
+        frame_keys, frames = zip(*self._pending_objects)
+        detections = self.object_detector.detect_objects_batch(list(frames))
+        self.object_data.update(zip(frame_keys, detections))
+        self._pending_objects = []
+        self.stage_seconds['objects'] += time.perf_counter() - started
+    
+    def _report_progress(self, stage: str, force: bool = False):
+        """
+        Send a progress report to the progress callback, at most once per interval.
+        
+        Args:
+            stage: Pipeline stage, 'processing', 'saving' or 'completed'
+            force: Report even if the last report was sent less than an interval ago
+        """
+        if self.progress_callback is None:
+            return
+        
+        now = time.monotonic()
+        if not force and now - self._last_report < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_report = now
+        
+        # Rate of this run only, so frames resumed from checkpoints do not skew the ETA
+        elapsed = now - self._started_at
+        rate = self._frames_this_run / elapsed if elapsed > 0 else 0.0
+        remaining = max(self._total_frames - self._frames_done, 0)
+        
+        progress = {
+            'stage': stage,
+            'frames_done': self._frames_done,
+            'total_frames': self._total_frames,
+            'percent': round(min(self._frames_done / self._total_frames, 1.0) * 100, 1) if self._total_frames > 0 else None,
+            'fps': round(rate, 2),
+            'eta_seconds': round(remaining / rate, 1) if stage == 'processing' and rate > 0 else None,
+            'elapsed_seconds': round(elapsed, 1),
+            'stage_seconds': {name: round(seconds, 3) for name, seconds in self.stage_seconds.items()}
+        }
+        
+        try:
+            self.progress_callback(progress)
+        except Exception as e:
+            # Progress is informational; never fail a run because of it
+            logger.warning(f"Failed to report progress: {e}")
+    
+    def _save_renditions(self, proxy_process: Optional[subprocess.Popen]):
+        """
+        Finish the scrubbing proxy and make the sprite sheet from it.
+        
+        Args:
+            proxy_process: Proxy encode started by process(), if any
+        """
+        try:
+            if proxy_process is not None:
+                proxy_path = finish_proxy(proxy_process, self.output_dir)
+                if proxy_path is not None:
+                    logger.info(f"Saved scrubbing proxy to {proxy_path}")
+            
+            # The proxy decodes several times faster than the original
+            proxy_path = self.output_dir / PROXY_FILE
+            layout = make_sprites(proxy_path if proxy_path.exists() else self.video_path, self.output_dir)
+            if layout is not None:
+                logger.info(f"Saved {layout['count']} sprite thumbnails to {self.output_dir / SPRITES_FILE}")
+        except Exception as e:
+            # Renditions only speed up the annotate page; never fail a run because of them
+            logger.warning(f"Failed to save renditions: {e}")
+    
+    def _save_results(self, pose_records: np.ndarray):
+        """
+        Save processing results to the output directory.
+        
+        Args:
+            pose_records: Pose records of the whole video
+        """
+        # Save pose data in the columnar binary format
+        pose_path = save_pose_records(self.output_dir, pose_records)
         logger.info(f"Saved pose data to {pose_path}")
         
         # Save object data
         objects_path = self.output_dir / 'objects.json'
-        with open(objects_path, 'w') as f:
-            json.dump(self.object_data, f, indent=2)
+        _write_json_atomic(objects_path, self.object_data, indent=2)
         logger.info(f"Saved object data to {objects_path}")
         
         # Save action data
         actions_path = self.output_dir / 'actions.json'
-        with open(actions_path, 'w') as f:
-            json.dump(self.action_data, f, indent=2)
+        _write_json_atomic(actions_path, self.action_data, indent=2)
         logger.info(f"Saved action data to {actions_path}")
         
+        # Build per-frame lookup indexes so the API never parses whole files
+        build_objects_index(self.output_dir, self.object_data)
+        build_actions_index(self.output_dir, self.action_data)
+        
         # Save summary
         summary = {
             'video_path': str(self.video_path),
-            'total_frames_processed': len(self.pose_data),
+            'total_frames_processed': len(pose_records),
             'total_objects_detected': sum(len(objs) for objs in self.object_data.values()),
             'total_actions_detected': len(self.action_data),
             'output_files': {
@@ -510,10 +1123,12 @@ class VideoProcessor:
                 'actions': str(actions_path)
             }
         }
+        for name, filename in (('proxy', PROXY_FILE), ('sprites', SPRITES_FILE)):
+            if (self.output_dir / filename).exists():
+                summary['output_files'][name] = str(self.output_dir / filename)
         
         summary_path = self.output_dir / 'summary.json'
-        with open(summary_path, 'w') as f:
-            json.dump(summary, f, indent=2)
+        _write_json_atomic(summary_path, summary, indent=2)
         logger.info(f"Saved processing summary to {summary_path}")
 
 
@@ -534,6 +1149,72 @@ def main():
         default='output',
         help='Output directory for JSON files (default: output)'
     )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=8,
+        help='Frames per batched object detection call (default: 8)'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help=f'Runtime for object detection; see export_model.py (default: {DEFAULT_BACKEND})'
+    )
+    parser.add_argument(
+        '--model',
+        type=str,
+        default=None,
+        help='YOLOv8 weights, or exported ONNX model for onnxruntime/openvino '
+             '(default: yolov8n.pt / yolov8n.onnx)'
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='Intra-op threads of the object detector; chunk processes always use 1 (default: all cores)'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f'Frames processed between checkpoints (default: {DEFAULT_CHUNK_SIZE})'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Processes that work on chunks in parallel (default: 1)'
+    )
+    parser.add_argument(
+        '--motion-threshold',
+        type=float,
+        default=DEFAULT_MOTION_THRESHOLD,
+        help='Fraction of changed pixels below which detections are reused; '
+             f'0 runs the detectors on every frame (default: {DEFAULT_MOTION_THRESHOLD})'
+    )
+    parser.add_argument(
+        '--no-tracking',
+        action='store_true',
+        help='Keep objects on detected frames only, without track ids'
+    )
+    parser.add_argument(
+        '--no-renditions',
+        action='store_true',
+        help='Skip the scrubbing proxy and the thumbnail sprite sheet'
+    )
+    parser.add_argument(
+        '--job-id',
+        type=str,
+        default=None,
+        help='Publish progress reports for this job in the job queue'
+    )
+    parser.add_argument(
+        '--jobs-db',
+        type=str,
+        default=DEFAULT_DB_PATH,
+        help=f'Job queue database for progress reports (default: {DEFAULT_DB_PATH})'
+    )
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -551,8 +1232,20 @@ def main():
         logger.error(f"Video file not found: {args.video}")
         sys.exit(1)
     
+    # Publish progress where the API can stream it to clients
+    progress_callback = None
+    if args.job_id:
+        job_queue = JobQueue(args.jobs_db)
+        progress_callback = lambda progress: job_queue.update_progress(args.job_id, progress)
+    
     # Process video
-    processor = VideoProcessor(args.video, args.output)
+    processor = VideoProcessor(
+        args.video, args.output, batch_size=args.batch_size, chunk_size=args.chunk_size,
+        workers=args.workers, progress_callback=progress_callback,
+        motion_threshold=args.motion_threshold, tracking=not args.no_tracking,
+        renditions=not args.no_renditions,
+        detector_options={'backend': args.backend, 'model_path': args.model, 'threads': args.threads}
+    )
     success = processor.process()
     
     if success:
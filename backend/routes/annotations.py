@@ -1,8 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 from pathlib import Path
+import os
 import json
+import asyncio
+import tempfile
 from typing import Dict, List, Any, Optional
+from services import edit_log
+from services.pose_store import save_pose, has_pose
+from services.actions import ActionRecognizer
+from services.annotation_cache import (
+    annotation_cache, load_actions, load_edits, load_pose, load_pose_dict, load_objects
+)
 
 router = APIRouter()
 
@@ -19,6 +28,8 @@ class ObjectAnnotation(BaseModel):
     label: str
     bbox: List[float]
     confidence: float
+    # Same id on every frame showing the same object; None for manual boxes
+    track_id: Optional[int] = None
 
 class ActionAnnotation(BaseModel):
     label: str
@@ -43,23 +54,39 @@ async def save_annotations(video_id: str, annotations: AnnotationsUpdate) -> Dic
     
     # Save pose annotations
     if annotations.pose:
-        pose_path = data_dir / "pose.json"
-        with open(pose_path, 'w') as f:
-            json.dump(annotations.pose, f, indent=2)
+        pose_data = {frame_id: p.dict() for frame_id, p in annotations.pose.items()}
+        try:
+            # Waits for a running compaction, so keep it off the event loop
+            pose_path = await asyncio.to_thread(
+                edit_log.replace_base, data_dir, "pose", lambda: save_pose(data_dir, pose_data)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # The store rounds values and turns missing keypoints into NaN, so
+        # the next read loads what was persisted instead of the request body
+        annotation_cache.invalidate(pose_path)
         saved_items.append("pose")
     
     # Save object annotations
     if annotations.objects:
         objects_path = data_dir / "objects.json"
-        with open(objects_path, 'w') as f:
-            json.dump(annotations.objects, f, indent=2)
+        objects_data = {
+            frame_id: [obj.dict(exclude_none=True) for obj in objects]
+            for frame_id, objects in annotations.objects.items()
+        }
+        await asyncio.to_thread(
+            edit_log.replace_base, data_dir, "objects", lambda: _write_json(objects_path, objects_data)
+        )
+        annotation_cache.invalidate(objects_path)
+        annotation_cache.put(objects_path, "base", objects_data)
         saved_items.append("objects")
     
     # Save action annotations
     if annotations.actions:
         actions_path = data_dir / "actions.json"
-        with open(actions_path, 'w') as f:
-            json.dump([a.dict() for a in annotations.actions], f, indent=2)
+        actions_data = [a.dict() for a in annotations.actions]
+        _write_json(actions_path, actions_data)
+        annotation_cache.put(actions_path, "json", actions_data)
         saved_items.append("actions")
     
     return {
@@ -71,22 +98,24 @@ async def save_annotations(video_id: str, annotations: AnnotationsUpdate) -> Dic
 async def update_pose_frame(
     video_id: str,
     frame_id: str,
-    pose: PoseAnnotation
+    pose: PoseAnnotation,
+    background_tasks: BackgroundTasks
 ) -> Dict:
     """Update pose annotation for a specific frame"""
     
-    pose_path = Path(f"data/{video_id}/pose.json")
+    data_dir = Path(f"data/{video_id}")
     
-    if not pose_path.exists():
+    if not has_pose(data_dir):
         raise HTTPException(status_code=404, detail="Pose data not found")
     
-    with open(pose_path, 'r') as f:
-        pose_data = json.load(f)
-    
-    pose_data[frame_id] = pose.dict()
+    # Only the changed frame is written; the base file is compacted later
+    try:
+        needs_compaction = edit_log.append_edit(data_dir, "pose", frame_id, pose.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    with open(pose_path, 'w') as f:
-        json.dump(pose_data, f, indent=2)
+    if needs_compaction:
+        background_tasks.add_task(edit_log.compact_edits, data_dir)
     
     return {"message": f"Pose updated for frame {frame_id}"}
 
@@ -94,22 +123,22 @@ async def update_pose_frame(
 async def update_objects_frame(
     video_id: str,
     frame_id: str,
-    objects: List[ObjectAnnotation]
+    objects: List[ObjectAnnotation],
+    background_tasks: BackgroundTasks
 ) -> Dict:
     """Update object annotations for a specific frame"""
     
-    objects_path = Path(f"data/{video_id}/objects.json")
+    data_dir = Path(f"data/{video_id}")
     
-    if not objects_path.exists():
+    if not (data_dir / "objects.json").exists():
         raise HTTPException(status_code=404, detail="Objects data not found")
     
-    with open(objects_path, 'r') as f:
-        objects_data = json.load(f)
-    
-    objects_data[frame_id] = [obj.dict() for obj in objects]
+    needs_compaction = edit_log.append_edit(
+        data_dir, "objects", frame_id, [obj.dict(exclude_none=True) for obj in objects]
+    )
     
-    with open(objects_path, 'w') as f:
-        json.dump(objects_data, f, indent=2)
+    if needs_compaction:
+        background_tasks.add_task(edit_log.compact_edits, data_dir)
     
     return {"message": f"Objects updated for frame {frame_id}"}
 
@@ -121,20 +150,15 @@ async def add_action(
     """Add a new action annotation"""
     
     actions_path = Path(f"data/{video_id}/actions.json")
-    
-    if not actions_path.exists():
-        actions_data = []
-    else:
-        with open(actions_path, 'r') as f:
-            actions_data = json.load(f)
+    actions_data = list(load_actions(actions_path.parent) or [])
     
     actions_data.append(action.dict())
     
     # Sort by start frame
     actions_data.sort(key=lambda x: x['start_frame'])
     
-    with open(actions_path, 'w') as f:
-        json.dump(actions_data, f, indent=2)
+    _write_json(actions_path, actions_data)
+    annotation_cache.put(actions_path, "json", actions_data)
     
     return {"message": "Action added successfully"}
 
@@ -143,19 +167,57 @@ async def delete_action(video_id: str, action_index: int) -> Dict:
     """Delete an action annotation by index"""
     
     actions_path = Path(f"data/{video_id}/actions.json")
+    cached_actions = load_actions(actions_path.parent)
     
-    if not actions_path.exists():
+    if cached_actions is None:
         raise HTTPException(status_code=404, detail="Actions data not found")
     
-    with open(actions_path, 'r') as f:
-        actions_data = json.load(f)
+    actions_data = list(cached_actions)
     
     if action_index < 0 or action_index >= len(actions_data):
         raise HTTPException(status_code=404, detail="Action index out of range")
     
     deleted_action = actions_data.pop(action_index)
     
-    with open(actions_path, 'w') as f:
-        json.dump(actions_data, f, indent=2)
+    _write_json(actions_path, actions_data)
+    annotation_cache.put(actions_path, "json", actions_data)
+    
+    return {"message": f"Deleted action: {deleted_action['label']}"}
+
+@router.post("/video/{video_id}/actions/recompute")
+async def recompute_actions(video_id: str) -> Dict:
+    """Re-derive the action segments from the current pose and objects"""
     
-    return {"message": f"Deleted action: {deleted_action['label']}"}
\ No newline at end of file
+    data_dir = Path(f"data/{video_id}")
+    pose_store = load_pose(data_dir)
+    if pose_store is None:
+        raise HTTPException(status_code=404, detail="Pose data not found")
+    
+    objects_data = load_objects(data_dir) or {}
+    recognizer = ActionRecognizer()
+    if load_edits(data_dir)["pose"]:
+        # Pending frame edits only exist as dicts until the next compaction
+        actions_data = await asyncio.to_thread(
+            recognizer.extract_from_pose_and_objects, load_pose_dict(data_dir), objects_data, data_dir
+        )
+    else:
+        actions_data = await asyncio.to_thread(recognizer.extract_from_store, pose_store, objects_data, data_dir)
+    annotation_cache.put(data_dir / "actions.json", "json", actions_data)
+    
+    return {"message": "Actions recomputed", "action_count": len(actions_data)}
+
+def _write_json(path: Path, data: Any):
+    """Write a JSON file and return its path.
+
+    The file is replaced rather than rewritten in place, so outputs shared
+    with the result cache through hard links are never modified.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
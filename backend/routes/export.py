@@ -1,14 +1,26 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from pydantic import BaseModel
 from pathlib import Path
-import json
-import yaml
-import pandas as pd
-import io
-from typing import Dict, Optional
+import uuid
+from typing import Dict, List, Optional
+from services.annotation_cache import load_pose, load_objects, load_actions, pose_frame_count
+from services.exporters import buffered, iter_json, iter_csv, iter_yaml
+from services.job_queue import JobQueue, status_text
+from services import dataset_export
 
 router = APIRouter()
 
+# Bulk exports run as jobs in the worker pool
+job_queue = JobQueue()
+
+class DatasetExportRequest(BaseModel):
+    # Videos to export; when omitted, every video whose processing has this status
+    video_ids: Optional[List[str]] = None
+    status: str = "completed"
+    format: str = "json"
+    videos_per_shard: int = dataset_export.DEFAULT_VIDEOS_PER_SHARD
+
 @router.get("/video/{video_id}/export")
 async def export_annotations(
     video_id: str,
@@ -20,174 +32,34 @@ async def export_annotations(
     if not data_dir.exists():
         raise HTTPException(status_code=404, detail="Video data not found")
     
-    # Load all annotation data
-    annotations = {}
-    
-    pose_path = data_dir / "pose.json"
-    if pose_path.exists():
-        with open(pose_path, 'r') as f:
-            annotations["pose"] = json.load(f)
-    
-    objects_path = data_dir / "objects.json"
-    if objects_path.exists():
-        with open(objects_path, 'r') as f:
-            annotations["objects"] = json.load(f)
-    
-    actions_path = data_dir / "actions.json"
-    if actions_path.exists():
-        with open(actions_path, 'r') as f:
-            annotations["actions"] = json.load(f)
-    
     if format == "json":
-        return export_json(annotations, video_id)
+        return export_json(data_dir, video_id)
     elif format == "csv":
-        return export_csv(annotations, video_id)
+        return export_csv(data_dir, video_id)
     elif format == "yaml":
-        return export_yaml(annotations, video_id)
+        return export_yaml(data_dir, video_id)
     else:
         raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
 
-def export_json(annotations: Dict, video_id: str):
+def export_json(data_dir: Path, video_id: str):
     """Export as JSON"""
-    content = json.dumps(annotations, indent=2)
-    
-    return StreamingResponse(
-        io.StringIO(content),
-        media_type="application/json",
-        headers={
-            "Content-Disposition": f"attachment; filename={video_id}_annotations.json"
-        }
-    )
+    return _stream_export(iter_json(data_dir), "application/json", f"{video_id}_annotations.json")
 
-def export_csv(annotations: Dict, video_id: str):
+def export_csv(data_dir: Path, video_id: str):
     """Export as CSV files in a combined format"""
-    output = io.StringIO()
-    
-    # Export pose data
-    if "pose" in annotations:
-        output.write("=== POSE DATA ===\n")
-        pose_rows = []
-        
-        for frame_id, data in annotations["pose"].items():
-            row = {"frame": frame_id}
-            for keypoint, coords in data["keypoints"].items():
-                row[f"{keypoint}_x"] = coords[0]
-                row[f"{keypoint}_y"] = coords[1]
-                if len(coords) > 2:
-                    row[f"{keypoint}_z"] = coords[2]
-            row["confidence"] = data["confidence"]
-            pose_rows.append(row)
-        
-        if pose_rows:
-            df_pose = pd.DataFrame(pose_rows)
-            output.write(df_pose.to_csv(index=False))
-            output.write("\n\n")
-    
-    # Export object data
-    if "objects" in annotations:
-        output.write("=== OBJECT DATA ===\n")
-        object_rows = []
-        
-        for frame_id, objects in annotations["objects"].items():
-            for obj in objects:
-                object_rows.append({
-                    "frame": frame_id,
-                    "label": obj["label"],
-                    "x1": obj["bbox"][0],
-                    "y1": obj["bbox"][1],
-                    "x2": obj["bbox"][2],
-                    "y2": obj["bbox"][3],
-                    "confidence": obj["confidence"]
-                })
-        
-        if object_rows:
-            df_objects = pd.DataFrame(object_rows)
-            output.write(df_objects.to_csv(index=False))
-            output.write("\n\n")
-    
-    # Export action data
-    if "actions" in annotations:
-        output.write("=== ACTION DATA ===\n")
-        if annotations["actions"]:
-            df_actions = pd.DataFrame(annotations["actions"])
-            output.write(df_actions.to_csv(index=False))
-    
-    output.seek(0)
-    
-    return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename={video_id}_annotations.csv"
-        }
-    )
+    return _stream_export(iter_csv(data_dir), "text/csv", f"{video_id}_annotations.csv")
 
-def export_yaml(annotations: Dict, video_id: str):
+def export_yaml(data_dir: Path, video_id: str):
     """Export in ROS-compatible YAML format"""
-    
-    ros_format = {
-        "header": {
-            "seq": 1,
-            "stamp": {
-                "secs": 0,
-                "nsecs": 0
-            },
-            "frame_id": video_id,
-            "version": "1.0"
-        },
-        "poses": [],
-        "objects": [],
-        "actions": []
-    }
-    
-    # Convert pose data
-    if "pose" in annotations:
-        for frame_id, data in annotations["pose"].items():
-            frame_num = int(frame_id.split("_")[1])
-            ros_format["poses"].append({
-                "frame": frame_num,
-                "timestamp": frame_num / 30.0,  # Assuming 30 FPS
-                "joints": data["keypoints"],
-                "confidence": data["confidence"]
-            })
-    
-    # Convert object data
-    if "objects" in annotations:
-        for frame_id, objects in annotations["objects"].items():
-            frame_num = int(frame_id.split("_")[1])
-            for obj in objects:
-                ros_format["objects"].append({
-                    "frame": frame_num,
-                    "timestamp": frame_num / 30.0,
-                    "class": obj["label"],
-                    "bbox": {
-                        "x_min": obj["bbox"][0],
-                        "y_min": obj["bbox"][1],
-                        "x_max": obj["bbox"][2],
-                        "y_max": obj["bbox"][3]
-                    },
-                    "confidence": obj["confidence"]
-                })
-    
-    # Convert action data
-    if "actions" in annotations:
-        for action in annotations["actions"]:
-            ros_format["actions"].append({
-                "action": action["label"],
-                "start_time": action["start_frame"] / 30.0,
-                "end_time": action["end_frame"] / 30.0,
-                "start_frame": action["start_frame"],
-                "end_frame": action["end_frame"],
-                "confidence": action["confidence"]
-            })
-    
-    yaml_content = yaml.dump(ros_format, default_flow_style=False, sort_keys=False)
-    
+    return _stream_export(iter_yaml(data_dir, video_id), "text/yaml", f"{video_id}_annotations.yaml")
+
+def _stream_export(parts, media_type: str, filename: str):
+    """Send an export as it is generated, one frame at a time"""
     return StreamingResponse(
-        io.StringIO(yaml_content),
-        media_type="text/yaml",
+        buffered(parts),
+        media_type=media_type,
         headers={
-            "Content-Disposition": f"attachment; filename={video_id}_annotations.yaml"
+            "Content-Disposition": f"attachment; filename={filename}"
         }
     )
 
@@ -206,34 +78,101 @@ async def export_summary(video_id: str) -> Dict:
     }
     
     # Check pose data
-    pose_path = data_dir / "pose.json"
-    if pose_path.exists():
-        with open(pose_path, 'r') as f:
-            pose_data = json.load(f)
-            summary["available_data"]["pose"] = {
-                "frame_count": len(pose_data),
-                "keypoint_count": len(next(iter(pose_data.values()))["keypoints"]) if pose_data else 0
-            }
+    pose_store = load_pose(data_dir)
+    if pose_store is not None:
+        summary["available_data"]["pose"] = {
+            "frame_count": pose_frame_count(data_dir),
+            "keypoint_count": pose_store.keypoint_count()
+        }
     
     # Check objects data
-    objects_path = data_dir / "objects.json"
-    if objects_path.exists():
-        with open(objects_path, 'r') as f:
-            objects_data = json.load(f)
-            total_objects = sum(len(objs) for objs in objects_data.values())
-            summary["available_data"]["objects"] = {
-                "frame_count": len(objects_data),
-                "total_detections": total_objects
-            }
+    objects_data = load_objects(data_dir)
+    if objects_data is not None:
+        total_objects = sum(len(objs) for objs in objects_data.values())
+        summary["available_data"]["objects"] = {
+            "frame_count": len(objects_data),
+            "total_detections": total_objects
+        }
     
     # Check actions data
-    actions_path = data_dir / "actions.json"
-    if actions_path.exists():
-        with open(actions_path, 'r') as f:
-            actions_data = json.load(f)
-            summary["available_data"]["actions"] = {
-                "action_count": len(actions_data),
-                "action_types": list(set(a["label"] for a in actions_data))
-            }
-    
-    return summary
\ No newline at end of file
+    actions_data = load_actions(data_dir)
+    if actions_data is not None:
+        summary["available_data"]["actions"] = {
+            "action_count": len(actions_data),
+            "action_types": list(set(a["label"] for a in actions_data))
+        }
+    
+    return summary
+
+def _is_known_video(video_id: str) -> bool:
+    """Whether video_id is the id of an uploaded video"""
+    
+    if not dataset_export.is_video_id(video_id):
+        return False
+    job = job_queue.get(video_id)
+    return job is not None and job["kind"] == "process"
+
+@router.post("/exports")
+async def create_dataset_export(request: DatasetExportRequest) -> Dict:
+    """Queue a sharded export of many videos"""
+    
+    if request.format not in dataset_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {request.format}")
+    if request.videos_per_shard < 1:
+        raise HTTPException(status_code=400, detail="videos_per_shard must be at least 1")
+    
+    video_ids = request.video_ids
+    if video_ids is None:
+        video_ids = job_queue.ids("process", request.status)
+    else:
+        # Ids become paths under data/ and names inside the shards
+        unknown = [video_id for video_id in video_ids if not _is_known_video(video_id)]
+        if unknown:
+            raise HTTPException(status_code=400, detail={"message": "Unknown video ids", "video_ids": unknown[:20]})
+    
+    export_id = str(uuid.uuid4())
+    job_queue.enqueue(export_id, "export", {
+        "video_ids": video_ids,
+        "format": request.format,
+        "videos_per_shard": request.videos_per_shard
+    })
+    
+    return {
+        "export_id": export_id,
+        "status": "queued",
+        "video_count": len(video_ids),
+        "shard_count": len(dataset_export.plan_shards(video_ids, request.videos_per_shard))
+    }
+
+@router.get("/exports/{export_id}")
+async def get_dataset_export(export_id: str) -> Dict:
+    """Get the status, progress and finished shards of a bulk export"""
+    
+    job = job_queue.get(export_id)
+    if job is None or job["kind"] != "export":
+        raise HTTPException(status_code=404, detail="Export not found")
+    
+    return {
+        "export_id": export_id,
+        "status": status_text(job),
+        "progress": job["progress"],
+        "format": job["payload"]["format"],
+        "video_count": len(job["payload"]["video_ids"]),
+        "shards": [
+            {"name": name, "url": f"/api/exports/{export_id}/shards/{name}"}
+            for name in dataset_export.finished_shards(export_id)
+        ]
+    }
+
+@router.get("/exports/{export_id}/shards/{shard_name}")
+async def download_dataset_shard(export_id: str, shard_name: str):
+    """Download one finished shard of a bulk export"""
+    
+    if shard_name not in dataset_export.finished_shards(export_id):
+        raise HTTPException(status_code=404, detail="Shard not found")
+    
+    return FileResponse(
+        path=str(dataset_export.export_dir(export_id) / shard_name),
+        media_type="application/zip",
+        filename=f"{export_id}_{shard_name}"
+    )
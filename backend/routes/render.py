@@ -0,0 +1,142 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, FileResponse
+from starlette.background import BackgroundTask
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import os
+import asyncio
+import hashlib
+import tempfile
+from services.annotation_cache import load_frame, iter_frames, annotation_version
+from services.byte_range import entity_tag
+from services.renditions import PROXY_FILE
+from services.overlay import (
+    render_cache, render_overlay, read_frames_at, encode_image, write_clip, video_size,
+    IMAGE_FORMATS, MAX_CLIP_FRAMES
+)
+from routes.upload import find_video
+
+router = APIRouter()
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png"}
+
+# Fallback frame rate for clips when the video does not report one
+DEFAULT_FPS = 30.0
+
+def _render_source(video_id: str, source: str) -> Tuple[Path, Path]:
+    """Original video and the video to decode frames from"""
+    
+    video_path = find_video(video_id)
+    if video_path is None:
+        raise HTTPException(status_code=404, detail="Video file not found")
+    if source not in ("proxy", "original"):
+        raise HTTPException(status_code=400, detail="source must be 'proxy' or 'original'")
+    
+    # Seeking in the short-GOP proxy decodes a few small frames instead of up
+    # to a whole GOP of full-resolution ones
+    proxy_path = Path(f"data/{video_id}") / PROXY_FILE
+    if source == "proxy" and proxy_path.exists():
+        return video_path, proxy_path
+    return video_path, video_path
+
+def _scale(video_path: Path, source_path: Path) -> float:
+    """Scale from the original video, which annotations refer to, to the source"""
+    
+    if source_path == video_path:
+        return 1.0
+    return video_size(source_path)[0] / max(1, video_size(video_path)[0])
+
+def _render_version(data_dir: Path, source_path: Path) -> str:
+    """Version of a rendered frame: the annotations plus the video it was drawn on"""
+    
+    source_tag = entity_tag(source_path.stat())
+    return hashlib.sha256(f"{annotation_version(data_dir)}{source_tag}".encode()).hexdigest()[:16]
+
+def _render_frame(data_dir: Path, video_path: Path, source_path: Path, frame_num: int,
+                  image_format: str) -> Optional[bytes]:
+    frame = next(iter(read_frames_at(source_path, frame_num)), None)
+    if frame is None:
+        return None
+    annotations = load_frame(data_dir, frame_num)
+    return encode_image(render_overlay(frame, annotations, _scale(video_path, source_path)), image_format)
+
+def _render_clip(data_dir: Path, video_path: Path, source_path: Path, start: int, end: int, path: Path) -> int:
+    import cv2
+    cap = cv2.VideoCapture(str(source_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    cap.release()
+    scale = _scale(video_path, source_path)
+    
+    # The annotations of the whole range are read in one sweep
+    frames = (
+        render_overlay(frame, annotations, scale)
+        for frame, annotations in zip(read_frames_at(source_path, start, end - start + 1),
+                                      iter_frames(data_dir, start, end + 1))
+    )
+    return write_clip(frames, path, fps)
+
+@router.get("/video/{video_id}/overlay/clip")
+async def get_overlay_clip(video_id: str, start: int, end: int, source: str = "proxy"):
+    """Render annotations onto a range of frames as an MP4 clip"""
+    
+    if start < 0 or end < start:
+        raise HTTPException(status_code=400, detail="Invalid frame range")
+    if end - start + 1 > MAX_CLIP_FRAMES:
+        raise HTTPException(status_code=400, detail=f"Clips are limited to {MAX_CLIP_FRAMES} frames")
+    
+    data_dir = Path(f"data/{video_id}")
+    video_path, source_path = _render_source(video_id, source)
+    
+    fd, clip_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    try:
+        written = await asyncio.to_thread(_render_clip, data_dir, video_path, source_path, start, end, Path(clip_path))
+    except Exception:
+        os.unlink(clip_path)
+        raise
+    if written == 0:
+        os.unlink(clip_path)
+        raise HTTPException(status_code=404, detail="Frames not found")
+    
+    return FileResponse(
+        path=clip_path,
+        media_type="video/mp4",
+        filename=f"{video_id}_overlay_{start}-{end}.mp4",
+        background=BackgroundTask(os.unlink, clip_path)
+    )
+
+@router.get("/video/{video_id}/overlay/{frame_num}")
+async def get_overlay_frame(video_id: str, frame_num: int, request: Request,
+                            format: str = "jpeg", source: str = "proxy"):
+    """Render one frame with its pose, objects and actions drawn on it"""
+    
+    if format not in IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(IMAGE_FORMATS)}")
+    if frame_num < 0:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    
+    data_dir = Path(f"data/{video_id}")
+    video_path, source_path = _render_source(video_id, source)
+    version = _render_version(data_dir, source_path)
+    etag = f'"{version}"'
+    # Annotations change with every edit, so clients revalidate each time
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    key = (video_id, frame_num, source, format)
+    image = render_cache.get(key, version)
+    if image is None:
+        image = await asyncio.to_thread(_render_frame, data_dir, video_path, source_path, frame_num, format)
+        if image is None:
+            raise HTTPException(status_code=404, detail="Frame not found")
+        render_cache.put(key, version, image)
+    
+    return Response(content=image, media_type=MEDIA_TYPES[format], headers=headers)
+
+@router.get("/render/cache/stats")
+async def get_render_cache_stats() -> Dict:
+    """Get hit/miss counters of the in-process rendered frame cache"""
+    
+    return render_cache.stats()
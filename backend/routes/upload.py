@@ -1,154 +1,237 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from pathlib import Path
 import uuid
-import shutil
-import json
-from typing import Dict
+from typing import Dict, AsyncIterator, Optional
 import os
-from services.pose_mock import PoseExtractor
-from services.objects_mock import ObjectDetector
-from services.actions import ActionRecognizer
-import asyncio
+import json
+from services.job_queue import JobQueue
+from services.job_events import JobEvents, job_event
+from services.chunked_upload import (
+    ChunkedUploads, UploadNotFound, OffsetMismatch, save_stream, ALLOWED_EXTENSIONS, READ_BYTES
+)
+from services.byte_range import ranged_file_response
+from services.renditions import PROXY_FILE, SPRITES_FILE, SPRITES_META_FILE
+from services.pose_store import has_pose as has_pose_data
+from services.annotation_cache import load_pose_dict, load_objects, load_actions, pose_frame_count
 
 router = APIRouter()
 
-# Global storage for video processing status
-processing_status = {}
+# Processing jobs live in a persistent queue served by worker.py
+job_queue = JobQueue()
+job_events = JobEvents(job_queue)
+
+# Resumable uploads in progress, kept under uploads/partial
+chunked_uploads = ChunkedUploads()
+
+# Comment line sent on idle event streams so proxies keep them open
+KEEPALIVE_SECONDS = 15
 
-async def process_video(video_id: str, video_path: str):
-    """Background task to process video with ML models"""
-    import subprocess
-    import sys
+# Media types of the accepted upload extensions
+VIDEO_MEDIA_TYPES = {'.mp4': 'video/mp4', '.mov': 'video/quicktime', '.avi': 'video/x-msvideo'}
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int
+
+def find_video(video_id: str) -> Optional[Path]:
+    """Path of an uploaded video, whatever its extension"""
     
-    try:
-        processing_status[video_id] = "processing"
-        
-        # Create output directory
-        output_dir = Path(f"data/{video_id}")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Try to use the real process_video.py script if available
-        process_script = Path("process_video.py")
-        if process_script.exists():
-            print(f"Running ML processing for video {video_id}")
-            try:
-                # Run the actual video processing script
-                result = subprocess.run(
-                    [sys.executable, "process_video.py", "--video", video_path, "--output", str(output_dir)],
-                    capture_output=True,
-                    text=True,
-                    timeout=60  # 60 second timeout
-                )
-                if result.returncode == 0:
-                    print(f"ML processing completed for video {video_id}")
-                    processing_status[video_id] = "completed"
-                    return
-                else:
-                    print(f"ML processing failed: {result.stderr}")
-            except subprocess.TimeoutExpired:
-                print("ML processing timed out, falling back to mock data")
-            except Exception as e:
-                print(f"Error running ML processing: {e}")
-        
-        # Fall back to mock processing
-        print(f"Using mock processing for video {video_id}")
-        
-        # Extract pose (mock)
-        pose_extractor = PoseExtractor()
-        pose_data = await asyncio.to_thread(
-            pose_extractor.extract_from_video, video_path, output_dir
-        )
-        
-        # Extract objects (mock)
-        object_detector = ObjectDetector()
-        objects_data = await asyncio.to_thread(
-            object_detector.extract_from_video, video_path, output_dir
-        )
-        
-        # Extract actions (mock)
-        action_recognizer = ActionRecognizer()
-        actions_data = await asyncio.to_thread(
-            action_recognizer.extract_from_pose_and_objects,
-            pose_data, objects_data, output_dir
-        )
-        
-        processing_status[video_id] = "completed"
-        print(f"Processing completed for video {video_id}")
-        
-    except Exception as e:
-        print(f"Error processing video {video_id}: {str(e)}")
-        processing_status[video_id] = f"error: {str(e)}"
+    for extension in ALLOWED_EXTENSIONS:
+        video_path = Path("uploads") / f"{video_id}{extension}"
+        if video_path.exists():
+            return video_path
+    return None
+
+def video_media_type(video_path: Path) -> str:
+    return VIDEO_MEDIA_TYPES.get(video_path.suffix.lower(), "application/octet-stream")
 
 @router.post("/upload")
 async def upload_video(
-    background_tasks: BackgroundTasks,
     video: UploadFile = File(...)
 ) -> Dict:
     """Upload a video file and start processing"""
     
     # Validate file type
-    allowed_extensions = ['.mp4', '.avi', '.mov']
     file_ext = Path(video.filename).suffix.lower()
     
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
     # Generate unique ID
     video_id = str(uuid.uuid4())
     
-    # Save video
+    # Save video without blocking the event loop, hashing it on the way to disk
     video_path = f"uploads/{video_id}{file_ext}"
-    with open(video_path, "wb") as buffer:
-        shutil.copyfileobj(video.file, buffer)
+    content_hash = await save_stream(_read_chunks(video), Path(video_path))
     
-    # Start background processing
-    background_tasks.add_task(process_video, video_id, video_path)
-    processing_status[video_id] = "queued"
+    return _start_processing(video_id, video.filename, video_path, content_hash)
+
+async def _read_chunks(video: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await video.read(READ_BYTES)
+        if not chunk:
+            break
+        yield chunk
+
+def _start_processing(video_id: str, filename: str, video_path: str, content_hash: str) -> Dict:
+    """Queue a saved upload for the worker pool"""
+    # The worker reuses the results of an identical upload processed with
+    # the same models, which only it knows the versions of
+    payload = {
+        "video_path": video_path,
+        "content_hash": content_hash
+    }
+    job_queue.enqueue(video_id, "process", payload)
     
     return {
         "video_id": video_id,
-        "filename": video.filename,
+        "filename": filename,
         "status": "queued",
         "message": "Video uploaded successfully. Processing started."
     }
 
+@router.post("/uploads")
+async def create_upload(request: UploadInit) -> Dict:
+    """Start a resumable upload; send the file in chunks with PUT /uploads/{upload_id}"""
+    
+    try:
+        return chunked_uploads.create(request.filename, request.size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str) -> Dict:
+    """Get the offset a resumable upload continues from"""
+    
+    try:
+        return chunked_uploads.info(upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request) -> Dict:
+    """Append the raw request body to an upload, starting at offset"""
+    
+    try:
+        new_offset = await chunked_uploads.append(upload_id, offset, request.stream())
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except OffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"upload_id": upload_id, "offset": new_offset}
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str) -> Dict:
+    """Finish a resumable upload and start processing the video"""
+    
+    try:
+        upload = chunked_uploads.info(upload_id)
+        video_id = str(uuid.uuid4())
+        video_path = f"uploads/{video_id}{upload['extension']}"
+        content_hash = await chunked_uploads.finish(upload_id, Path(video_path))
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except OffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "offset": e.offset})
+    
+    return _start_processing(video_id, upload["filename"], video_path, content_hash)
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str) -> Dict:
+    """Cancel a resumable upload and delete what was sent so far"""
+    
+    try:
+        await chunked_uploads.abort(upload_id)
+    except UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    
+    return {"message": "Upload cancelled"}
+
 @router.get("/video/{video_id}/status")
 async def get_processing_status(video_id: str) -> Dict:
     """Get the processing status of a video"""
     
-    if video_id not in processing_status:
+    job = job_queue.get(video_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    return {
-        "video_id": video_id,
-        "status": processing_status[video_id]
-    }
+    return job_event(job)
+
+@router.get("/video/{video_id}/events")
+async def stream_processing_events(video_id: str):
+    """Stream processing status and progress as Server-Sent Events"""
+    
+    if job_queue.get(video_id) is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    async def event_stream():
+        async for event in job_events.subscribe(video_id, idle_timeout=KEEPALIVE_SECONDS):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/video/{video_id}/file")
-async def get_video_file(video_id: str):
+async def get_video_file(video_id: str, request: Request):
     """Serve the uploaded video file"""
     
-    # Look for video files with any extension
-    uploads_dir = Path("uploads")
-    video_files = list(uploads_dir.glob(f"{video_id}.*"))
-    
-    if not video_files:
+    video_path = find_video(video_id)
+    if video_path is None:
         raise HTTPException(status_code=404, detail="Video file not found")
     
-    video_path = video_files[0]
+    return ranged_file_response(request, video_path, video_media_type(video_path))
+
+@router.get("/video/{video_id}/proxy")
+async def get_video_proxy(video_id: str, request: Request):
+    """Serve the low-resolution scrubbing proxy, or the original until it exists"""
+    
+    proxy_path = Path(f"data/{video_id}") / PROXY_FILE
+    if proxy_path.exists():
+        return ranged_file_response(request, proxy_path, "video/mp4")
     
-    if not video_path.exists():
+    video_path = find_video(video_id)
+    if video_path is None:
         raise HTTPException(status_code=404, detail="Video file not found")
     
-    return FileResponse(
-        path=str(video_path),
-        media_type="video/mp4",
-        filename=video_path.name
-    )
+    # Revalidate every time, so clients switch to the proxy once it is encoded
+    return ranged_file_response(request, video_path, video_media_type(video_path), cache_control="no-cache")
+
+@router.get("/video/{video_id}/sprites")
+async def get_video_sprites(video_id: str) -> Dict:
+    """Get the thumbnail sprite sheet layout for timeline previews"""
+    
+    layout_path = Path(f"data/{video_id}") / SPRITES_META_FILE
+    if not layout_path.exists():
+        raise HTTPException(status_code=404, detail="Sprites not found")
+    
+    with open(layout_path, 'r') as f:
+        layout = json.load(f)
+    
+    return {**layout, "url": f"/api/video/{video_id}/sprites.jpg"}
+
+@router.get("/video/{video_id}/sprites.jpg")
+async def get_video_sprites_image(video_id: str, request: Request):
+    """Serve the thumbnail sprite sheet"""
+    
+    sprites_path = Path(f"data/{video_id}") / SPRITES_FILE
+    if not sprites_path.exists():
+        raise HTTPException(status_code=404, detail="Sprites not found")
+    
+    return ranged_file_response(request, sprites_path, "image/jpeg")
 
 @router.get("/video/{video_id}/info")
 async def get_video_info(video_id: str) -> Dict:
@@ -159,16 +242,14 @@ async def get_video_info(video_id: str) -> Dict:
         raise HTTPException(status_code=404, detail="Video data not found")
     
     # Check which files exist
-    has_pose = (data_dir / "pose.json").exists()
+    has_pose = has_pose_data(data_dir)
     has_objects = (data_dir / "objects.json").exists()
     has_actions = (data_dir / "actions.json").exists()
     
     # Get frame count from pose data
     frame_count = 0
     if has_pose:
-        with open(data_dir / "pose.json", 'r') as f:
-            pose_data = json.load(f)
-            frame_count = len(pose_data)
+        frame_count = pose_frame_count(data_dir)
     
     return {
         "video_id": video_id,
@@ -176,30 +257,26 @@ async def get_video_info(video_id: str) -> Dict:
         "has_objects": has_objects,
         "has_actions": has_actions,
         "frame_count": frame_count,
-        "status": processing_status.get(video_id, "unknown")
+        "status": job_queue.status(video_id, "unknown")
     }
 
 @router.get("/videos/{video_id}")
 async def get_video_details(video_id: str) -> Dict:
     """Get video details for the annotate page"""
     
-    # Look for video files with any extension
-    uploads_dir = Path("uploads")
-    video_files = list(uploads_dir.glob(f"{video_id}.*"))
-    
-    if not video_files:
+    video_path = find_video(video_id)
+    if video_path is None:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    video_path = video_files[0]
-    
     # Get video URL path
     video_url = f"/uploads/{video_path.name}"
     
     return {
         "video_id": video_id,
         "video_url": video_url,
+        "proxy_url": f"/api/video/{video_id}/proxy",
         "filename": video_path.name,
-        "status": processing_status.get(video_id, "unknown")
+        "status": job_queue.status(video_id, "unknown")
     }
 
 @router.get("/videos/{video_id}/annotations")
@@ -215,7 +292,7 @@ async def get_video_annotations(video_id: str) -> Dict:
         "objects": {},
         "actions": [],
         "total_frames": 0,
-        "status": processing_status.get(video_id, "processing")
+        "status": job_queue.status(video_id, "processing")
     }
     
     # If data directory doesn't exist yet, return processing status
@@ -223,22 +300,19 @@ async def get_video_annotations(video_id: str) -> Dict:
         return annotations
     
     # Load pose data
-    pose_file = data_dir / "pose.json"
-    if pose_file.exists():
-        with open(pose_file, 'r') as f:
-            annotations["pose"] = json.load(f)
-            annotations["total_frames"] = len(annotations["pose"])
+    pose_data = load_pose_dict(data_dir)
+    if pose_data is not None:
+        annotations["pose"] = pose_data
+        annotations["total_frames"] = len(pose_data)
     
     # Load objects data
-    objects_file = data_dir / "objects.json"
-    if objects_file.exists():
-        with open(objects_file, 'r') as f:
-            annotations["objects"] = json.load(f)
+    objects_data = load_objects(data_dir)
+    if objects_data is not None:
+        annotations["objects"] = objects_data
     
     # Load actions data
-    actions_file = data_dir / "actions.json"
-    if actions_file.exists():
-        with open(actions_file, 'r') as f:
-            annotations["actions"] = json.load(f)
+    actions_data = load_actions(data_dir)
+    if actions_data is not None:
+        annotations["actions"] = actions_data
     
     return annotations
\ No newline at end of file
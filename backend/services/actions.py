@@ -1,20 +1,61 @@
+import os
 import json
+import tempfile
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Any
-from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple
+
+from services.pose_store import LANDMARK_NAMES, LANDMARK_INDEX, PoseStore, frame_number
+
+# Actions in the order their rules are checked; the first match wins
+ACTIONS = ('reach', 'pick', 'place', 'walk', 'idle')
+
+PICK_LABELS = ('cup', 'bottle', 'cell phone', 'book')
+PLACE_LABELS = ('table', 'desk', 'counter')
+
+REACH_MIN_EXTENSION = 100
+PICK_MAX_DISTANCE = 50
+WALK_MIN_STRIDE = 50
+
+LEFT_WRIST = LANDMARK_INDEX['left_wrist']
+RIGHT_WRIST = LANDMARK_INDEX['right_wrist']
+LEFT_SHOULDER = LANDMARK_INDEX['left_shoulder']
+RIGHT_SHOULDER = LANDMARK_INDEX['right_shoulder']
+LEFT_ANKLE = LANDMARK_INDEX['left_ankle']
+RIGHT_ANKLE = LANDMARK_INDEX['right_ankle']
+
+# The only keypoints the rules look at
+RULE_KEYPOINTS = ('left_wrist', 'right_wrist', 'left_shoulder', 'right_shoulder', 'left_ankle', 'right_ankle')
+
+
+def _frame_number(frame_id: str) -> Optional[int]:
+    """Frame number of a frame_id key, or None for any other key"""
+    try:
+        return frame_number(frame_id)
+    except ValueError:
+        return None
+
 
 class ActionRecognizer:
+    """Rule-based action recognition over whole pose arrays.
+
+    Poses are a frames x 33 x 3 keypoint array with NaN for missing
+    keypoints, and objects are flat arrays with the pose row each box
+    belongs to. Every rule is evaluated as a mask over all frames at once,
+    and consecutive frames with the same action are grouped with run-length
+    encoding. Comparisons against NaN are False, so a rule never fires on a
+    keypoint that was not detected.
+    """
+
     def __init__(self):
         """Initialize action recognition"""
         # For MVP, we'll use rule-based action detection based on pose and objects
         # In production, this would use MMAction2 or similar
         self.action_rules = {
-            'reach': self.detect_reach,
-            'pick': self.detect_pick,
-            'place': self.detect_place,
-            'walk': self.detect_walk,
-            'idle': self.detect_idle
+            'reach': self.reach_mask,
+            'pick': self.pick_mask,
+            'place': self.place_mask,
+            'walk': self.walk_mask
         }
     
     def extract_from_pose_and_objects(
@@ -25,138 +66,170 @@ class ActionRecognizer:
     ) -> List[Dict]:
         """Extract actions from pose and object data"""
         
-        actions = []
-        frame_actions = {}
-        
-        # Analyze each frame
-        for frame_id in sorted(pose_data.keys()):
-            frame_num = int(frame_id.split('_')[1])
-            
-            pose = pose_data.get(frame_id)
-            objects = objects_data.get(frame_id, [])
-            
-            if pose:
-                detected_action = self.detect_action(pose, objects)
-                frame_actions[frame_num] = detected_action
-        
-        # Group consecutive frames with same action
-        if frame_actions:
-            current_action = None
-            start_frame = 1
-            
-            for frame_num in sorted(frame_actions.keys()):
-                action = frame_actions[frame_num]
-                
-                if action != current_action:
-                    if current_action:
-                        actions.append({
-                            "label": current_action,
-                            "start_frame": start_frame,
-                            "end_frame": frame_num - 1,
-                            "confidence": 0.85 + np.random.uniform(-0.1, 0.1)
-                        })
-                    current_action = action
-                    start_frame = frame_num
-            
-            # Add final action
-            if current_action:
-                actions.append({
-                    "label": current_action,
-                    "start_frame": start_frame,
-                    "end_frame": max(frame_actions.keys()),
-                    "confidence": 0.85 + np.random.uniform(-0.1, 0.1)
-                })
-        
-        # Save to file
-        actions_path = output_dir / "actions.json"
-        with open(actions_path, 'w') as f:
-            json.dump(actions, f, indent=2)
-        
+        frames, keypoints = self.pose_arrays(pose_data)
+        return self._save(self.extract_from_arrays(frames, keypoints, objects_data), output_dir)
+    
+    def extract_from_store(self, pose_store: PoseStore, objects_data: Dict, output_dir: Path) -> List[Dict]:
+        """Extract actions from stored pose records without converting them to dicts"""
+        actions = self.extract_from_arrays(pose_store.frames, pose_store.keypoints, objects_data)
+        return self._save(actions, output_dir)
+    
+    def _save(self, actions: List[Dict], output_dir: Path) -> List[Dict]:
+        # Replace the file rather than rewrite it, as it may be hard-linked
+        # from the result cache
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=".actions.json.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(actions, f, indent=2)
+            os.replace(tmp_path, output_dir / "actions.json")
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
         return actions
     
+    def extract_from_arrays(self, frames: np.ndarray, keypoints: np.ndarray, objects_data: Dict) -> List[Dict]:
+        """Extract action segments from sorted frame numbers and their keypoints"""
+        labels = self.label_frames(keypoints, self.object_arrays(frames, objects_data))
+        return self.segments(frames, labels)
+    
     def detect_action(self, pose: Dict, objects: List) -> str:
-        """Detect action based on pose and objects"""
-        keypoints = pose['keypoints']
+        """Detect the action of a single frame"""
+        frames, keypoints = self.pose_arrays({'frame_0': pose})
+        labels = self.label_frames(keypoints, self.object_arrays(frames, {'frame_0': objects}))
+        return ACTIONS[labels[0]]
+    
+    def pose_arrays(self, pose_data: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Convert frame_id -> pose dicts into sorted frame numbers and keypoints.
+        
+        Only the keypoints used by the rules are filled in; the others stay
+        NaN. Frames without a pose and keys that are not frame ids are left
+        out.
+        """
+        frames = []
+        rows, slots, coordinates = [], [], []
+        for frame_id, pose in pose_data.items():
+            frame_num = _frame_number(frame_id)
+            if not pose or frame_num is None:
+                continue
+            row = len(frames)
+            frames.append(frame_num)
+            keypoints = pose['keypoints']
+            for name in RULE_KEYPOINTS:
+                coords = keypoints.get(name)
+                if coords is not None:
+                    rows.append(row)
+                    slots.append(LANDMARK_INDEX[name])
+                    coordinates.extend(coords[:2])
         
-        # Simple rule-based detection
-        if self.detect_reach(keypoints, objects):
-            return 'reach'
-        elif self.detect_pick(keypoints, objects):
-            return 'pick'
-        elif self.detect_place(keypoints, objects):
-            return 'place'
-        elif self.detect_walk(keypoints):
-            return 'walk'
-        else:
-            return 'idle'
+        keypoint_array = np.full((len(frames), len(LANDMARK_NAMES), 3), np.nan)
+        if rows:
+            keypoint_array[rows, slots, :2] = np.array(coordinates, dtype=np.float64).reshape(-1, 2)
+        
+        frames = np.array(frames, dtype=np.int64)
+        if np.any(frames[1:] < frames[:-1]):
+            order = np.argsort(frames, kind='stable')
+            return frames[order], keypoint_array[order]
+        return frames, keypoint_array
     
-    def detect_reach(self, keypoints: Dict, objects: List) -> bool:
-        """Detect reaching action"""
-        if 'left_wrist' in keypoints and 'left_shoulder' in keypoints:
-            wrist = keypoints['left_wrist']
-            shoulder = keypoints['left_shoulder']
-            
-            # Check if arm is extended
-            arm_extension = abs(wrist[1] - shoulder[1])
-            if arm_extension > 100:
-                return True
+    def object_arrays(self, frames: np.ndarray, objects_data: Dict) -> Dict[str, np.ndarray]:
+        """
+        Flatten the object boxes of the given frames into arrays.
         
-        if 'right_wrist' in keypoints and 'right_shoulder' in keypoints:
-            wrist = keypoints['right_wrist']
-            shoulder = keypoints['right_shoulder']
-            
-            arm_extension = abs(wrist[1] - shoulder[1])
-            if arm_extension > 100:
-                return True
+        Returns rows (index of the frame each box belongs to), bboxes (N x 4)
+        and the pick and place masks of the box labels.
+        """
+        row_of_frame = {int(frame_num): row for row, frame_num in enumerate(frames)}
+        rows, bboxes, labels = [], [], []
+        for frame_id, objects in objects_data.items():
+            row = row_of_frame.get(_frame_number(frame_id))
+            if row is None:
+                continue
+            for obj in objects:
+                bboxes.extend(obj['bbox'][:4])
+                labels.append(obj['label'])
+            rows.extend([row] * len(objects))
         
-        return False
+        labels = np.array(labels, dtype=object)
+        return {
+            'rows': np.array(rows, dtype=np.int64),
+            'bboxes': np.array(bboxes, dtype=np.float64).reshape(-1, 4),
+            'pick': np.isin(labels, PICK_LABELS),
+            'place': np.isin(labels, PLACE_LABELS)
+        }
     
-    def detect_pick(self, keypoints: Dict, objects: List) -> bool:
-        """Detect picking action"""
-        # Check if hand is near an object
-        for obj in objects:
-            if obj['label'] in ['cup', 'bottle', 'cell phone', 'book']:
-                bbox = obj['bbox']
-                center = [(bbox[0] + bbox[2])/2, (bbox[1] + bbox[3])/2]
-                
-                for wrist_key in ['left_wrist', 'right_wrist']:
-                    if wrist_key in keypoints:
-                        wrist = keypoints[wrist_key]
-                        distance = np.sqrt((wrist[0] - center[0])**2 + (wrist[1] - center[1])**2)
-                        if distance < 50:
-                            return True
+    def label_frames(self, keypoints: np.ndarray, objects: Dict[str, np.ndarray]) -> np.ndarray:
+        """Index into ACTIONS of the action of every frame"""
+        labels = np.full(len(keypoints), ACTIONS.index('idle'), dtype=np.int8)
+        unlabelled = np.ones(len(keypoints), dtype=bool)
         
-        return False
+        for action, rule in self.action_rules.items():
+            mask = rule(keypoints, objects) & unlabelled
+            labels[mask] = ACTIONS.index(action)
+            unlabelled &= ~mask
+        
+        return labels
+    
+    def reach_mask(self, keypoints: np.ndarray, objects: Dict[str, np.ndarray]) -> np.ndarray:
+        """Frames where either arm is extended vertically"""
+        left = np.abs(keypoints[:, LEFT_WRIST, 1] - keypoints[:, LEFT_SHOULDER, 1]) > REACH_MIN_EXTENSION
+        right = np.abs(keypoints[:, RIGHT_WRIST, 1] - keypoints[:, RIGHT_SHOULDER, 1]) > REACH_MIN_EXTENSION
+        return left | right
     
-    def detect_place(self, keypoints: Dict, objects: List) -> bool:
-        """Detect placing action"""
-        # Similar to pick but with downward motion
-        for obj in objects:
-            if obj['label'] in ['table', 'desk', 'counter']:
-                bbox = obj['bbox']
-                
-                for wrist_key in ['left_wrist', 'right_wrist']:
-                    if wrist_key in keypoints:
-                        wrist = keypoints[wrist_key]
-                        # Check if wrist is above table level
-                        if bbox[1] < wrist[1] < bbox[3]:
-                            return True
+    def pick_mask(self, keypoints: np.ndarray, objects: Dict[str, np.ndarray]) -> np.ndarray:
+        """Frames where a wrist is near the center of a small object"""
+        rows, bboxes = objects['rows'][objects['pick']], objects['bboxes'][objects['pick']]
+        centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
         
-        return False
+        hit = np.zeros(len(rows), dtype=bool)
+        for wrist in (LEFT_WRIST, RIGHT_WRIST):
+            offset = keypoints[rows, wrist, :2] - centers
+            hit |= np.hypot(offset[:, 0], offset[:, 1]) < PICK_MAX_DISTANCE
+        
+        return self._frames_with(hit, rows, len(keypoints))
     
-    def detect_walk(self, keypoints: Dict) -> bool:
-        """Detect walking action"""
-        if 'left_ankle' in keypoints and 'right_ankle' in keypoints:
-            left_ankle = keypoints['left_ankle']
-            right_ankle = keypoints['right_ankle']
-            
-            # Check if ankles are separated (stride)
-            ankle_distance = abs(left_ankle[0] - right_ankle[0])
-            if ankle_distance > 50:
-                return True
+    def place_mask(self, keypoints: np.ndarray, objects: Dict[str, np.ndarray]) -> np.ndarray:
+        """Frames where a wrist is level with a surface"""
+        rows, bboxes = objects['rows'][objects['place']], objects['bboxes'][objects['place']]
+        
+        hit = np.zeros(len(rows), dtype=bool)
+        for wrist in (LEFT_WRIST, RIGHT_WRIST):
+            wrist_y = keypoints[rows, wrist, 1]
+            hit |= (bboxes[:, 1] < wrist_y) & (wrist_y < bboxes[:, 3])
         
-        return False
+        return self._frames_with(hit, rows, len(keypoints))
+    
+    def walk_mask(self, keypoints: np.ndarray, objects: Dict[str, np.ndarray]) -> np.ndarray:
+        """Frames where the ankles are apart in a stride"""
+        return np.abs(keypoints[:, LEFT_ANKLE, 0] - keypoints[:, RIGHT_ANKLE, 0]) > WALK_MIN_STRIDE
+    
+    @staticmethod
+    def _frames_with(hit: np.ndarray, rows: np.ndarray, num_frames: int) -> np.ndarray:
+        """Per-frame mask that is True where any of the frame's boxes was hit"""
+        mask = np.zeros(num_frames, dtype=bool)
+        mask[rows[hit]] = True
+        return mask
     
-    def detect_idle(self, keypoints: Dict) -> bool:
-        """Default idle state"""
-        return True
\ No newline at end of file
+    def segments(self, frames: np.ndarray, labels: np.ndarray) -> List[Dict[str, Any]]:
+        """Group runs of frames with the same action into segments.
+        
+        A segment ends the frame before the next one starts, and the last
+        one ends at the last labelled frame.
+        """
+        if not len(frames):
+            return []
+        
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        start_frames = frames[starts]
+        end_frames = np.r_[start_frames[1:] - 1, frames[-1]]
+        confidences = 0.85 + np.random.uniform(-0.1, 0.1, size=len(starts))
+        
+        return [
+            {
+                "label": ACTIONS[label],
+                "start_frame": int(start),
+                "end_frame": int(end),
+                "confidence": float(confidence)
+            }
+            for label, start, end, confidence in zip(labels[starts], start_frames, end_frames, confidences)
+        ]
@@ -0,0 +1,268 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterator, Optional, Sequence, Tuple
+
+from services import edit_log
+from services.pose_store import PoseStore, POSE_FILE, frame_key
+from services.frame_index import (
+    OBJECTS_FILE, ACTIONS_FILE, read_frame_objects, read_frame_actions, iter_frame_objects, read_range_actions
+)
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """Identify a file version by modification time and size"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _signature(path: Path, deps: Sequence[Path] = ()) -> tuple:
+    """Signature of a file plus the files its cached value was derived from.
+
+    A missing file has the signature None, so its absence is cached like
+    any other version.
+    """
+    return (_file_signature(path),) + tuple(_file_signature(dep) for dep in deps)
+
+
+class AnnotationCache:
+    """Bounded LRU cache of parsed per-video annotation files.
+
+    Entries are keyed by file path and kind, and are only served while the
+    file's mtime and size still match what was loaded, so writes made by
+    another process are picked up on the next read. Cached values are
+    shared between requests and must be treated as read-only; write paths
+    call put() or invalidate() after touching a file.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: Path, kind: str, loader: Callable[[], Any], deps: Sequence[Path] = ()) -> Any:
+        """Return the cached value for a file, loading it on a miss.
+
+        deps are other files the value depends on, such as edit logs; the
+        entry is also reloaded when any of them changes.
+        """
+        key = (str(path), kind)
+        signature = _signature(path, deps)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+        # Keep the signature taken before loading: if the file was replaced
+        # meanwhile, the next read sees a new signature and reloads. A file
+        # that appeared while loading, possibly created by the loader
+        # itself, may or may not be what was read, so nothing is cached
+        if signature[0] is not None or _file_signature(path) is None:
+            self._store(key, signature, value)
+        return value
+
+    def put(self, path: Path, kind: str, value: Any, deps: Sequence[Path] = ()):
+        """Replace a cached value right after writing its file"""
+        self._store((str(path), kind), _signature(path, deps), value)
+
+    def invalidate(self, path: Path, kind: Optional[str] = None):
+        """Drop the cached values of a file, for one kind or all of them"""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == str(path) and (kind is None or key[1] == kind):
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _store(self, key, signature, value):
+        with self._lock:
+            self._entries[key] = (signature, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+
+# Shared by all routes of the API process
+annotation_cache = AnnotationCache()
+
+
+def _load_json(path: Path) -> Any:
+    if not path.exists():
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_edits(data_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Get the pending single-frame edits of a video per kind"""
+    log_paths = edit_log.log_paths(data_dir)
+    return annotation_cache.get(
+        log_paths[-1], "edits", lambda: edit_log.read_edits(data_dir), deps=log_paths[:-1]
+    )
+
+
+def load_pose(data_dir: Path) -> Optional[PoseStore]:
+    """Get the memory-mapped pose store of a video, without pending edits"""
+    return annotation_cache.get(data_dir / POSE_FILE, "store", lambda: PoseStore.open(data_dir))
+
+
+def load_pose_frame(data_dir: Path, frame_id: str) -> Optional[Dict[str, Any]]:
+    """Get one frame of pose data with pending edits applied"""
+    edited = load_edits(data_dir)["pose"].get(frame_id)
+    if edited is not None:
+        return edited
+
+    pose_store = load_pose(data_dir)
+    return pose_store.get(frame_id) if pose_store is not None else None
+
+
+def pose_frame_count(data_dir: Path) -> int:
+    """Number of frames with pose data, counting frames added by edits"""
+    pose_store = load_pose(data_dir)
+    if pose_store is None:
+        return 0
+    added = [frame_id for frame_id in load_edits(data_dir)["pose"] if frame_id not in pose_store]
+    return len(pose_store) + len(added)
+
+
+def load_pose_dict(data_dir: Path) -> Optional[Dict[str, Dict]]:
+    """Get the pose data of a video as a frame_id -> pose dict, edits applied"""
+    pose_path = data_dir / POSE_FILE
+
+    def load_base():
+        pose_store = load_pose(data_dir)
+        return pose_store.to_dict() if pose_store is not None else None
+
+    def load_merged():
+        return _merge(annotation_cache.get(pose_path, "base", load_base), load_edits(data_dir)["pose"])
+
+    return annotation_cache.get(pose_path, "merged", load_merged, deps=edit_log.log_paths(data_dir))
+
+
+def load_objects(data_dir: Path) -> Optional[Dict[str, List]]:
+    """Get the parsed objects.json of a video, edits applied"""
+    path = data_dir / "objects.json"
+
+    def load_merged():
+        return _merge(annotation_cache.get(path, "base", lambda: _load_json(path)), load_edits(data_dir)["objects"])
+
+    return annotation_cache.get(path, "merged", load_merged, deps=edit_log.log_paths(data_dir))
+
+
+def load_frame(data_dir: Path, frame_num: int) -> Dict[str, Any]:
+    """Get all annotations of one frame without loading whole files"""
+    frame_id = frame_key(frame_num)
+    result = {"frame": frame_num}
+
+    pose = load_pose_frame(data_dir, frame_id)
+    if pose is not None:
+        result["pose"] = pose
+
+    # Prefer a pending edit over the per-frame index
+    if (data_dir / OBJECTS_FILE).exists():
+        objects = load_edits(data_dir)["objects"].get(frame_id)
+        if objects is None:
+            objects = read_frame_objects(data_dir, frame_num)
+        if objects is not None:
+            result["objects"] = objects
+
+    # Relevant actions through the interval index
+    if (data_dir / ACTIONS_FILE).exists():
+        result["actions"] = read_frame_actions(data_dir, frame_num)
+
+    return result
+
+
+def iter_frames(data_dir: Path, start: int, end: int) -> Iterator[Dict[str, Any]]:
+    """Annotations of the frames from start up to end, as load_frame() returns them.
+
+    For callers that walk a range of frames in order: every file is checked
+    and opened once for the range instead of once per frame, and the active
+    actions are kept up to date with a sweep over the actions in the range.
+    """
+    edits = load_edits(data_dir)
+    pose_store = load_pose(data_dir)
+    objects = {}
+    if (data_dir / OBJECTS_FILE).exists():
+        objects = dict(iter_frame_objects(data_dir, start, end))
+    actions = None
+    if (data_dir / ACTIONS_FILE).exists():
+        actions = read_range_actions(data_dir, start, end - 1)
+
+    # Positions in actions, in order of their start frame
+    starts = sorted(range(len(actions or [])), key=lambda i: actions[i]['start_frame'])
+    next_start = 0
+    active: List[int] = []
+
+    for frame_num in range(start, end):
+        frame_id = frame_key(frame_num)
+        result = {"frame": frame_num}
+
+        pose = edits["pose"].get(frame_id)
+        if pose is None and pose_store is not None:
+            pose = pose_store.get(frame_id)
+        if pose is not None:
+            result["pose"] = pose
+
+        frame_objects = edits["objects"].get(frame_id, objects.get(frame_num))
+        if frame_objects is not None:
+            result["objects"] = frame_objects
+
+        if actions is not None:
+            while next_start < len(starts) and actions[starts[next_start]]['start_frame'] <= frame_num:
+                active.append(starts[next_start])
+                next_start += 1
+            active = [i for i in active if actions[i]['end_frame'] >= frame_num]
+            result["actions"] = [actions[i] for i in sorted(active)]
+
+        yield result
+
+
+def annotation_version(data_dir: Path) -> str:
+    """Version tag of a video's annotations that changes with every save or edit"""
+    paths = [data_dir / POSE_FILE, data_dir / OBJECTS_FILE, data_dir / ACTIONS_FILE] + edit_log.log_paths(data_dir)
+    signatures = [_file_signature(path) for path in paths]
+    return hashlib.sha256(repr(signatures).encode()).hexdigest()[:16]
+
+
+def load_actions(data_dir: Path) -> Optional[List[Dict]]:
+    """Get the parsed actions.json of a video"""
+    path = data_dir / "actions.json"
+    return annotation_cache.get(path, "json", lambda: _load_json(path))
+
+
+def _merge(base: Optional[Dict], edits: Dict) -> Optional[Dict]:
+    """Overlay pending frame edits on base data without touching the cached base"""
+    if base is None or not edits:
+        return base
+    merged = dict(base)
+    merged.update(edits)
+    return merged
@@ -0,0 +1,102 @@
+import os
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+READ_BYTES = 1024 * 1024
+
+# Renditions are replaced, never edited, so clients may reuse them for a
+# while and then revalidate them with their ETag
+CACHE_CONTROL = "public, max-age=3600"
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def entity_tag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte of a single "bytes=" range, or None to send the whole file.
+
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    first, _, last = ranges.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+async def _read_range(path: Path, start: int, end: int) -> AsyncIterator[bytes]:
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(READ_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request: Request, path: Path, media_type: str,
+                         cache_control: str = CACHE_CONTROL) -> Response:
+    """Serve a file with support for Range, If-Range and If-None-Match requests.
+
+    Players fetch video with Range requests, so seeking only downloads the
+    bytes around the new position instead of the whole file.
+    """
+    stat = path.stat()
+    etag = entity_tag(stat)
+    headers = {"Accept-Ranges": "bytes", "ETag": etag, "Cache-Control": cache_control}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    # A client holding an older version asks for the whole file with If-Range
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{stat.st_size}"})
+
+    if byte_range is None:
+        return FileResponse(path=str(path), media_type=media_type, headers=headers, stat_result=stat)
+
+    start, end = byte_range
+    return StreamingResponse(
+        _read_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+            "Content-Length": str(end - start + 1)
+        }
+    )
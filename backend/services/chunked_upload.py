@@ -0,0 +1,164 @@
+import os
+import json
+import uuid
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, AsyncIterator, Tuple
+
+import aiofiles
+
+PARTIAL_DIR = "uploads/partial"
+ALLOWED_EXTENSIONS = ('.mp4', '.avi', '.mov')
+
+# Chunk size suggested to clients; chunks of any size are accepted
+CHUNK_SIZE = 8 * 1024 * 1024
+READ_BYTES = 1024 * 1024
+
+
+class UploadNotFound(LookupError):
+    pass
+
+
+class OffsetMismatch(ValueError):
+    """A chunk did not start where the upload currently ends"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+def _hash_file(path: Path) -> Tuple["hashlib._Hash", int]:
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_BYTES)
+            if not block:
+                break
+            hasher.update(block)
+            size += len(block)
+    return hasher, size
+
+
+async def save_stream(chunks: AsyncIterator[bytes], path: Path) -> str:
+    """Write a stream of chunks to a file and return the SHA-256 of its content"""
+    hasher = hashlib.sha256()
+    async with aiofiles.open(path, 'wb') as f:
+        async for chunk in chunks:
+            await f.write(chunk)
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ChunkedUploads:
+    """Resumable uploads sent as a sequence of chunks.
+
+    Each upload is a partial file plus a JSON record in PARTIAL_DIR. The
+    offset to resume from is the size of the partial file, so uploads
+    survive dropped connections and API restarts. The SHA-256 of the
+    content is updated as chunks arrive; after a restart it is rebuilt
+    once from the bytes already on disk.
+    """
+
+    def __init__(self, directory: str = PARTIAL_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # upload_id -> (hasher, bytes hashed)
+        self._hashers: Dict[str, Tuple["hashlib._Hash", int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _record_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.json"
+
+    def _part_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.part"
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        if upload_id not in self._locks:
+            self._locks[upload_id] = asyncio.Lock()
+        return self._locks[upload_id]
+
+    def create(self, filename: str, size: int) -> Dict[str, Any]:
+        """Start an upload of a file with a known size"""
+        extension = Path(filename).suffix.lower()
+        if extension not in ALLOWED_EXTENSIONS:
+            raise ValueError(f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
+        if size < 0:
+            raise ValueError("Upload size must not be negative")
+
+        upload_id = str(uuid.uuid4())
+        self._part_path(upload_id).touch()
+        with open(self._record_path(upload_id), 'w') as f:
+            json.dump({
+                "upload_id": upload_id,
+                "filename": filename,
+                "extension": extension,
+                "size": size,
+                "created_at": time.time()
+            }, f)
+        return self.info(upload_id)
+
+    def info(self, upload_id: str) -> Dict[str, Any]:
+        """Upload record with the offset the next chunk has to start at"""
+        try:
+            with open(self._record_path(upload_id), 'r') as f:
+                record = json.load(f)
+            offset = self._part_path(upload_id).stat().st_size
+        except (FileNotFoundError, ValueError):
+            raise UploadNotFound(upload_id)
+        return {**record, "offset": offset, "chunk_size": CHUNK_SIZE}
+
+    async def _hasher(self, upload_id: str, offset: int) -> "hashlib._Hash":
+        hasher, hashed = self._hashers.get(upload_id, (None, -1))
+        if hashed != offset:
+            # First chunk after a restart or an interrupted write
+            hasher, hashed = await asyncio.to_thread(_hash_file, self._part_path(upload_id))
+            self._hashers[upload_id] = (hasher, hashed)
+        return hasher
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Append a chunk that starts at offset and return the new offset"""
+        async with self._lock(upload_id):
+            info = self.info(upload_id)
+            if offset != info["offset"]:
+                raise OffsetMismatch(info["offset"])
+
+            hasher = await self._hasher(upload_id, offset)
+            written = offset
+            try:
+                async with aiofiles.open(self._part_path(upload_id), 'ab') as f:
+                    async for chunk in chunks:
+                        if written + len(chunk) > info["size"]:
+                            raise ValueError("Chunk extends past the declared upload size")
+                        await f.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+            finally:
+                self._hashers[upload_id] = (hasher, written)
+            return written
+
+    async def finish(self, upload_id: str, path: Path) -> str:
+        """Move a complete upload to path and return the SHA-256 of its content"""
+        async with self._lock(upload_id):
+            info = self.info(upload_id)
+            if info["offset"] != info["size"]:
+                raise OffsetMismatch(info["offset"])
+
+            hasher = await self._hasher(upload_id, info["offset"])
+            os.replace(self._part_path(upload_id), path)
+            self._discard(upload_id)
+            return hasher.hexdigest()
+
+    async def abort(self, upload_id: str):
+        """Drop an unfinished upload and its partial file"""
+        async with self._lock(upload_id):
+            self.info(upload_id)
+            self._part_path(upload_id).unlink(missing_ok=True)
+            self._discard(upload_id)
+
+    def _discard(self, upload_id: str):
+        self._record_path(upload_id).unlink(missing_ok=True)
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
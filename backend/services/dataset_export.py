@@ -0,0 +1,173 @@
+import os
+import json
+import uuid
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterator, Optional
+
+from services.exporters import iter_json, iter_csv, iter_yaml
+
+EXPORTS_DIR = "exports"
+DATA_DIR = "data"
+
+DEFAULT_VIDEOS_PER_SHARD = 100
+MANIFEST_FILE = "manifest.json"
+
+FORMATS = ("json", "csv", "yaml")
+
+# Processes that write shards at the same time; an export job shares the
+# machine with the video jobs of the worker pool
+DEFAULT_SHARD_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+
+def is_video_id(video_id: str) -> bool:
+    """Whether video_id has the format of the ids given to uploads"""
+    try:
+        return str(uuid.UUID(video_id)) == video_id
+    except (ValueError, TypeError, AttributeError):
+        return False
+
+
+def export_dir(export_id: str) -> Path:
+    return Path(EXPORTS_DIR) / export_id
+
+
+def shard_name(index: int) -> str:
+    return f"shard-{index:05d}.zip"
+
+
+def plan_shards(video_ids: List[str], videos_per_shard: int) -> List[List[str]]:
+    """Split the videos of a dataset into shards of at most videos_per_shard"""
+    videos_per_shard = max(1, videos_per_shard)
+    return [video_ids[i:i + videos_per_shard] for i in range(0, len(video_ids), videos_per_shard)]
+
+
+def finished_shards(export_id: str) -> List[str]:
+    """Names of the shards of an export that are complete on disk"""
+    directory = export_dir(export_id)
+    if not directory.exists():
+        return []
+    return sorted(path.name for path in directory.glob("shard-*.zip"))
+
+
+def _export_parts(format: str, data_dir: Path, video_id: str) -> Iterator[str]:
+    if format == "json":
+        return iter_json(data_dir)
+    if format == "csv":
+        return iter_csv(data_dir)
+    return iter_yaml(data_dir, video_id)
+
+
+def write_shard(path: Path, video_ids: List[str], format: str) -> Dict[str, List[str]]:
+    """Write one zip shard with an annotations file per video.
+
+    Each file is streamed into the archive as it is generated, so memory use
+    does not depend on video length. The shard only appears under its final
+    name once it is complete, after a record of the videos it holds. Returns
+    the video ids written and skipped.
+    """
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    written, skipped = [], []
+
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for video_id in video_ids:
+            data_dir = Path(DATA_DIR) / video_id
+            # Ids become paths and archive member names, so only upload ids are read
+            if not is_video_id(video_id) or not data_dir.is_dir():
+                skipped.append(video_id)
+                continue
+            with archive.open(f"{video_id}/annotations.{format}", "w", force_zip64=True) as member:
+                for part in _export_parts(format, data_dir, video_id):
+                    member.write(part.encode())
+            written.append(video_id)
+
+    record = {"written": written, "skipped": skipped}
+    _write_json(_record_path(path), record)
+    os.replace(tmp_path, path)
+    return record
+
+
+def write_dataset(export_id: str, video_ids: List[str], format: str = "json",
+                  videos_per_shard: int = DEFAULT_VIDEOS_PER_SHARD,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                  workers: int = DEFAULT_SHARD_WORKERS) -> Path:
+    """Write a sharded dataset export, resuming after the last finished shard.
+
+    Shards are independent zip files, so up to workers of them are written
+    at once in separate processes; compressing and formatting the
+    annotations is CPU-bound. Shards that already exist from an earlier
+    attempt are kept as they are.
+    A manifest listing every shard and its videos is written last and marks
+    the export as complete.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported format: {format}")
+
+    directory = export_dir(export_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    shards = plan_shards(video_ids, videos_per_shard)
+
+    shard_videos = _read_shard_records(directory)
+    pending = [index for index in range(len(shards)) if shard_name(index) not in shard_videos]
+    done = [index for index in range(len(shards)) if shard_name(index) in shard_videos]
+
+    def report(index: int):
+        done.append(index)
+        if progress is not None:
+            progress({
+                "shards_done": len(done),
+                "total_shards": len(shards),
+                "videos_done": sum(len(shards[i]) for i in done),
+                "total_videos": len(video_ids)
+            })
+
+    workers = max(1, min(workers, len(pending)))
+    if workers == 1:
+        for index in pending:
+            shard_videos[shard_name(index)] = write_shard(directory / shard_name(index), shards[index], format)
+            report(index)
+    else:
+        # Spawned so the pool does not inherit the models of the worker process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = {
+                pool.submit(write_shard, directory / shard_name(index), shards[index], format): index
+                for index in pending
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                shard_videos[shard_name(index)] = future.result()
+                report(index)
+
+    manifest = {
+        "export_id": export_id,
+        "format": format,
+        "videos_per_shard": videos_per_shard,
+        "shards": [
+            {"name": shard_name(index), **shard_videos[shard_name(index)]}
+            for index in range(len(shards))
+        ]
+    }
+    _write_json(directory / MANIFEST_FILE, manifest)
+    return directory
+
+
+def _record_path(shard_path: Path) -> Path:
+    return shard_path.with_name(f".{shard_path.name}.json")
+
+
+def _read_shard_records(directory: Path) -> Dict[str, Dict[str, List[str]]]:
+    """Videos written and skipped per finished shard"""
+    records = {}
+    for path in directory.glob("shard-*.zip"):
+        with open(_record_path(path), "r") as f:
+            records[path.name] = json.load(f)
+    return records
+
+
+def _write_json(path: Path, data: Any):
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,241 @@
+import os
+import json
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterator, Tuple
+
+from services.pose_store import PoseStore, pose_to_records, save_pose_records
+
+EDIT_LOG_FILE = "edits.jsonl"
+# The log is renamed to this while a compaction folds it into the base files
+COMPACTING_LOG_FILE = "edits.compacting.jsonl"
+
+OBJECTS_FILE = "objects.json"
+
+EDIT_KINDS = ("pose", "objects")
+
+# Schedule a compaction once the pending log grows past this size
+COMPACT_THRESHOLD_BYTES = 256 * 1024
+
+# Lock files in the video directory, so processes exclude each other too
+BASE_LOCK_FILE = ".base.lock"
+LOG_LOCK_FILE = ".edits.lock"
+
+_locks: Dict[str, Tuple[threading.Lock, threading.Lock]] = {}
+_locks_guard = threading.Lock()
+
+
+def _video_locks(data_dir: Path) -> Tuple[threading.Lock, threading.Lock]:
+    """Get the in-process (base, log) locks of a video directory"""
+    with _locks_guard:
+        key = str(data_dir.resolve())
+        if key not in _locks:
+            _locks[key] = (threading.Lock(), threading.Lock())
+        return _locks[key]
+
+
+@contextmanager
+def _locked(thread_lock: threading.Lock, lock_path: Path, blocking: bool = True) -> Iterator[bool]:
+    """Hold a thread lock and an flock on lock_path; yields False if not blocking and either is taken.
+
+    The thread lock orders the threads of this process, the flock excludes
+    other API workers and CLI compactions working on the same video.
+    """
+    if not thread_lock.acquire(blocking=blocking):
+        yield False
+        return
+    try:
+        with open(lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+            except BlockingIOError:
+                acquired = False
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    finally:
+        thread_lock.release()
+
+
+def _log_lock(data_dir: Path):
+    """Held for single appends to the log or renames of it"""
+    return _locked(_video_locks(data_dir)[1], data_dir / LOG_LOCK_FILE)
+
+
+def _base_lock(data_dir: Path, blocking: bool = True):
+    """Held while the base files are rewritten, by compaction or full saves"""
+    return _locked(_video_locks(data_dir)[0], data_dir / BASE_LOCK_FILE, blocking)
+
+
+def log_paths(data_dir: Path) -> List[Path]:
+    """Edit log files of a video, oldest first"""
+    return [data_dir / COMPACTING_LOG_FILE, data_dir / EDIT_LOG_FILE]
+
+
+def append_edit(data_dir: Path, kind: str, frame_id: str, value: Any) -> bool:
+    """Append a single-frame edit to the log.
+
+    Costs one small append regardless of video length. Returns True when the
+    log is large enough that a compaction should be scheduled.
+    """
+    if kind not in EDIT_KINDS:
+        raise ValueError(f"Unknown edit kind: {kind}")
+    if kind == "pose":
+        # Reject frames the columnar store could not hold before logging them
+        pose_to_records({frame_id: value})
+
+    line = json.dumps({"kind": kind, "frame_id": frame_id, "value": value}) + "\n"
+
+    with _log_lock(data_dir):
+        with open(data_dir / EDIT_LOG_FILE, 'a') as f:
+            f.write(line)
+            f.flush()
+            size = f.tell()
+
+    return size >= COMPACT_THRESHOLD_BYTES
+
+
+def read_edits(data_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """Read pending edits per kind as frame_id -> value, later edits winning"""
+    edits = {kind: {} for kind in EDIT_KINDS}
+    for path in log_paths(data_dir):
+        _apply_log(path, edits)
+    return edits
+
+
+def _read_entries(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+
+    entries = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Blank or torn line from a crashed writer
+                continue
+    return entries
+
+
+def _apply_log(path: Path, edits: Dict[str, Dict[str, Any]]):
+    for entry in _read_entries(path):
+        edits[entry["kind"]][entry["frame_id"]] = entry["value"]
+
+
+def compact_edits(data_dir: Path) -> bool:
+    """Fold the edit log into the base pose and objects files.
+
+    Meant to run in the background. New edits keep landing in a fresh log
+    while the old one is being applied, and readers keep merging both until
+    the compacted log is removed. Returns False if a compaction or full save
+    is already running for this video.
+    """
+    with _base_lock(data_dir, blocking=False) as acquired:
+        if not acquired:
+            return False
+
+        compacting_path = data_dir / COMPACTING_LOG_FILE
+        with _log_lock(data_dir):
+            # A leftover file means a previous compaction died; finish it first
+            if not compacting_path.exists():
+                if not (data_dir / EDIT_LOG_FILE).exists():
+                    return True
+                os.replace(data_dir / EDIT_LOG_FILE, compacting_path)
+
+        edits = {kind: {} for kind in EDIT_KINDS}
+        _apply_log(compacting_path, edits)
+
+        if edits["pose"]:
+            pose_store = PoseStore.open(data_dir)
+            pose_data = pose_store.to_dict() if pose_store is not None else {}
+            pose_data.update(edits["pose"])
+            save_pose_records(data_dir, pose_to_records(pose_data))
+
+        if edits["objects"]:
+            objects_path = data_dir / OBJECTS_FILE
+            objects_data = {}
+            if objects_path.exists():
+                with open(objects_path, 'r') as f:
+                    objects_data = json.load(f)
+            objects_data.update(edits["objects"])
+            _write_json(objects_path, objects_data)
+
+        with _log_lock(data_dir):
+            compacting_path.unlink()
+        return True
+
+
+def replace_base(data_dir: Path, kind: str, write: Callable[[], Any]) -> Any:
+    """Rewrite a whole base file and drop the pending edits it supersedes.
+
+    Edits appended while the base is being written are newer than it and
+    are kept; only the log up to its length before the write is filtered.
+    """
+    with _base_lock(data_dir):
+        # Holding the base lock keeps compactions from renaming the logs
+        with _log_lock(data_dir):
+            lengths = {path: _file_length(path) for path in log_paths(data_dir)}
+        result = write()
+        with _log_lock(data_dir):
+            for path, length in lengths.items():
+                _drop_kind(path, kind, length)
+    return result
+
+
+def _file_length(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _drop_kind(path: Path, kind: str, length: int):
+    """Drop the entries of a kind from the first length bytes of a log"""
+    if not length or not path.exists():
+        return
+
+    with open(path, 'rb') as f:
+        superseded = f.read(length)
+        newer = f.read()
+
+    kept = []
+    for line in superseded.splitlines(keepends=True):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # Blank or torn line from a crashed writer
+            continue
+        if entry["kind"] != kind:
+            kept.append(line)
+
+    if kept or newer:
+        def write(f):
+            f.writelines(kept)
+            f.write(newer)
+        _replace(path, write, 'wb')
+    else:
+        path.unlink()
+
+
+def _write_json(path: Path, data: Any):
+    _replace(path, lambda f: json.dump(data, f, indent=2))
+
+
+def _replace(path: Path, write: Callable[[Any], Any], mode: str = 'w'):
+    # The pipeline and the API write the same files, so every writer needs
+    # its own temporary file
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
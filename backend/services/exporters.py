@@ -0,0 +1,253 @@
+import csv
+import io
+import json
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+import yaml
+
+from services.annotation_cache import load_pose, load_edits, load_actions
+from services.frame_index import OBJECTS_FILE, iter_frame_objects
+from services.pose_store import LANDMARK_NAMES, LANDMARK_INDEX, frame_key, frame_number
+
+# Bytes collected before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+# Pose rows scanned at a time when working out the CSV columns
+SCAN_ROWS = 65536
+
+# Frame rate assumed for timestamps in the ROS export
+ROS_FPS = 30.0
+
+# Use libyaml's emitter when PyYAML was built with it
+YamlDumper = getattr(yaml, "CDumper", yaml.Dumper)
+
+
+def iter_pose(data_dir: Path) -> Optional[Iterator[Tuple[str, Dict[str, Any]]]]:
+    """Iterate over pose frames with pending edits applied, or None without pose data.
+
+    Frames are read one at a time from the memory-mapped store; frames that
+    only exist as edits come last, as in load_pose_dict.
+    """
+    pose_store = load_pose(data_dir)
+    if pose_store is None:
+        return None
+    return _with_edits(pose_store.items(), load_edits(data_dir)["pose"])
+
+
+def iter_objects(data_dir: Path) -> Optional[Iterator[Tuple[str, List[Dict]]]]:
+    """Iterate over object frames with pending edits applied, or None without object data"""
+    if not (data_dir / OBJECTS_FILE).exists():
+        return None
+    frames = ((frame_key(frame_num), objects) for frame_num, objects in iter_frame_objects(data_dir))
+    return _with_edits(frames, load_edits(data_dir)["objects"])
+
+
+def _with_edits(frames: Iterable[Tuple[str, Any]], edits: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    added = dict(edits)
+    for frame_id, value in frames:
+        yield frame_id, added.pop(frame_id, value)
+    yield from added.items()
+
+
+def buffered(parts: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Join small string parts into chunks of about chunk_size bytes"""
+    buffer: List[str] = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def iter_json(data_dir: Path) -> Iterator[str]:
+    """Stream annotations as the same indented JSON document json.dumps would build"""
+    sections = [
+        ("pose", iter_pose(data_dir)),
+        ("objects", iter_objects(data_dir)),
+        ("actions", load_actions(data_dir))
+    ]
+    sections = [(name, values) for name, values in sections if values is not None]
+    if not sections:
+        yield "{}"
+        return
+
+    yield "{"
+    for position, (name, values) in enumerate(sections):
+        yield ("," if position else "") + f"\n  {json.dumps(name)}: "
+        if name == "actions":
+            yield from _json_items(((None, action) for action in values), keyed=False)
+        else:
+            yield from _json_items(values, keyed=True)
+    yield "\n}"
+
+
+def _json_items(items: Iterable[Tuple[Optional[str], Any]], keyed: bool) -> Iterator[str]:
+    """Stream a dict (keyed) or list nested one level deep in the document"""
+    opening, closing = ("{", "}") if keyed else ("[", "]")
+    empty = True
+    for key, value in items:
+        text = json.dumps(value, indent=2).replace("\n", "\n    ")
+        prefix = f"{json.dumps(key)}: " if keyed else ""
+        yield (opening if empty else ",") + f"\n    {prefix}{text}"
+        empty = False
+
+    # json.dumps writes empty containers inline
+    yield opening + closing if empty else f"\n  {closing}"
+
+
+def iter_csv(data_dir: Path) -> Iterator[str]:
+    """Stream annotations as one CSV section per kind of data"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def flush() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    pose_frames = iter_pose(data_dir)
+    if pose_frames is not None:
+        yield "=== POSE DATA ===\n"
+        columns = _pose_columns(data_dir)
+        wrote_rows = False
+        for frame_id, data in pose_frames:
+            if not wrote_rows:
+                writer.writerow(["frame"] + [name for name, _ in columns] + ["confidence"])
+                wrote_rows = True
+            keypoints = data["keypoints"]
+            row = [frame_id]
+            for _, (keypoint, axis) in columns:
+                coords = keypoints.get(keypoint)
+                row.append(coords[axis] if coords is not None and axis < len(coords) else "")
+            writer.writerow(row + [data["confidence"]])
+            yield flush()
+        if wrote_rows:
+            yield "\n\n"
+
+    object_frames = iter_objects(data_dir)
+    if object_frames is not None:
+        yield "=== OBJECT DATA ===\n"
+        wrote_rows = False
+        for frame_id, objects in object_frames:
+            for obj in objects:
+                if not wrote_rows:
+                    writer.writerow(["frame", "label", "x1", "y1", "x2", "y2", "confidence"])
+                    wrote_rows = True
+                writer.writerow([frame_id, obj["label"], *obj["bbox"][:4], obj["confidence"]])
+            yield flush()
+        if wrote_rows:
+            yield "\n\n"
+
+    actions = load_actions(data_dir)
+    if actions is not None:
+        yield "=== ACTION DATA ===\n"
+        if actions:
+            # Columns in order of first appearance, like a DataFrame of the records
+            fields = list(dict.fromkeys(key for action in actions for key in action))
+            dict_writer = csv.DictWriter(buffer, fieldnames=fields, lineterminator="\n")
+            dict_writer.writeheader()
+            dict_writer.writerows(actions)
+            yield flush()
+
+
+def _pose_columns(data_dir: Path) -> List[Tuple[str, Tuple[str, int]]]:
+    """CSV columns of the keypoint coordinates present in any pose frame.
+
+    Worked out up front with one vectorized pass over the store, so the
+    header can be written before the first row.
+    """
+    keypoints = load_pose(data_dir).keypoints
+    present = np.zeros((len(LANDMARK_NAMES), 3), dtype=bool)
+    for start in range(0, len(keypoints), SCAN_ROWS):
+        present |= ~np.isnan(keypoints[start:start + SCAN_ROWS]).all(axis=0)
+
+    for pose in load_edits(data_dir)["pose"].values():
+        for name, coords in pose["keypoints"].items():
+            present[LANDMARK_INDEX[name], :len(coords)] = True
+
+    columns = []
+    for landmark, name in enumerate(LANDMARK_NAMES):
+        for axis, suffix in enumerate("xyz"):
+            if present[landmark, axis]:
+                columns.append((f"{name}_{suffix}", (name, axis)))
+    return columns
+
+
+def iter_yaml(data_dir: Path, video_id: str) -> Iterator[str]:
+    """Stream annotations as a ROS-compatible YAML document"""
+    header = {
+        "seq": 1,
+        "stamp": {
+            "secs": 0,
+            "nsecs": 0
+        },
+        "frame_id": video_id,
+        "version": "1.0"
+    }
+    yield _dump_yaml({"header": header})
+
+    pose_frames = iter_pose(data_dir) or ()
+    yield from _yaml_sequence("poses", (
+        {
+            "frame": frame_number(frame_id),
+            "timestamp": frame_number(frame_id) / ROS_FPS,
+            "joints": data["keypoints"],
+            "confidence": data["confidence"]
+        }
+        for frame_id, data in pose_frames
+    ))
+
+    object_frames = iter_objects(data_dir) or ()
+    yield from _yaml_sequence("objects", (
+        {
+            "frame": frame_number(frame_id),
+            "timestamp": frame_number(frame_id) / ROS_FPS,
+            "class": obj["label"],
+            "bbox": {
+                "x_min": obj["bbox"][0],
+                "y_min": obj["bbox"][1],
+                "x_max": obj["bbox"][2],
+                "y_max": obj["bbox"][3]
+            },
+            "confidence": obj["confidence"]
+        }
+        for frame_id, objects in object_frames
+        for obj in objects
+    ))
+
+    yield from _yaml_sequence("actions", (
+        {
+            "action": action["label"],
+            "start_time": action["start_frame"] / ROS_FPS,
+            "end_time": action["end_frame"] / ROS_FPS,
+            "start_frame": action["start_frame"],
+            "end_frame": action["end_frame"],
+            "confidence": action["confidence"]
+        }
+        for action in load_actions(data_dir) or ()
+    ))
+
+
+def _dump_yaml(data: Any) -> str:
+    return yaml.dump(data, Dumper=YamlDumper, default_flow_style=False, sort_keys=False)
+
+
+def _yaml_sequence(key: str, items: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Stream a top-level block sequence one item at a time"""
+    empty = True
+    for item in items:
+        if empty:
+            yield f"{key}:\n"
+            empty = False
+        # A one-item list dumps as "- ...", exactly as the item would appear
+        # inside the full sequence
+        yield _dump_yaml([item])
+    if empty:
+        yield f"{key}: []\n"
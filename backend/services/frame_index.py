@@ -0,0 +1,225 @@
+import os
+import json
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+from services.pose_store import frame_number
+
+OBJECTS_FILE = "objects.json"
+ACTIONS_FILE = "actions.json"
+
+# Sidecar files: one JSON record per line plus a row index into them
+OBJECTS_RECORDS_FILE = "objects.records.jsonl"
+OBJECTS_INDEX_FILE = "objects.index.npy"
+ACTIONS_RECORDS_FILE = "actions.records.jsonl"
+ACTIONS_INDEX_FILE = "actions.index.npy"
+
+# The records and the index are replaced one after the other, so every row
+# and record carries the generation of the build that wrote it; a reader
+# that finds them differ has paired files of two builds
+OBJECTS_INDEX_DTYPE = np.dtype([
+    ('generation', '<i8'),
+    ('frame', '<i8'),
+    ('offset', '<i8'),
+    ('length', '<i8'),
+])
+
+# Actions are sorted by start frame; max_end is the running maximum of end
+# frames, which bounds how far back an interval search has to look
+ACTIONS_INDEX_DTYPE = np.dtype([
+    ('generation', '<i8'),
+    ('start', '<i8'),
+    ('end', '<i8'),
+    ('max_end', '<i8'),
+    ('position', '<i8'),
+    ('offset', '<i8'),
+    ('length', '<i8'),
+])
+
+
+def _replace(path: Path, write):
+    # Readers rebuild stale indexes too, so concurrent writers each need
+    # their own temporary file
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _new_generation() -> int:
+    return int.from_bytes(os.urandom(8), 'little') >> 1
+
+
+def _write_records(data_dir: Path, records_file: str, records: List[Any], generation: int) -> List[tuple]:
+    """Write one [generation, record] JSON line per record and return (offset, length) per record"""
+    spans = []
+    lines = []
+    offset = 0
+    for record in records:
+        line = (json.dumps([generation, record]) + "\n").encode()
+        spans.append((offset, len(line)))
+        lines.append(line)
+        offset += len(line)
+
+    _replace(data_dir / records_file, lambda f: f.writelines(lines))
+    return spans
+
+
+def _is_fresh(source: Path, index: Path) -> bool:
+    return index.exists() and index.stat().st_mtime_ns >= source.stat().st_mtime_ns
+
+
+def _parse_record(line: bytes, generation: int) -> Any:
+    """Decode a records line, raising ValueError if another build wrote it"""
+    record_generation, record = json.loads(line)
+    if record_generation != generation:
+        raise ValueError("Records and index are from different builds")
+    return record
+
+
+def _read_record(data_dir: Path, records_file: str, generation: int, offset: int, length: int) -> Any:
+    with open(data_dir / records_file, 'rb') as f:
+        f.seek(offset)
+        return _parse_record(f.read(length), generation)
+
+
+def build_objects_index(data_dir: Path, objects_data: Optional[Dict[str, List]] = None):
+    """Build the per-frame index for objects.json"""
+    if objects_data is None:
+        with open(data_dir / OBJECTS_FILE, 'r') as f:
+            objects_data = json.load(f)
+
+    frames = []
+    for frame_id, objects in objects_data.items():
+        try:
+            frames.append((frame_number(frame_id), objects))
+        except ValueError:
+            # Ids that are not frame_NNN can never be looked up by number
+            continue
+    frames.sort(key=lambda item: item[0])
+    generation = _new_generation()
+    spans = _write_records(data_dir, OBJECTS_RECORDS_FILE, [objects for _, objects in frames], generation)
+
+    index = np.zeros(len(frames), dtype=OBJECTS_INDEX_DTYPE)
+    for row, ((frame_num, _), (offset, length)) in enumerate(zip(frames, spans)):
+        index[row] = (generation, frame_num, offset, length)
+
+    _replace(data_dir / OBJECTS_INDEX_FILE, lambda f: np.save(f, index))
+
+
+def build_actions_index(data_dir: Path, actions_data: Optional[List[Dict]] = None):
+    """Build the interval index for actions.json"""
+    if actions_data is None:
+        with open(data_dir / ACTIONS_FILE, 'r') as f:
+            actions_data = json.load(f)
+
+    ordered = sorted(enumerate(actions_data), key=lambda item: item[1]['start_frame'])
+    generation = _new_generation()
+    spans = _write_records(data_dir, ACTIONS_RECORDS_FILE, [action for _, action in ordered], generation)
+
+    index = np.zeros(len(ordered), dtype=ACTIONS_INDEX_DTYPE)
+    for row, ((position, action), (offset, length)) in enumerate(zip(ordered, spans)):
+        index[row] = (generation, action['start_frame'], action['end_frame'], 0, position, offset, length)
+    index['max_end'] = np.maximum.accumulate(index['end']) if len(index) else index['end']
+
+    _replace(data_dir / ACTIONS_INDEX_FILE, lambda f: np.save(f, index))
+
+
+def _load_index(data_dir: Path, source_file: str, index_file: str, dtype: np.dtype, build) -> np.ndarray:
+    index_path = data_dir / index_file
+    if _is_fresh(data_dir / source_file, index_path):
+        index = np.load(index_path, mmap_mode='r')
+        # Indexes written before a layout change are rebuilt
+        if index.dtype == dtype:
+            return index
+    build(data_dir)
+    return np.load(index_path, mmap_mode='r')
+
+
+def read_frame_objects(data_dir: Path, frame_num: int) -> Optional[List[Dict]]:
+    """Read the objects of one frame without parsing the whole objects.json"""
+    for attempt in range(2):
+        index = _load_index(data_dir, OBJECTS_FILE, OBJECTS_INDEX_FILE, OBJECTS_INDEX_DTYPE, build_objects_index)
+        row = int(np.searchsorted(index['frame'], frame_num))
+        if row >= len(index) or index['frame'][row] != frame_num:
+            return None
+
+        try:
+            return _read_record(data_dir, OBJECTS_RECORDS_FILE, int(index['generation'][row]),
+                                int(index['offset'][row]), int(index['length'][row]))
+        except ValueError:
+            # The sidecars were rewritten under us; rebuild once and retry
+            build_objects_index(data_dir)
+
+    return None
+
+
+def iter_frame_objects(data_dir: Path, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, List[Dict]]]:
+    """Iterate over (frame number, objects) pairs in frame order, one record at a time.
+
+    Only frames from start up to, not including, end are read.
+    """
+    for attempt in range(2):
+        index = _load_index(data_dir, OBJECTS_FILE, OBJECTS_INDEX_FILE, OBJECTS_INDEX_DTYPE, build_objects_index)
+        first = int(np.searchsorted(index['frame'], start))
+        last = len(index) if end is None else int(np.searchsorted(index['frame'], end))
+        if first >= last:
+            return
+        generation = int(index['generation'][first])
+
+        # Open handles keep reading the same version if the sidecar is rebuilt meanwhile
+        with open(data_dir / OBJECTS_RECORDS_FILE, 'rb') as f:
+            f.seek(int(index['offset'][first]))
+            lines = iter(f)
+            try:
+                # Check the first record before yielding anything; the rest
+                # of the open file is from the same build
+                frame_objects = _parse_record(next(lines, b''), generation)
+            except ValueError:
+                build_objects_index(data_dir)
+                continue
+
+            yield int(index['frame'][first]), frame_objects
+            for frame_num, line in zip(index['frame'][first + 1:last], lines):
+                yield int(frame_num), _parse_record(line, generation)
+        return
+
+
+def read_frame_actions(data_dir: Path, frame_num: int) -> List[Dict]:
+    """Find the actions active at a frame with an interval search"""
+    return read_range_actions(data_dir, frame_num, frame_num)
+
+
+def read_range_actions(data_dir: Path, first: int, last: int) -> List[Dict]:
+    """Find the actions active at any frame from first to last with an interval search"""
+    for attempt in range(2):
+        index = _load_index(data_dir, ACTIONS_FILE, ACTIONS_INDEX_FILE, ACTIONS_INDEX_DTYPE, build_actions_index)
+
+        # Only actions starting at or before the last frame can overlap the
+        # range, and the running max of end frames tells us when no earlier
+        # action can either
+        rows = []
+        row = int(np.searchsorted(index['start'], last, side='right')) - 1
+        while row >= 0 and index['max_end'][row] >= first:
+            if index['end'][row] >= first:
+                rows.append(row)
+            row -= 1
+
+        try:
+            # Keep the order the actions have in actions.json
+            rows.sort(key=lambda r: index['position'][r])
+            return [
+                _read_record(data_dir, ACTIONS_RECORDS_FILE, int(index['generation'][r]),
+                             int(index['offset'][r]), int(index['length'][r]))
+                for r in rows
+            ]
+        except ValueError:
+            build_actions_index(data_dir)
+
+    return []
@@ -0,0 +1,215 @@
+import time
+import queue
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+# Marks the end of the stream in each consumer queue
+_END_OF_STREAM = object()
+
+Frame = Tuple[int, np.ndarray]
+
+
+def read_frames(video_path: str, start_frame: int = 1) -> Iterator[Frame]:
+    """Decode a video and yield (frame_number, frame) pairs"""
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    frame_num = start_frame
+
+    try:
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            yield frame_num, frame
+            frame_num += 1
+    finally:
+        cap.release()
+
+
+class PrefetchDecoder:
+    """Decode frames on a background thread, ahead of the consumer.
+
+    Frames are decoded into a fixed ring of reused buffers, so decoding
+    overlaps with whatever the consumer does with the previous frames
+    without allocating a new image per frame. A yielded frame is only valid
+    until the next one is requested; copy it to keep it longer.
+
+    With step > 1 only every step-th frame is decoded; the frames in
+    between are grabbed, which skips the color conversion and the copy.
+
+    Reads from a path, or from an open capture at its current position.
+    A capture passed in is left open and positioned after the last frame
+    read, so the caller can keep reading from it.
+    """
+
+    def __init__(self, source, start_frame: int = 0, count: Optional[int] = None,
+                 step: int = 1, ring_size: int = 4):
+        """
+        Args:
+            source: Video path or open cv2.VideoCapture
+            start_frame: Number given to the first frame read; does not seek
+            count: Number of frames to read, or None to read to the end
+            step: Decode every step-th frame and skip the others
+            ring_size: Frame buffers shared by the decoder and the consumer
+        """
+        self.source = source
+        self.start_frame = start_frame
+        self.count = count
+        self.step = max(1, step)
+        self.ring_size = max(2, ring_size)
+        # Seconds the consumer spent waiting for decoded frames
+        self.wait_seconds = 0.0
+
+    def __iter__(self) -> Iterator[Frame]:
+        import cv2
+        owns_capture = isinstance(self.source, (str, Path))
+        cap = cv2.VideoCapture(str(self.source)) if owns_capture else self.source
+
+        buffers: List[Optional[np.ndarray]] = [None] * self.ring_size
+        free: "queue.Queue[Optional[int]]" = queue.Queue()
+        for slot in range(self.ring_size):
+            free.put(slot)
+        filled: "queue.Queue[Any]" = queue.Queue()
+        stop = threading.Event()
+        errors: List[BaseException] = []
+
+        def decode():
+            try:
+                index = 0
+                while (self.count is None or index < self.count) and not stop.is_set():
+                    if index % self.step:
+                        if not cap.grab():
+                            break
+                        index += 1
+                        continue
+
+                    slot = free.get()
+                    if slot is None:
+                        break
+                    if not cap.grab():
+                        break
+                    ok, frame = cap.retrieve(buffers[slot])
+                    if not ok:
+                        break
+                    # The first frame of each slot allocates its buffer
+                    buffers[slot] = frame
+                    filled.put((self.start_frame + index, slot))
+                    index += 1
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                filled.put(_END_OF_STREAM)
+
+        thread = threading.Thread(target=decode, name="frame-decoder", daemon=True)
+        thread.start()
+        try:
+            while True:
+                started = time.perf_counter()
+                item = filled.get()
+                self.wait_seconds += time.perf_counter() - started
+                if item is _END_OF_STREAM:
+                    break
+                frame_num, slot = item
+                yield frame_num, buffers[slot]
+                free.put(slot)
+            if errors:
+                raise errors[0]
+        finally:
+            # Unblock a decoder waiting for a free buffer, then wait for it
+            stop.set()
+            free.put(None)
+            thread.join()
+            if owns_capture:
+                cap.release()
+
+
+class FrameSource:
+    """Decode a video once and fan every frame out to all registered extractors.
+
+    Each consumer runs on its own thread and reads from a bounded queue, so a
+    slow extractor applies backpressure to the decoder instead of letting
+    decoded frames pile up in memory. Frames are shared between consumers and
+    must be treated as read-only.
+    """
+
+    def __init__(self, video_path: str, queue_size: int = 8, start_frame: int = 1):
+        self.video_path = video_path
+        self.queue_size = queue_size
+        self.start_frame = start_frame
+        self.consumers: Dict[str, Callable[[Iterable[Frame]], Any]] = {}
+
+    def register(self, name: str, consumer: Callable[[Iterable[Frame]], Any]):
+        """Register a callable that consumes an iterable of (frame_number, frame)"""
+        if name in self.consumers:
+            raise ValueError(f"Consumer already registered: {name}")
+        self.consumers[name] = consumer
+
+    def run(self) -> Dict[str, Any]:
+        """Decode the video and return each consumer's result keyed by name"""
+        queues = {name: queue.Queue(maxsize=self.queue_size) for name in self.consumers}
+        results: Dict[str, Any] = {}
+        errors: Dict[str, BaseException] = {}
+
+        threads = [
+            threading.Thread(
+                target=self._consume,
+                args=(name, consumer, queues[name], results, errors),
+                name=f"frame-consumer-{name}",
+                daemon=True
+            )
+            for name, consumer in self.consumers.items()
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for item in read_frames(self.video_path, self.start_frame):
+                for q in queues.values():
+                    q.put(item)
+        finally:
+            for q in queues.values():
+                q.put(_END_OF_STREAM)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            name, error = next(iter(errors.items()))
+            raise RuntimeError(f"Extractor '{name}' failed: {error}") from error
+
+        return results
+
+    @staticmethod
+    def _consume(name, consumer, q, results, errors):
+        finished = threading.Event()
+
+        def frames():
+            while True:
+                item = q.get()
+                if item is _END_OF_STREAM:
+                    finished.set()
+                    return
+                yield item
+
+        try:
+            results[name] = consumer(frames())
+        except BaseException as e:
+            errors[name] = e
+        finally:
+            # Keep draining so a finished or failed consumer never blocks the decoder
+            while not finished.is_set():
+                if q.get() is _END_OF_STREAM:
+                    finished.set()
+
+
+def run_extractors(video_path: str, output_dir: Path, extractors: Dict[str, Any]) -> Dict[str, Any]:
+    """Run every extractor's extract_from_frames over a single decode of the video"""
+    source = FrameSource(video_path)
+    for name, extractor in extractors.items():
+        source.register(
+            name,
+            lambda frames, extractor=extractor: extractor.extract_from_frames(frames, output_dir)
+        )
+    return source.run()
@@ -0,0 +1,269 @@
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterable, Optional, Tuple
+
+from services.tracking import iou_matrix
+
+# "torch" runs the .pt weights through ultralytics; the others run the
+# ONNX graph written by export_onnx(), which OpenVINO also reads directly
+BACKENDS = ("torch", "onnxruntime", "openvino")
+DEFAULT_BACKEND = "torch"
+
+INPUT_SIZE = 640
+STRIDE = 32
+PAD_VALUE = 114
+
+# ultralytics predictor defaults, so every backend keeps the same boxes
+CONFIDENCE_THRESHOLD = 0.25
+NMS_IOU_THRESHOLD = 0.7
+MAX_DETECTIONS = 300
+MAX_NMS_CANDIDATES = 30000
+# Offset that keeps boxes of different classes apart in a single NMS pass
+CLASS_OFFSET = 7680
+
+# Frames used to calibrate int8 activation ranges
+CALIBRATION_FRAMES = 64
+
+Session = Callable[[np.ndarray], np.ndarray]
+
+
+def metadata_path(model_path: Path) -> Path:
+    """Sidecar with the class names and input size of an exported model"""
+    return Path(model_path).with_suffix(".json")
+
+
+def export_onnx(weights: str, imgsz: int = INPUT_SIZE) -> Path:
+    """Export YOLOv8 weights to ONNX with dynamic batch and image size.
+
+    Dynamic shapes let the runtimes take the same rectangular letterboxed
+    input as the PyTorch predictor (640x384 for 16:9 video) instead of a
+    padded 640x640 square.
+    """
+    from ultralytics import YOLO
+    model = YOLO(weights)
+    onnx_path = Path(model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True))
+    with open(metadata_path(onnx_path), "w") as f:
+        json.dump({"names": model.names, "imgsz": imgsz, "weights": str(weights), "int8": False}, f, indent=2)
+    return onnx_path
+
+
+def quantize_int8(onnx_path: Path, frames: Iterable[np.ndarray], output_path: Optional[Path] = None) -> Path:
+    """Quantize an exported model to int8 with activation ranges calibrated on frames.
+
+    Writes QDQ (quantize/dequantize) nodes, which ONNX Runtime and OpenVINO
+    both execute with int8 kernels. The box decoding at the end of the
+    detection head is kept in float: it turns distances into pixel
+    coordinates, and quantizing it costs box accuracy for little speed.
+    """
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    )
+
+    onnx_path = Path(onnx_path)
+    output_path = Path(output_path or onnx_path.with_name(f"{onnx_path.stem}.int8.onnx"))
+    with open(metadata_path(onnx_path), "r") as f:
+        metadata = json.load(f)
+
+    graph = onnx.load(str(onnx_path)).graph
+    input_name = graph.input[0].name
+    head = _detect_head_prefix(graph)
+    keep_float = [node.name for node in graph.node if head and node.name.startswith(head) and node.op_type != "Conv"]
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = (
+                {input_name: letterbox_batch([frame], metadata["imgsz"])[0]} for frame in frames
+            )
+
+        def get_next(self):
+            return next(self.batches, None)
+
+    quantize_static(
+        str(onnx_path), str(output_path), FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        nodes_to_exclude=keep_float
+    )
+    with open(metadata_path(output_path), "w") as f:
+        json.dump({**metadata, "int8": True}, f, indent=2)
+    return output_path
+
+
+def _detect_head_prefix(graph) -> Optional[str]:
+    """Name prefix of the nodes of the final Detect module, e.g. '/model.22/'"""
+    modules = sorted({
+        int(node.name.split("/")[1].split(".")[1])
+        for node in graph.node
+        if node.name.startswith("/model.") and node.name.split("/")[1].split(".")[1].isdigit()
+    })
+    return f"/model.{modules[-1]}/" if modules else None
+
+
+def open_session(backend: str, model_path: Path, threads: Optional[int] = None) -> Session:
+    """Load an ONNX model on a CPU runtime and return a function that runs a batch.
+
+    threads sets the intra-op threads; by default the runtime uses every
+    core, which oversubscribes the CPU when several processes run models.
+    """
+    if backend == "onnxruntime":
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+        session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+        return lambda batch: session.run(None, {input_name: batch})[0]
+
+    if backend == "openvino":
+        import openvino as ov
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        compiled = ov.Core().compile_model(str(model_path), "CPU", config)
+        request = compiled.create_infer_request()
+        output = compiled.output(0)
+        return lambda batch: request.infer({0: batch})[output]
+
+    raise ValueError(f"Unknown ONNX backend: {backend} (expected one of {', '.join(BACKENDS[1:])})")
+
+
+def letterbox(frame: np.ndarray, size: int = INPUT_SIZE) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """Resize and pad a frame the way the ultralytics predictor does.
+
+    Returns the padded image, the resize ratio and the (x, y) padding.
+    """
+    import cv2
+    height, width = frame.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    # Pad only up to the next multiple of the stride, not to a square
+    pad_x = ((size - new_width) % STRIDE) / 2
+    pad_y = ((size - new_height) % STRIDE) / 2
+
+    if (width, height) != (new_width, new_height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                               value=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+    return image, ratio, (pad_x, pad_y)
+
+
+def letterbox_batch(frames: List[np.ndarray], size: int = INPUT_SIZE) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """Letterbox frames of the same size into one float32 NCHW RGB batch"""
+    images = []
+    for frame in frames:
+        image, ratio, pad = letterbox(frame, size)
+        images.append(image)
+    batch = np.stack(images)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0, ratio, pad
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Indices of the boxes kept by greedy NMS, highest score first"""
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while len(order):
+        best = order[0]
+        keep.append(best)
+        if len(order) == 1:
+            break
+        overlap = iou_matrix(boxes[best:best + 1], boxes[order[1:]])[0]
+        order = order[1:][overlap <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode_predictions(output: np.ndarray, ratio: float, pad: Tuple[float, float], frame_shape: Tuple[int, int],
+                       conf: float = CONFIDENCE_THRESHOLD,
+                       iou: float = NMS_IOU_THRESHOLD) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Turn raw YOLOv8 outputs into (boxes, scores, class ids) per frame.
+
+    output has shape (batch, 4 + classes, anchors) with boxes as centre
+    x, centre y, width, height in letterboxed pixels. Boxes are returned as
+    [x1, y1, x2, y2] in pixels of the original frame.
+    """
+    height, width = frame_shape
+    results = []
+    for prediction in output:
+        prediction = prediction.T
+        class_scores = prediction[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        candidates = np.flatnonzero(scores > conf)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")][:MAX_NMS_CANDIDATES]
+        centre, size = prediction[candidates, :2], prediction[candidates, 2:4]
+        boxes = np.concatenate([centre - size / 2, centre + size / 2], axis=1)
+        scores, class_ids = scores[candidates], class_ids[candidates]
+
+        keep = non_max_suppression(boxes + (class_ids * CLASS_OFFSET)[:, None], scores, iou)[:MAX_DETECTIONS]
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo the letterbox, as ultralytics' scale_boxes does
+        boxes[:, [0, 2]] -= round(pad[0] - 0.1)
+        boxes[:, [1, 3]] -= round(pad[1] - 0.1)
+        boxes /= ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+        results.append((boxes, scores, class_ids))
+    return results
+
+
+class OnnxDetector:
+    """YOLOv8 detector running an exported ONNX graph on a CPU runtime.
+
+    Pre- and post-processing follow the ultralytics predictor, so the
+    detections match those of the PyTorch model up to numerical precision
+    (check with export_model.py). Call it with a list of BGR frames of the
+    same size.
+    """
+
+    def __init__(self, model_path: str, backend: str = "onnxruntime", threads: Optional[int] = None,
+                 conf: float = CONFIDENCE_THRESHOLD, iou: float = NMS_IOU_THRESHOLD):
+        if not Path(model_path).exists():
+            raise FileNotFoundError(f"{model_path} not found; export it with export_model.py")
+        with open(metadata_path(Path(model_path)), "r") as f:
+            metadata = json.load(f)
+        # JSON turns the class ids into strings
+        self.names = {int(class_id): name for class_id, name in metadata["names"].items()}
+        self.imgsz = metadata["imgsz"]
+        self.conf = conf
+        self.iou = iou
+        self.backend = backend
+        self.session = open_session(backend, Path(model_path), threads)
+
+    def __call__(self, frames: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        if not frames:
+            return []
+        batch, ratio, pad = letterbox_batch(frames, self.imgsz)
+        output = self.session(batch)
+        return [
+            [
+                {
+                    'label': self.names[int(class_id)],
+                    'bbox': [float(x1), float(y1), float(x2), float(y2)],
+                    'confidence': float(score)
+                }
+                for (x1, y1, x2, y2), score, class_id in zip(boxes, scores, class_ids)
+            ]
+            for boxes, scores, class_ids in decode_predictions(output, ratio, pad, frames[0].shape[:2],
+                                                               self.conf, self.iou)
+        ]
+
+
+def set_torch_threads(threads: Optional[int]):
+    """Limit PyTorch's intra-op threads, if it is installed"""
+    if not threads:
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
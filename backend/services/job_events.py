@@ -0,0 +1,94 @@
+import asyncio
+from typing import Dict, Any, AsyncIterator, Optional, Set
+
+from services.job_queue import JobQueue, status_text
+
+# How often the queue database is checked for job updates
+POLL_SECONDS = 1.0
+
+FINISHED_STATUSES = ("completed", "error")
+
+
+def job_event(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job as sent to clients"""
+    return {
+        "video_id": job["id"],
+        "status": status_text(job),
+        "progress": job["progress"],
+        "attempts": job["attempts"],
+        "updated_at": job["updated_at"]
+    }
+
+
+class _Watch:
+    def __init__(self):
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.latest: Optional[Dict[str, Any]] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class JobEvents:
+    """Fan out job status and progress updates to streaming clients.
+
+    Workers publish progress to the job queue database. Instead of every
+    client polling it, one task per watched job reads the job once per poll
+    interval and pushes changes to all of its subscribers, so the cost stays
+    the same no matter how many pages are open on a video.
+    """
+
+    def __init__(self, queue: JobQueue, poll_seconds: float = POLL_SECONDS):
+        self.queue = queue
+        self.poll_seconds = poll_seconds
+        self._watches: Dict[str, _Watch] = {}
+
+    async def subscribe(self, job_id: str, idle_timeout: Optional[float] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield job events as they change, ending after the job finishes.
+
+        Yields None when nothing changed for idle_timeout seconds, so callers
+        can keep idle connections alive.
+        """
+        watch = self._watches.get(job_id)
+        if watch is None:
+            watch = self._watches[job_id] = _Watch()
+            watch.task = asyncio.create_task(self._poll(job_id, watch))
+
+        # None in the queue marks the end of the stream
+        events: asyncio.Queue = asyncio.Queue()
+        watch.subscribers.add(events)
+        if watch.latest is not None:
+            events.put_nowait(watch.latest)
+
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=idle_timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            watch.subscribers.discard(events)
+
+    async def _poll(self, job_id: str, watch: _Watch):
+        last_update = None
+        try:
+            while watch.subscribers:
+                job = await asyncio.to_thread(self.queue.get, job_id)
+                if job is None:
+                    break
+
+                if job["updated_at"] != last_update:
+                    last_update = job["updated_at"]
+                    watch.latest = job_event(job)
+                    for events in watch.subscribers:
+                        events.put_nowait(watch.latest)
+                    if job["status"] in FINISHED_STATUSES:
+                        break
+
+                await asyncio.sleep(self.poll_seconds)
+        finally:
+            del self._watches[job_id]
+            for events in watch.subscribers:
+                events.put_nowait(None)
@@ -0,0 +1,203 @@
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Any, Iterator, Optional
+
+DEFAULT_DB_PATH = "data/jobs.db"
+
+# A job whose worker has not sent a heartbeat for this long is requeued
+STALE_AFTER_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    progress TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    heartbeat REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobQueue:
+    """Durable job queue stored in a local SQLite database.
+
+    Shared by the API process, which enqueues jobs and reads their status,
+    and by worker processes, which claim jobs and report progress. Every
+    call opens its own short-lived connection, so instances are safe to use
+    from any thread or process.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit mode; claim() opens its own write transaction
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, job_id: str, kind: str, payload: Dict[str, Any], status: str = "queued") -> Dict[str, Any]:
+        """Add a job, or reset an existing job with the same id.
+
+        Pass status='completed' to record a job whose result already exists,
+        such as a video whose outputs were reused from the result cache.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO jobs (id, kind, payload, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    kind = excluded.kind, payload = excluded.payload, status = excluded.status,
+                    error = NULL, progress = NULL, attempts = 0, worker = NULL,
+                    heartbeat = NULL, updated_at = excluded.updated_at
+                """,
+                (job_id, kind, json.dumps(payload), status, now, now)
+            )
+        return self.get(job_id)
+
+    def claim(self, worker: str, kinds: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest queued job, or None if there is none"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                query = "SELECT id FROM jobs WHERE status = 'queued'"
+                params: list = []
+                if kinds:
+                    query += f" AND kind IN ({', '.join('?' for _ in kinds)})"
+                    params.extend(kinds)
+                row = conn.execute(query + " ORDER BY created_at LIMIT 1", params).fetchone()
+
+                if row is not None:
+                    now = time.time()
+                    conn.execute(
+                        """
+                        UPDATE jobs SET status = 'processing', worker = ?, heartbeat = ?,
+                            attempts = attempts + 1, updated_at = ?
+                        WHERE id = ?
+                        """,
+                        (worker, now, now, row["id"])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str):
+        """Mark a running job as still alive"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat = ?, updated_at = ? WHERE id = ? AND status = 'processing'",
+                (now, now, job_id)
+            )
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]):
+        """Store the latest progress report of a running job"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, heartbeat = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(progress), now, now, job_id)
+            )
+
+    def complete(self, job_id: str):
+        self._finish(job_id, "completed", None)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, "error", error)
+
+    def retry(self, job_id: str, error: str):
+        """Put a failed job back in the queue, keeping its error for reference"""
+        self._finish(job_id, "queued", error)
+
+    def _finish(self, job_id: str, status: str, error: Optional[str]):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker = NULL, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def requeue_stale(self, stale_after: float = STALE_AFTER_SECONDS) -> int:
+        """Requeue jobs whose worker died, failing those out of attempts"""
+        now = time.time()
+        cutoff = now - stale_after
+        # updated_at changes with the status, so event streams report the change
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'error', error = 'Worker lost too many times', worker = NULL,
+                    updated_at = ?
+                WHERE status = 'processing' AND heartbeat < ? AND attempts >= ?
+                """,
+                (now, cutoff, MAX_ATTEMPTS)
+            )
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ?
+                WHERE status = 'processing' AND heartbeat < ?
+                """,
+                (now, cutoff)
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def ids(self, kind: str, status: Optional[str] = None) -> List[str]:
+        """Ids of the jobs of a kind, optionally only those with a status, oldest first"""
+        query = "SELECT id FROM jobs WHERE kind = ?"
+        params: list = [kind]
+        if status is not None:
+            query += " AND status = ?"
+            params.append(status)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY created_at", params).fetchall()
+        return [row["id"] for row in rows]
+
+    def status(self, job_id: str, default: Optional[str] = None) -> Optional[str]:
+        """Status string as reported by the API, e.g. 'completed' or 'error: ...'"""
+        job = self.get(job_id)
+        if job is None:
+            return default
+        return status_text(job)
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+        return job
+
+
+def status_text(job: Dict[str, Any]) -> str:
+    """Status string of a job as reported by the API"""
+    if job["status"] == "error":
+        return f"error: {job['error']}"
+    return job["status"]
@@ -1,59 +1,70 @@
-import cv2
 import numpy as np
 import json
 from pathlib import Path
-from typing import Dict, List, Any
-from ultralytics import YOLO
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from services.frames import read_frames
+from services.sampling import MotionSampler, thumbnail
 
 class ObjectDetector:
-    def __init__(self, model_name: str = "yolov8m.pt"):
+    def __init__(self, model_name: str = "yolov8m.pt", batch_size: int = 8):
         """Initialize YOLOv8 model for object detection"""
+        # Imported here: ultralytics pulls in torch, which takes seconds to load
+        from ultralytics import YOLO
         self.model = YOLO(model_name)
         self.confidence_threshold = 0.5
+        # Number of frames grouped into a single model call
+        self.batch_size = max(1, batch_size)
     
-    def extract_from_video(self, video_path: str, output_dir: Path) -> Dict[str, List]:
-        """Extract object detections from video frames"""
-        cap = cv2.VideoCapture(video_path)
-        objects_data = {}
-        frame_count = 0
+    def extract_from_video(self, video_path: str, output_dir: Path,
+                           sampler: Optional[MotionSampler] = None) -> Dict[str, List]:
+        """Extract object detections from video frames.
         
-        try:
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                frame_count += 1
-                frame_id = f"frame_{frame_count:03d}"
-                
-                # Run YOLOv8 detection
-                results = self.model(frame, conf=self.confidence_threshold)
-                
-                frame_objects = []
-                for r in results:
-                    if r.boxes is not None:
-                        boxes = r.boxes.xyxy.cpu().numpy()
-                        classes = r.boxes.cls.cpu().numpy()
-                        confidences = r.boxes.conf.cpu().numpy()
-                        
-                        for box, cls_id, conf in zip(boxes, classes, confidences):
-                            x1, y1, x2, y2 = box
-                            label = self.model.names[int(cls_id)]
-                            
-                            frame_objects.append({
-                                "label": label,
-                                "bbox": [float(x1), float(y1), float(x2), float(y2)],
-                                "confidence": float(conf)
-                            })
-                
-                objects_data[frame_id] = frame_objects
-                
-                # Process every 10th frame for speed in MVP
-                if frame_count % 10 == 0:
-                    print(f"Processed frame {frame_count}")
+        To run several extractors over one decode, pass them all to
+        services.frames.run_extractors instead.
+        """
+        return self.extract_from_frames(read_frames(video_path), output_dir, sampler)
+    
+    def extract_from_frames(self, frames: Iterable[Tuple[int, np.ndarray]], output_dir: Path,
+                            sampler: Optional[MotionSampler] = None) -> Dict[str, List]:
+        """Extract object detections from already decoded (frame_number, frame) pairs.
         
-        finally:
-            cap.release()
+        With a sampler, YOLO only runs on the frames it picks; the other
+        frames reuse the detections of the last frame it ran on.
+        """
+        detections = {}
+        # (frame_id, id of the frame whose detections it uses), in frame order
+        sources = []
+        last_id = None
+        batch_ids = []
+        batch_frames = []
+        
+        for frame_count, frame in frames:
+            frame_id = f"frame_{frame_count:03d}"
+            
+            if sampler is not None:
+                small = thumbnail(frame) if sampler.adaptive else None
+                if not sampler.should_sample(frame_count, small) and last_id is not None:
+                    sources.append((frame_id, last_id))
+                    continue
+            
+            sources.append((frame_id, frame_id))
+            last_id = frame_id
+            batch_ids.append(frame_id)
+            batch_frames.append(frame)
+            
+            if len(batch_frames) >= self.batch_size:
+                detections.update(zip(batch_ids, self.extract_from_batch(batch_frames)))
+                batch_ids, batch_frames = [], []
+            
+            # Process every 10th frame for speed in MVP
+            if frame_count % 10 == 0:
+                print(f"Processed frame {frame_count}")
+        
+        # Flush the last partial batch at end of stream
+        if batch_frames:
+            detections.update(zip(batch_ids, self.extract_from_batch(batch_frames)))
+        
+        objects_data = {frame_id: detections[source] for frame_id, source in sources}
         
         # Save to file
         objects_path = output_dir / "objects.json"
@@ -64,23 +75,29 @@ class ObjectDetector:
     
     def extract_from_frame(self, frame: np.ndarray) -> List[Dict]:
         """Extract objects from a single frame"""
-        results = self.model(frame, conf=self.confidence_threshold)
-        
+        return self.extract_from_batch([frame])[0]
+    
+    def extract_from_batch(self, frames: List[np.ndarray]) -> List[List[Dict]]:
+        """Extract objects from several frames with one model call, one list per frame"""
+        results = self.model(frames, conf=self.confidence_threshold, verbose=False)
+        return [self._parse_result(r) for r in results]
+    
+    def _parse_result(self, result) -> List[Dict]:
+        """Convert one YOLOv8 result into label/bbox/confidence dicts"""
         frame_objects = []
-        for r in results:
-            if r.boxes is not None:
-                boxes = r.boxes.xyxy.cpu().numpy()
-                classes = r.boxes.cls.cpu().numpy()
-                confidences = r.boxes.conf.cpu().numpy()
+        if result.boxes is not None:
+            boxes = result.boxes.xyxy.cpu().numpy()
+            classes = result.boxes.cls.cpu().numpy()
+            confidences = result.boxes.conf.cpu().numpy()
+            
+            for box, cls_id, conf in zip(boxes, classes, confidences):
+                x1, y1, x2, y2 = box
+                label = self.model.names[int(cls_id)]
                 
-                for box, cls_id, conf in zip(boxes, classes, confidences):
-                    x1, y1, x2, y2 = box
-                    label = self.model.names[int(cls_id)]
-                    
-                    frame_objects.append({
-                        "label": label,
-                        "bbox": [float(x1), float(y1), float(x2), float(y2)],
-                        "confidence": float(conf)
-                    })
+                frame_objects.append({
+                    "label": label,
+                    "bbox": [float(x1), float(y1), float(x2), float(y2)],
+                    "confidence": float(conf)
+                })
         
-        return frame_objects
\ No newline at end of file
+        return frame_objects
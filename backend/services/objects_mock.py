@@ -1,7 +1,7 @@
 import numpy as np
 import json
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Tuple
 
 class ObjectDetector:
     def __init__(self, model_name: str = "yolov8m.pt"):
@@ -42,6 +42,10 @@ class ObjectDetector:
         
         return objects_data
     
+    def extract_from_frames(self, frames: Iterable[Tuple[int, np.ndarray]], output_dir: Path) -> Dict[str, List]:
+        """Generate mock data while consuming a shared frame stream"""
+        return self.extract_from_video(None, output_dir)
+    
     def extract_from_frame(self, frame: np.ndarray) -> List[Dict]:
         """Generate mock objects from a single frame"""
         frame_objects = []
@@ -0,0 +1,281 @@
+import threading
+import itertools
+import subprocess
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from services.pose_store import frame_key
+
+IMAGE_FORMATS = {"jpeg": ".jpg", "png": ".png"}
+JPEG_QUALITY = 85
+
+# Rendered frames kept per API process; a 360p JPEG is about 40 KB
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+# Longest clip rendered per request (10 seconds at 30fps)
+MAX_CLIP_FRAMES = 300
+
+POSE_CONNECTIONS = [
+    ("left_shoulder", "right_shoulder"),
+    ("left_shoulder", "left_elbow"),
+    ("left_elbow", "left_wrist"),
+    ("right_shoulder", "right_elbow"),
+    ("right_elbow", "right_wrist"),
+    ("left_shoulder", "left_hip"),
+    ("right_shoulder", "right_hip"),
+    ("left_hip", "right_hip"),
+    ("left_hip", "left_knee"),
+    ("left_knee", "left_ankle"),
+    ("right_hip", "right_knee"),
+    ("right_knee", "right_ankle"),
+]
+
+
+def draw_pose_keypoints(frame, pose_data, frame_num, scale=1.0):
+    """Draw pose keypoints on frame, scaling coordinates of the original video by scale"""
+    import cv2
+    key = frame_key(frame_num)
+    if key not in pose_data:
+        return frame
+
+    keypoints_dict = pose_data[key].get('keypoints', {})
+
+    # Convert keypoints dict to list for drawing
+    keypoint_coords = {}
+
+    # Draw keypoints
+    for name, coords in keypoints_dict.items():
+        if len(coords) >= 2:
+            x = int(coords[0] * scale)
+            y = int(coords[1] * scale)
+            keypoint_coords[name] = (x, y)
+
+            # Draw circle for keypoint
+            cv2.circle(frame, (x, y), 5, (0, 255, 0), -1)
+
+            # Draw label (shortened to first 5 chars)
+            label = name.replace('_', ' ')[:5]
+            cv2.putText(frame, label, (x+5, y-5),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.3, (0, 255, 0), 1)
+
+    # Draw connections between keypoints
+    for conn in POSE_CONNECTIONS:
+        if conn[0] in keypoint_coords and conn[1] in keypoint_coords:
+            pt1 = keypoint_coords[conn[0]]
+            pt2 = keypoint_coords[conn[1]]
+            cv2.line(frame, pt1, pt2, (0, 255, 0), 2)
+
+    return frame
+
+
+def draw_objects(frame, objects_data, frame_num, scale=1.0):
+    """Draw object bounding boxes on frame, scaling coordinates of the original video by scale"""
+    import cv2
+    key = frame_key(frame_num)
+    if key not in objects_data:
+        return frame
+
+    objects = objects_data[key]
+
+    for obj in objects:
+        bbox = obj['bbox']
+        x1, y1, x2, y2 = (int(value * scale) for value in bbox)
+
+        # Draw bounding box
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+
+        # Draw label with confidence
+        label = f"{obj['label']}: {obj['confidence']:.2f}"
+        cv2.putText(frame, label, (x1, y1-10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+
+    return frame
+
+
+def draw_actions(frame, actions_data, frame_num):
+    """Draw action labels on frame"""
+    import cv2
+    # Find active actions for this frame
+    active_actions = []
+    for action in actions_data:
+        if action['start_frame'] <= frame_num <= action['end_frame']:
+            active_actions.append(action)
+
+    # Draw action labels
+    y_offset = 30
+    for action in active_actions:
+        label = f"Action: {action['label']} ({action['confidence']:.2f})"
+        cv2.putText(frame, label, (10, y_offset),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        y_offset += 30
+
+    return frame
+
+
+def draw_frame_number(frame, frame_num):
+    """Draw the frame number in the bottom left corner"""
+    import cv2
+    cv2.putText(frame, f"Frame: {frame_num}", (10, frame.shape[0]-10),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    return frame
+
+
+def render_overlay(frame: np.ndarray, annotations: Dict[str, Any], scale: float = 1.0) -> np.ndarray:
+    """Draw one frame's annotations, as returned by annotation_cache.load_frame(), on the frame"""
+    frame_num = annotations["frame"]
+    key = frame_key(frame_num)
+    if "pose" in annotations:
+        draw_pose_keypoints(frame, {key: annotations["pose"]}, frame_num, scale)
+    if "objects" in annotations:
+        draw_objects(frame, {key: annotations["objects"]}, frame_num, scale)
+    draw_actions(frame, annotations.get("actions", []), frame_num)
+    return draw_frame_number(frame, frame_num)
+
+
+def video_size(video_path: Path) -> Tuple[int, int]:
+    """Width and height of a video"""
+    import cv2
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        cap.release()
+
+
+def read_frames_at(video_path: Path, start: int, count: int = 1) -> Iterable[np.ndarray]:
+    """Seek straight to a frame and decode count frames from there"""
+    import cv2
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        if start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        for _ in range(count):
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def encode_image(frame: np.ndarray, image_format: str) -> bytes:
+    import cv2
+    params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY] if image_format == "jpeg" else []
+    ok, encoded = cv2.imencode(IMAGE_FORMATS[image_format], frame, params)
+    if not ok:
+        raise ValueError(f"Failed to encode frame as {image_format}")
+    return encoded.tobytes()
+
+
+def write_clip(frames: Iterable[np.ndarray], path: Path, fps: float) -> int:
+    """Encode frames as an MP4 and return the number of frames written.
+
+    Uses H.264 through ffmpeg so browsers can play the clip, and OpenCV's
+    MPEG-4 writer where ffmpeg is not installed.
+    """
+    import cv2
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return 0
+    height, width = first.shape[:2]
+
+    try:
+        encoder = subprocess.Popen(
+            ['ffmpeg', '-y', '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+             '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+             '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2', '-c:v', 'libx264', '-preset', 'veryfast',
+             '-pix_fmt', 'yuv420p', '-movflags', '+faststart', '-f', 'mp4', str(path)],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+    except OSError:
+        encoder = None
+
+    written = 0
+    if encoder is not None:
+        try:
+            for frame in itertools.chain([first], frames):
+                encoder.stdin.write(np.ascontiguousarray(frame).tobytes())
+                written += 1
+        finally:
+            _, stderr = encoder.communicate()
+        if encoder.returncode != 0:
+            raise RuntimeError(f"Clip encode failed: {stderr.decode(errors='replace').strip()[-500:]}")
+        return written
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    try:
+        for frame in itertools.chain([first], frames):
+            writer.write(frame)
+            written += 1
+    finally:
+        writer.release()
+    return written
+
+
+class RenderCache:
+    """Bounded LRU cache of encoded overlay frames.
+
+    Each entry remembers the annotation version it was rendered from and is
+    only served for that version, so a save or an edit makes the frames of
+    the video re-render on their next request. Bounded by the total size of
+    the encoded images rather than their number, since PNGs of the original
+    video are many times larger than JPEGs of the proxy.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, version: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, version: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[1])
+            self._entries[key] = (version, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Shared by all render requests of the API process
+render_cache = RenderCache()
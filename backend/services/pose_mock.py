@@ -1,21 +1,11 @@
 import numpy as np
-import json
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterable, Tuple
+from services.pose_store import LANDMARK_NAMES, save_pose
 
 class PoseExtractor:
     def __init__(self):
-        self.landmark_names = [
-            'nose', 'left_eye_inner', 'left_eye', 'left_eye_outer',
-            'right_eye_inner', 'right_eye', 'right_eye_outer', 
-            'left_ear', 'right_ear', 'mouth_left', 'mouth_right',
-            'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
-            'left_wrist', 'right_wrist', 'left_pinky', 'right_pinky',
-            'left_index', 'right_index', 'left_thumb', 'right_thumb',
-            'left_hip', 'right_hip', 'left_knee', 'right_knee',
-            'left_ankle', 'right_ankle', 'left_heel', 'right_heel',
-            'left_foot_index', 'right_foot_index'
-        ]
+        self.landmark_names = LANDMARK_NAMES
     
     def extract_from_video(self, video_path: str, output_dir: Path) -> Dict[str, Any]:
         """Generate mock pose data for demo purposes"""
@@ -42,12 +32,14 @@ class PoseExtractor:
             }
         
         # Save to file
-        pose_path = output_dir / "pose.json"
-        with open(pose_path, 'w') as f:
-            json.dump(pose_data, f, indent=2)
+        save_pose(output_dir, pose_data)
         
         return pose_data
     
+    def extract_from_frames(self, frames: Iterable[Tuple[int, np.ndarray]], output_dir: Path) -> Dict[str, Any]:
+        """Generate mock data while consuming a shared frame stream"""
+        return self.extract_from_video(None, output_dir)
+    
     def extract_from_frame(self, frame: np.ndarray) -> Dict[str, Any]:
         """Generate mock pose from a single frame"""
         keypoints = {}
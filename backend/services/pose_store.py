@@ -0,0 +1,188 @@
+import os
+import math
+import json
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+# MediaPipe provides 33 pose landmarks, stored in this order
+LANDMARK_NAMES = [
+    'nose', 'left_eye_inner', 'left_eye', 'left_eye_outer',
+    'right_eye_inner', 'right_eye', 'right_eye_outer',
+    'left_ear', 'right_ear', 'mouth_left', 'mouth_right',
+    'left_shoulder', 'right_shoulder', 'left_elbow', 'right_elbow',
+    'left_wrist', 'right_wrist', 'left_pinky', 'right_pinky',
+    'left_index', 'right_index', 'left_thumb', 'right_thumb',
+    'left_hip', 'right_hip', 'left_knee', 'right_knee',
+    'left_ankle', 'right_ankle', 'left_heel', 'right_heel',
+    'left_foot_index', 'right_foot_index'
+]
+LANDMARK_INDEX = {name: idx for idx, name in enumerate(LANDMARK_NAMES)}
+
+# Decimals kept when converting float32 values back to JSON numbers
+JSON_DECIMALS = 4
+
+# One record per frame with a pose; missing keypoints/coordinates are NaN
+POSE_DTYPE = np.dtype([
+    ('frame', '<i8'),
+    ('confidence', '<f4'),
+    ('keypoints', '<f4', (len(LANDMARK_NAMES), 3)),
+])
+
+POSE_FILE = "pose.npy"
+LEGACY_POSE_FILE = "pose.json"
+
+
+def frame_number(frame_id: str) -> int:
+    """Parse the frame number out of a 'frame_NNN' id"""
+    try:
+        return int(frame_id.split('_')[1])
+    except (IndexError, ValueError):
+        raise ValueError(f"Invalid frame id: {frame_id}")
+
+
+def frame_key(frame_num: int) -> str:
+    """Build the 'frame_NNN' id used by the API for a frame number"""
+    return f"frame_{frame_num:03d}"
+
+
+def has_pose(data_dir: Path) -> bool:
+    """Check whether a video directory has pose data in either format"""
+    return (data_dir / POSE_FILE).exists() or (data_dir / LEGACY_POSE_FILE).exists()
+
+
+def pose_to_records(pose_data: Dict[str, Dict[str, Any]]) -> np.ndarray:
+    """Convert a frame_id -> {keypoints, confidence} dict into pose records"""
+    records = np.zeros(len(pose_data), dtype=POSE_DTYPE)
+    records['keypoints'] = np.nan
+
+    for row, (frame_id, pose) in enumerate(pose_data.items()):
+        records['frame'][row] = frame_number(frame_id)
+        records['confidence'][row] = pose['confidence']
+
+        for name, coords in pose['keypoints'].items():
+            if name not in LANDMARK_INDEX:
+                raise ValueError(f"Unknown keypoint: {name}")
+            coords = list(coords)[:3]
+            records['keypoints'][row, LANDMARK_INDEX[name], :len(coords)] = coords
+
+    return np.sort(records, order='frame')
+
+
+def save_pose(data_dir: Path, pose_data: Dict[str, Dict[str, Any]]) -> Path:
+    """Write pose data for a video in the columnar binary format"""
+    return save_pose_records(data_dir, pose_to_records(pose_data))
+
+
+def save_pose_records(data_dir: Path, records: np.ndarray) -> Path:
+    """Atomically replace the pose records file of a video directory"""
+    pose_path = data_dir / POSE_FILE
+    # Compactions, full saves and the pipeline each get their own temporary file
+    fd, tmp_path = tempfile.mkstemp(dir=data_dir, prefix=f".{POSE_FILE}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, records.astype(POSE_DTYPE, copy=False))
+        # Readers holding a memory map keep the old file until they reopen
+        os.replace(tmp_path, pose_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return pose_path
+
+
+class PoseStore:
+    """Read-only view over the pose records of one video.
+
+    Records are memory-mapped from disk, so opening a store costs a header
+    read regardless of video length; JSON-shaped dicts are only built for the
+    frames that are actually requested.
+    """
+
+    def __init__(self, records: np.ndarray):
+        self.records = records
+
+    @classmethod
+    def open(cls, data_dir: Path) -> Optional["PoseStore"]:
+        """Open the pose data of a video directory, or None if there is none"""
+        pose_path = data_dir / POSE_FILE
+        if pose_path.exists():
+            return cls(np.load(pose_path, mmap_mode='r'))
+
+        # Migrate directories written before the columnar format existed
+        legacy_path = data_dir / LEGACY_POSE_FILE
+        if legacy_path.exists():
+            with open(legacy_path, 'r') as f:
+                records = pose_to_records(json.load(f))
+            save_pose_records(data_dir, records)
+            return cls(records)
+
+        return None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, frame_id: str) -> bool:
+        return self.row(frame_number(frame_id)) is not None
+
+    @property
+    def frames(self) -> np.ndarray:
+        return self.records['frame']
+
+    @property
+    def keypoints(self) -> np.ndarray:
+        """Keypoints as a frames x 33 x 3 float32 array"""
+        return self.records['keypoints']
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self.records['confidence']
+
+    def row(self, frame_num: int) -> Optional[int]:
+        """Find the record row of a frame number by binary search"""
+        row = int(np.searchsorted(self.frames, frame_num))
+        if row < len(self.records) and self.frames[row] == frame_num:
+            return row
+        return None
+
+    def get(self, frame_id: str) -> Optional[Dict[str, Any]]:
+        """Get one frame as a {keypoints, confidence} dict"""
+        row = self.row(frame_number(frame_id))
+        if row is None:
+            return None
+        return self.record_to_dict(self.records[row])
+
+    def frame_ids(self) -> List[str]:
+        return [frame_key(int(n)) for n in self.frames]
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over (frame_id, pose dict) pairs in frame order"""
+        for record in self.records:
+            yield frame_key(int(record['frame'])), self.record_to_dict(record)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.items())
+
+    def keypoint_count(self) -> int:
+        """Number of keypoints present in the first frame"""
+        if not len(self.records):
+            return 0
+        return int(np.count_nonzero(~np.isnan(self.keypoints[0, :, 0])))
+
+    @staticmethod
+    def record_to_dict(record) -> Dict[str, Any]:
+        keypoints = {}
+        # Round so float32 storage does not leak digits like 180.1999969 into the API
+        values = np.round(record['keypoints'].astype(np.float64), JSON_DECIMALS).tolist()
+        for name, coords in zip(LANDMARK_NAMES, values):
+            if math.isnan(coords[0]):
+                continue
+            if math.isnan(coords[2]):
+                coords = coords[:2]
+            keypoints[name] = coords
+
+        return {
+            "keypoints": keypoints,
+            "confidence": round(float(record['confidence']), JSON_DECIMALS)
+        }
@@ -0,0 +1,132 @@
+import numpy as np
+from typing import Dict, List
+
+from services.pose_store import LANDMARK_NAMES, LANDMARK_INDEX
+
+_MISSING = [np.nan] * 3
+
+
+def keypoints_to_array(keypoints: Dict[str, List[float]]) -> np.ndarray:
+    """Convert a keypoint name -> [x, y(, z)] dict into a 33 x 3 array, NaN where missing"""
+    # Build plain lists first; item-by-item numpy assignment is far slower
+    rows = [_MISSING] * len(LANDMARK_NAMES)
+    for name, coords in keypoints.items():
+        slot = LANDMARK_INDEX.get(name)
+        if slot is not None:
+            coords = list(coords)[:3]
+            rows[slot] = coords + _MISSING[len(coords):]
+    return np.array(rows, dtype=np.float64)
+
+
+class PoseWindow:
+    """Sliding window over the last poses, kept in a preallocated ring buffer.
+
+    Adding a pose overwrites the oldest slot instead of shifting a list, and
+    the window statistics are maintained incrementally: sums for the mean
+    are updated with the pose that enters and the one that leaves, and the
+    per-joint min/max use a two-block scheme in which the older block keeps
+    suffix extremes and the newer block a running extreme. The block flip
+    costs O(size) once every size poses, so every statistic is O(1) per pose
+    amortized, independent of the window size. Missing keypoints are NaN
+    and are ignored by every statistic.
+    """
+
+    def __init__(self, size: int = 30, num_joints: int = len(LANDMARK_NAMES)):
+        self.size = size
+        shape = (size, num_joints, 3)
+        self._poses = np.full(shape, np.nan)
+        self._frames = np.zeros(size, dtype=np.int64)
+        self._pushed = 0
+
+        # Running sums and counts of present coordinates, for the mean
+        self._sum = np.zeros(shape[1:])
+        self._count = np.zeros(shape[1:], dtype=np.int64)
+
+        # Older block [front_start, back_start) with suffix extremes, newer
+        # block [back_start, pushed) with running extremes, by push number
+        self._front_start = 0
+        self._back_start = 0
+        self._front_min = np.full(shape, np.nan)
+        self._front_max = np.full(shape, np.nan)
+        self._back_min = np.full(shape[1:], np.nan)
+        self._back_max = np.full(shape[1:], np.nan)
+
+    def __len__(self) -> int:
+        return min(self._pushed, self.size)
+
+    def push(self, frame_num: int, pose: np.ndarray):
+        """Add a 33 x 3 pose, evicting the oldest one once the window is full"""
+        slot = self._pushed % self.size
+        if self._pushed >= self.size:
+            evicted = self._poses[slot]
+            present = ~np.isnan(evicted)
+            self._sum -= np.where(present, evicted, 0.0)
+            self._count -= present
+
+        self._poses[slot] = pose
+        self._frames[slot] = frame_num
+        present = ~np.isnan(pose)
+        self._sum += np.where(present, pose, 0.0)
+        self._count += present
+
+        np.fmin(self._back_min, pose, out=self._back_min)
+        np.fmax(self._back_max, pose, out=self._back_max)
+        self._pushed += 1
+
+        if self._oldest() >= self._back_start:
+            self._flip()
+
+    def _oldest(self) -> int:
+        return max(0, self._pushed - self.size)
+
+    def _flip(self):
+        """Turn the newer block into the older one, precomputing its suffix extremes"""
+        block = [i % self.size for i in range(self._back_start, self._pushed)]
+        poses = self._poses[block]
+        self._front_min[:len(block)] = np.fmin.accumulate(poses[::-1])[::-1]
+        self._front_max[:len(block)] = np.fmax.accumulate(poses[::-1])[::-1]
+        self._front_start, self._back_start = self._back_start, self._pushed
+        self._back_min.fill(np.nan)
+        self._back_max.fill(np.nan)
+
+    def _slot(self, age: int) -> int:
+        """Ring slot of the pose pushed age poses before the newest"""
+        return (self._pushed - 1 - age) % self.size
+
+    @property
+    def first(self) -> np.ndarray:
+        return self._poses[self._slot(len(self) - 1)]
+
+    @property
+    def last(self) -> np.ndarray:
+        return self._poses[self._slot(0)]
+
+    @property
+    def first_frame(self) -> int:
+        return int(self._frames[self._slot(len(self) - 1)])
+
+    @property
+    def last_frame(self) -> int:
+        return int(self._frames[self._slot(0)])
+
+    def displacement(self) -> np.ndarray:
+        """Per-joint movement from the oldest to the newest pose"""
+        return self.last - self.first
+
+    def velocity(self) -> np.ndarray:
+        """Per-joint movement per frame between the two newest poses"""
+        if len(self) < 2:
+            return np.zeros_like(self.last)
+        previous = self._slot(1)
+        gap = max(1, self.last_frame - int(self._frames[previous]))
+        return (self.last - self._poses[previous]) / gap
+
+    def mean(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self._count > 0, self._sum / np.maximum(self._count, 1), np.nan)
+
+    def min(self) -> np.ndarray:
+        return np.fmin(self._front_min[self._oldest() - self._front_start], self._back_min)
+
+    def max(self) -> np.ndarray:
+        return np.fmax(self._front_max[self._oldest() - self._front_start], self._back_max)
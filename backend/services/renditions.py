@@ -0,0 +1,141 @@
+import os
+import json
+import math
+import logging
+import subprocess
+import numpy as np
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from services.frames import PrefetchDecoder
+
+logger = logging.getLogger(__name__)
+
+PROXY_FILE = "proxy.mp4"
+SPRITES_FILE = "sprites.jpg"
+SPRITES_META_FILE = "sprites.json"
+
+# Scrubbing proxy: small H.264 with a keyframe every PROXY_GOP frames, so a
+# seek decodes at most that many frames, and the index at the front of the
+# file so playback starts before the download ends
+PROXY_HEIGHT = 360
+PROXY_GOP = 10
+PROXY_CRF = 30
+
+# Sprite sheet tiles, one every SPRITE_INTERVAL seconds; longer videos get
+# a longer interval so the sheet stays under SPRITE_MAX_TILES tiles
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_INTERVAL = 1.0
+SPRITE_MAX_TILES = 300
+SPRITE_QUALITY = 80
+
+
+def start_proxy(video_path: str, output_dir: Path) -> Optional[subprocess.Popen]:
+    """Start encoding the scrubbing proxy of a video with ffmpeg.
+
+    The encode runs in its own process next to the caller, which collects
+    it with finish_proxy(). Returns None if ffmpeg is not installed, in
+    which case clients are served the original.
+    """
+    tmp_path = output_dir / f".{PROXY_FILE}.tmp"
+    command = [
+        'ffmpeg', '-y', '-v', 'error', '-i', str(video_path),
+        '-map', '0:v:0', '-an', '-sn',
+        '-vf', f'scale=-2:{PROXY_HEIGHT}',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(PROXY_CRF), '-pix_fmt', 'yuv420p',
+        '-g', str(PROXY_GOP), '-keyint_min', str(PROXY_GOP), '-sc_threshold', '0',
+        '-movflags', '+faststart', '-f', 'mp4', str(tmp_path)
+    ]
+    try:
+        return subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        logger.warning(f"Not encoding a proxy, ffmpeg is unavailable: {e}")
+        return None
+
+
+def finish_proxy(process: subprocess.Popen, output_dir: Path) -> Optional[Path]:
+    """Wait for a proxy encode and move the proxy into place"""
+    tmp_path = output_dir / f".{PROXY_FILE}.tmp"
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        tmp_path.unlink(missing_ok=True)
+        logger.warning(f"Proxy encode failed: {stderr.decode(errors='replace').strip()[-500:]}")
+        return None
+
+    proxy_path = output_dir / PROXY_FILE
+    os.replace(tmp_path, proxy_path)
+    return proxy_path
+
+
+def cancel_proxy(process: subprocess.Popen, output_dir: Path):
+    """Stop an unfinished proxy encode"""
+    if process.poll() is None:
+        process.kill()
+    process.communicate()
+    (output_dir / f".{PROXY_FILE}.tmp").unlink(missing_ok=True)
+
+
+def make_sprites(video_path: str, output_dir: Path) -> Optional[Dict[str, Any]]:
+    """Tile evenly spaced thumbnails of a video into one JPEG sprite sheet.
+
+    Tile i shows the frame at i * interval seconds. Pass the proxy when
+    there is one; it is much cheaper to decode than the original. Returns
+    the sheet layout, which is also saved next to the sheet.
+    """
+    import cv2
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        if not cap.isOpened():
+            logger.warning(f"Not making sprites, failed to open {video_path}")
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if total_frames <= 0 or width <= 0 or height <= 0:
+            return None
+
+        interval = max(SPRITE_INTERVAL, total_frames / fps / SPRITE_MAX_TILES)
+        step = max(1, round(interval * fps))
+        tile_height = max(2, round(SPRITE_TILE_WIDTH * height / width / 2) * 2)
+        tiles = []
+        for _, frame in PrefetchDecoder(cap, step=step, count=total_frames):
+            tiles.append(cv2.resize(frame, (SPRITE_TILE_WIDTH, tile_height), interpolation=cv2.INTER_AREA))
+    finally:
+        cap.release()
+
+    if not tiles:
+        return None
+
+    columns = min(SPRITE_COLUMNS, len(tiles))
+    rows = math.ceil(len(tiles) / columns)
+    sheet = np.zeros((rows * tile_height, columns * SPRITE_TILE_WIDTH, 3), dtype=np.uint8)
+    for i, tile in enumerate(tiles):
+        row, column = divmod(i, columns)
+        sheet[row * tile_height:(row + 1) * tile_height,
+              column * SPRITE_TILE_WIDTH:(column + 1) * SPRITE_TILE_WIDTH] = tile
+
+    ok, encoded = cv2.imencode('.jpg', sheet, [cv2.IMWRITE_JPEG_QUALITY, SPRITE_QUALITY])
+    if not ok:
+        return None
+
+    layout = {
+        "interval": step / fps,
+        "count": len(tiles),
+        "columns": columns,
+        "rows": rows,
+        "tile_width": SPRITE_TILE_WIDTH,
+        "tile_height": tile_height
+    }
+    _replace_file(output_dir / SPRITES_FILE, encoded.tobytes())
+    _replace_file(output_dir / SPRITES_META_FILE, json.dumps(layout, indent=2).encode())
+    return layout
+
+
+def _replace_file(path: Path, data: bytes):
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
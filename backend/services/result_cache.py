@@ -0,0 +1,175 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+from importlib import metadata
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from services.pose_store import POSE_FILE
+from services.renditions import PROXY_FILE, SPRITES_FILE, SPRITES_META_FILE
+from services.frame_index import (
+    OBJECTS_FILE, ACTIONS_FILE,
+    OBJECTS_RECORDS_FILE, OBJECTS_INDEX_FILE, ACTIONS_RECORDS_FILE, ACTIONS_INDEX_FILE
+)
+
+RESULTS_DIR = "data/results"
+META_FILE = "meta.json"
+SUMMARY_FILE = "summary.json"
+
+# Files written by process_video.py. Every writer replaces them atomically
+# instead of rewriting them in place, so hard links stay independent copies.
+RESULT_FILES = (
+    POSE_FILE, OBJECTS_FILE, ACTIONS_FILE,
+    OBJECTS_RECORDS_FILE, OBJECTS_INDEX_FILE, ACTIONS_RECORDS_FILE, ACTIONS_INDEX_FILE,
+    PROXY_FILE, SPRITES_FILE, SPRITES_META_FILE
+)
+
+# Packages whose versions change what the models produce
+MODEL_PACKAGES = ("mediapipe", "ultralytics", "torch", "opencv-python", "numpy", "onnxruntime", "openvino")
+
+# Pipeline code and extractor settings, relative to the backend directory
+PIPELINE_SOURCES = (
+    "process_video.py", "services/pose_store.py", "services/pose_window.py", "services/renditions.py",
+    "services/inference.py", "services/frame_index.py", "services/sampling.py", "services/tracking.py"
+)
+
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _file_digest(path: str) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def pipeline_fingerprint(detector: Dict[str, Any]) -> Dict[str, Any]:
+    """Model package versions, detector settings and a hash of the pipeline code.
+
+    Computed by the worker that runs the models: the API process has none
+    of the model packages installed, so their versions would all be None
+    there. detector holds the backend, model_path and threads the worker's
+    object detector was loaded with; the model file is hashed too, so
+    replacing the weights under the same name changes the fingerprint.
+    MediaPipe complexity, sampling strides and motion thresholds are fixed
+    in process_video.py and the modules in PIPELINE_SOURCES, so hashing
+    their source covers them.
+    """
+    code = hashlib.sha256()
+    for source in PIPELINE_SOURCES:
+        code.update(source.encode())
+        code.update(Path(source).read_bytes())
+
+    return {
+        "packages": {name: _package_version(name) for name in MODEL_PACKAGES},
+        "detector": {**detector, "model_sha256": _file_digest(detector["model_path"])},
+        "pipeline": code.hexdigest(),
+    }
+
+
+def result_key(content_hash: str, fingerprint: Dict[str, Any]) -> str:
+    """Cache key of the results for a video content hash under a pipeline fingerprint"""
+    key = json.dumps({"content": content_hash, **fingerprint}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _link(source: Path, target: Path):
+    """Hard-link a file, copying it where links are not supported"""
+    try:
+        os.link(source, target)
+    except OSError:
+        # copy2 keeps the mtime, which the frame index freshness check relies on
+        shutil.copy2(source, target)
+
+
+def lookup(key: str) -> Optional[Dict[str, Any]]:
+    """Metadata of the cached results for a key, or None on a miss"""
+    meta_path = Path(RESULTS_DIR) / key / META_FILE
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def store(key: str, output_dir: Path, content_hash: str, video_id: str, fingerprint: Dict[str, Any]) -> bool:
+    """Add the results of a finished run to the cache.
+
+    The entry is built in a temporary directory and renamed into place, so
+    a lookup only ever sees complete entries. Returns False if the key is
+    already cached.
+    """
+    entry_dir = Path(RESULTS_DIR) / key
+    if entry_dir.exists():
+        return False
+
+    files = [name for name in RESULT_FILES if (output_dir / name).exists()]
+    tmp_dir = Path(RESULTS_DIR) / f".{key}.{uuid.uuid4().hex}.tmp"
+    tmp_dir.mkdir(parents=True)
+    try:
+        for name in files:
+            _link(output_dir / name, tmp_dir / name)
+        with open(tmp_dir / META_FILE, "w") as f:
+            json.dump({
+                "content_hash": content_hash,
+                "video_id": video_id,
+                "files": files,
+                "fingerprint": fingerprint
+            }, f, indent=2)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Another worker stored the same key first
+        if entry_dir.exists():
+            return False
+        raise
+    return True
+
+
+def restore(key: str, output_dir: Path, video_path: str, fingerprint: Dict[str, Any]) -> bool:
+    """Link cached results into a video's output directory.
+
+    Only an entry stored under the same fingerprint is used. Returns False
+    on a cache miss, in which case the video has to be processed; any
+    files linked before a miss are replaced by that run.
+    """
+    meta = lookup(key)
+    if meta is None or meta.get("fingerprint") != fingerprint:
+        return False
+
+    entry_dir = Path(RESULTS_DIR) / key
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for name in meta["files"]:
+        target = output_dir / name
+        if target.exists():
+            target.unlink()
+        try:
+            _link(entry_dir / name, target)
+        except FileNotFoundError:
+            # Entry removed or pruned by hand since the lookup
+            return False
+
+    _write_summary(output_dir, video_path, meta)
+    return True
+
+
+def _write_summary(output_dir: Path, video_path: str, meta: Dict[str, Any]):
+    summary = {
+        "video_path": video_path,
+        "reused_from": meta["video_id"],
+        "content_hash": meta["content_hash"],
+        "output_files": {name: str(output_dir / name) for name in meta["files"]}
+    }
+    with open(output_dir / SUMMARY_FILE, "w") as f:
+        json.dump(summary, f, indent=2)
@@ -0,0 +1,88 @@
+import numpy as np
+from typing import Optional, Tuple
+
+# A thumbnail pixel counts as changed when it moves by more than this many
+# grey levels; compression noise on a static shot stays well below it
+PIXEL_DIFFERENCE = 25
+
+# Fraction of changed thumbnail pixels above which a frame counts as changed
+# (0.002 is 5 of the 2304 pixels, about a hand moving a few centimetres)
+DEFAULT_MOTION_THRESHOLD = 0.002
+
+THUMBNAIL_SIZE = (64, 36)
+
+
+def thumbnail(frame: np.ndarray, size: Tuple[int, int] = THUMBNAIL_SIZE) -> np.ndarray:
+    """Small greyscale copy of a BGR frame for cheap motion estimates"""
+    import cv2
+    width, height = size
+    # Averaging a 4x oversampled grid is close to INTER_AREA on the full
+    # frame at a fraction of the cost
+    grid = cv2.resize(frame, (width * 4, height * 4), interpolation=cv2.INTER_NEAREST)
+    small = cv2.resize(grid, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+
+def changed_fraction(small: np.ndarray, reference: np.ndarray) -> float:
+    """Fraction of thumbnail pixels that changed between two thumbnails"""
+    return float((np.abs(small - reference) > PIXEL_DIFFERENCE).mean())
+
+
+class MotionSampler:
+    """Choose the frames an expensive detector runs on.
+
+    A frame counts as moving when more than the threshold fraction of its
+    thumbnail differs from the frame the detector last ran on, so slow
+    drift still adds up. Every frame on the stride grid is sampled from a
+    moving frame until hold frames pass without movement. In static
+    stretches frames are only sampled every max_gap frames. Callers carry
+    the last result forward to the frames that are skipped.
+
+    A threshold of 0 disables the motion test and samples every frame on
+    the stride grid.
+    """
+
+    def __init__(self, stride: int = 1, max_gap: int = 30, hold: int = 15,
+                 threshold: float = DEFAULT_MOTION_THRESHOLD):
+        self.stride = max(1, stride)
+        self.max_gap = max(self.stride, max_gap)
+        self.hold = hold
+        self.threshold = threshold
+        self.sampled = 0
+        self.skipped = 0
+        self.reset()
+
+    @property
+    def adaptive(self) -> bool:
+        return self.threshold > 0
+
+    def reset(self):
+        """Sample the next frame on the grid, as at the start of a video"""
+        self._reference: Optional[np.ndarray] = None
+        self._last_frame = 0
+        self._dense_until = -1
+
+    def on_grid(self, frame_num: int) -> bool:
+        return frame_num % self.stride == 0
+
+    def should_sample(self, frame_num: int, small: Optional[np.ndarray] = None) -> bool:
+        """Whether to run the detector on a frame, given its thumbnail() when adaptive"""
+        if not self.on_grid(frame_num):
+            return False
+
+        if self.adaptive:
+            if self._reference is not None and changed_fraction(small, self._reference) > self.threshold:
+                self._dense_until = frame_num + self.hold
+            due = (
+                self._reference is None
+                or frame_num < self._dense_until
+                or frame_num - self._last_frame >= self.max_gap
+            )
+            if not due:
+                self.skipped += 1
+                return False
+            self._reference = small
+            self._last_frame = frame_num
+
+        self.sampled += 1
+        return True
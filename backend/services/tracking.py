@@ -0,0 +1,149 @@
+import numpy as np
+from typing import Dict, List, Any, Tuple
+
+from services.pose_store import frame_number, frame_key
+
+# Minimum overlap between a track's predicted box and a detection to match them
+IOU_THRESHOLD = 0.3
+
+# A track unmatched for this many frames is ended; boxes are only
+# interpolated across gaps up to this long
+MAX_AGE = 30
+
+# Weight of the newest observation in a track's velocity estimate
+VELOCITY_SMOOTHING = 0.5
+
+BBOX_DECIMALS = 2
+
+
+def iou_matrix(boxes: np.ndarray, others: np.ndarray) -> np.ndarray:
+    """Intersection over union of every [x1, y1, x2, y2] box against every other box"""
+    top_left = np.maximum(boxes[:, None, :2], others[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], others[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    other_area = np.prod(others[:, 2:] - others[:, :2], axis=1)
+    union = area[:, None] + other_area[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class Track:
+    """One object followed across frames, with a constant-velocity box model"""
+
+    def __init__(self, track_id: int, label: str, frame: int, bbox: np.ndarray):
+        self.track_id = track_id
+        self.label = label
+        self.last_frame = frame
+        self.bbox = bbox
+        self.velocity = np.zeros(4)
+
+    def predict(self, frame: int) -> np.ndarray:
+        return self.bbox + self.velocity * (frame - self.last_frame)
+
+    def update(self, frame: int, bbox: np.ndarray):
+        velocity = (bbox - self.bbox) / max(1, frame - self.last_frame)
+        self.velocity = VELOCITY_SMOOTHING * velocity + (1 - VELOCITY_SMOOTHING) * self.velocity
+        self.bbox = bbox
+        self.last_frame = frame
+
+
+class IoUTracker:
+    """Associate detections across frames into tracks with persistent ids.
+
+    Detections are matched greedily, highest IoU first, to the boxes that
+    live tracks of the same label predict for the frame. The velocity in
+    the prediction keeps moving objects matched across the frames the
+    detector skipped.
+    """
+
+    def __init__(self, iou_threshold: float = IOU_THRESHOLD, max_age: int = MAX_AGE):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.tracks: List[Track] = []
+        self._next_id = 1
+
+    def update(self, frame: int, detections: List[Dict[str, Any]]) -> List[int]:
+        """Match one frame's detections to tracks and return their track ids"""
+        self.tracks = [t for t in self.tracks if frame - t.last_frame <= self.max_age]
+        if not detections:
+            return []
+
+        boxes = np.array([d['bbox'] for d in detections], dtype=np.float64)
+        track_ids = [0] * len(detections)
+
+        if self.tracks:
+            predicted = np.array([t.predict(frame) for t in self.tracks])
+            scores = iou_matrix(predicted, boxes)
+            labels = np.array([d['label'] for d in detections])
+            scores[np.array([t.label for t in self.tracks])[:, None] != labels[None, :]] = 0
+
+            used_tracks, used_detections = set(), set()
+            for flat in np.argsort(scores, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, scores.shape)
+                if scores[t, d] < self.iou_threshold:
+                    break
+                if t in used_tracks or d in used_detections:
+                    continue
+                used_tracks.add(t)
+                used_detections.add(d)
+                self.tracks[t].update(frame, boxes[d])
+                track_ids[d] = self.tracks[t].track_id
+
+        for d, detection in enumerate(detections):
+            if not track_ids[d]:
+                track = Track(self._next_id, detection['label'], frame, boxes[d])
+                self._next_id += 1
+                self.tracks.append(track)
+                track_ids[d] = track.track_id
+
+        return track_ids
+
+
+def track_objects(objects_data: Dict[str, List[Dict[str, Any]]],
+                  max_age: int = MAX_AGE) -> Dict[str, List[Dict[str, Any]]]:
+    """Give detections persistent track ids and fill the frames between them.
+
+    Detections keep their boxes and gain a track_id. In the frames between
+    two sightings of a track, at most max_age apart, its box and confidence
+    are interpolated linearly, so every frame gets the objects the detector
+    would most likely have found there.
+    """
+    tracker = IoUTracker(max_age=max_age)
+    frames = sorted((frame_number(key), key) for key in objects_data)
+
+    dense: Dict[int, List[Dict[str, Any]]] = {}
+    # track_id -> (frame, detection) of its last sighting
+    last_seen: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+
+    for frame, key in frames:
+        detections = [dict(d) for d in objects_data[key]]
+        dense.setdefault(frame, []).extend(detections)
+
+        for detection, track_id in zip(detections, tracker.update(frame, detections)):
+            detection['track_id'] = track_id
+            if track_id in last_seen:
+                _interpolate(dense, *last_seen[track_id], frame, detection)
+            last_seen[track_id] = (frame, detection)
+
+    return {frame_key(frame): dense[frame] for frame in sorted(dense)}
+
+
+def _interpolate(dense: Dict[int, List[Dict[str, Any]]], start: int, first: Dict[str, Any],
+                 end: int, last: Dict[str, Any]):
+    if end - start < 2:
+        return
+
+    steps = np.arange(1, end - start)[:, None] / (end - start)
+    boxes = np.round(
+        np.asarray(first['bbox']) + steps * (np.asarray(last['bbox']) - np.asarray(first['bbox'])),
+        BBOX_DECIMALS
+    ).tolist()
+    confidences = (first['confidence'] + steps[:, 0] * (last['confidence'] - first['confidence'])).tolist()
+
+    for offset, (bbox, confidence) in enumerate(zip(boxes, confidences), start=1):
+        dense.setdefault(start + offset, []).append({
+            'label': first['label'],
+            'bbox': bbox,
+            'confidence': round(confidence, 4),
+            'track_id': first['track_id']
+        })
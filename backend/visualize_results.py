@@ -1,207 +1,192 @@
 #!/usr/bin/env python3
 """
 Visualize ML processing results from JSON output files
+
+Usage:
+    python visualize_results.py --video video.mp4 --output output_dir [--save annotated.mp4]
+        [--frames START:END] [--workers N]
+
+With --save and several workers, the video is split into segments that are
+rendered in parallel and joined with ffmpeg without re-encoding.
 """
 
 import json
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
 import cv2
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import argparse
 
+from services.pose_store import PoseStore
+from services.frames import PrefetchDecoder
+from services.annotation_cache import load_frame, iter_frames
+from services.overlay import (
+    draw_pose_keypoints, draw_objects, draw_actions, draw_frame_number, render_overlay
+)
+
+# Segments shorter than this are not worth a process of their own
+MIN_SEGMENT_FRAMES = 150
+
 def load_json_file(file_path):
     """Load JSON data from file"""
     with open(file_path, 'r') as f:
         return json.load(f)
 
-def draw_pose_keypoints(frame, pose_data, frame_num):
-    """Draw pose keypoints on frame"""
-    frame_key = f"frame_{frame_num:03d}"
-    if frame_key not in pose_data:
-        return frame
-    
-    keypoints_dict = pose_data[frame_key].get('keypoints', {})
-    
-    # Convert keypoints dict to list for drawing
-    keypoint_coords = {}
-    
-    # Draw keypoints
-    for name, coords in keypoints_dict.items():
-        if len(coords) >= 2:
-            x = int(coords[0])
-            y = int(coords[1])
-            keypoint_coords[name] = (x, y)
-            
-            # Draw circle for keypoint
-            cv2.circle(frame, (x, y), 5, (0, 255, 0), -1)
-            
-            # Draw label (shortened to first 5 chars)
-            label = name.replace('_', ' ')[:5]
-            cv2.putText(frame, label, (x+5, y-5), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.3, (0, 255, 0), 1)
-    
-    # Draw connections between keypoints
-    connections = [
-        ("left_shoulder", "right_shoulder"),
-        ("left_shoulder", "left_elbow"),
-        ("left_elbow", "left_wrist"),
-        ("right_shoulder", "right_elbow"),
-        ("right_elbow", "right_wrist"),
-        ("left_shoulder", "left_hip"),
-        ("right_shoulder", "right_hip"),
-        ("left_hip", "right_hip"),
-        ("left_hip", "left_knee"),
-        ("left_knee", "left_ankle"),
-        ("right_hip", "right_knee"),
-        ("right_knee", "right_ankle"),
-    ]
-    
-    for conn in connections:
-        if conn[0] in keypoint_coords and conn[1] in keypoint_coords:
-            pt1 = keypoint_coords[conn[0]]
-            pt2 = keypoint_coords[conn[1]]
-            cv2.line(frame, pt1, pt2, (0, 255, 0), 2)
-    
-    return frame
+def parse_frames(value):
+    """Parse a START:END frame range, END exclusive; either side may be left out"""
+    first, _, last = value.partition(":")
+    try:
+        return (int(first) if first else 0, int(last) if last else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid frame range: {value} (expected START:END)")
 
-def draw_objects(frame, objects_data, frame_num):
-    """Draw object bounding boxes on frame"""
-    frame_key = f"frame_{frame_num:03d}"
-    if frame_key not in objects_data:
-        return frame
+def render_segment(video_path, output_dir, segment_path, start, end, fps, size):
+    """Render frames [start, end) with their annotations into a video file"""
+    cap = cv2.VideoCapture(str(video_path))
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    out = cv2.VideoWriter(str(segment_path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    
+    written = 0
+    try:
+        # Decoded ahead of the drawing; frames are drawn on in place, which is
+        # safe because the decoder only reuses a buffer once the next frame is requested
+        decoder = PrefetchDecoder(cap, start_frame=start, count=end - start)
+        for (frame_num, frame), annotations in zip(decoder, iter_frames(output_dir, start, end)):
+            render_overlay(frame, annotations)
+            out.write(frame)
+            written += 1
+    finally:
+        out.release()
+        cap.release()
     
-    objects = objects_data[frame_key]
+    return written
+
+def plan_segments(start, end, workers):
+    """Split [start, end) into up to one segment per worker"""
+    count = max(1, min(workers, (end - start) // MIN_SEGMENT_FRAMES))
+    bounds = [start + (end - start) * i // count for i in range(count + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def concat_segments(segment_paths, output_video):
+    """Join segment files into one video with ffmpeg, copying the streams"""
+    list_path = Path(segment_paths[0]).parent / "segments.txt"
+    list_path.write_text("".join(f"file '{Path(path).resolve()}'\n" for path in segment_paths))
+    subprocess.run(
+        ['ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', str(list_path),
+         '-c', 'copy', str(output_video)],
+        check=True
+    )
+
+def save_video(video_path, output_dir, output_video, frames=(0, None), workers=1):
+    """Render an annotated copy of a video, or of a frame range of it"""
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
     
-    for obj in objects:
-        bbox = obj['bbox']
-        x1, y1, x2, y2 = map(int, bbox)
-        
-        # Draw bounding box
-        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-        
-        # Draw label with confidence
-        label = f"{obj['label']}: {obj['confidence']:.2f}"
-        cv2.putText(frame, label, (x1, y1-10), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+    start = max(0, frames[0])
+    end = total_frames if frames[1] is None else min(frames[1], total_frames)
+    if end <= start:
+        print(f"No frames to render in {start}:{end} (video has {total_frames})")
+        return
     
-    return frame
-
-def draw_actions(frame, actions_data, frame_num):
-    """Draw action labels on frame"""
-    # Find active actions for this frame
-    active_actions = []
-    for action in actions_data:
-        if action['start_frame'] <= frame_num <= action['end_frame']:
-            active_actions.append(action)
-    
-    # Draw action labels
-    y_offset = 30
-    for action in active_actions:
-        label = f"Action: {action['label']} ({action['confidence']:.2f})"
-        cv2.putText(frame, label, (10, y_offset), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-        y_offset += 30
-    
-    return frame
+    # Build the sidecar indexes once here, not concurrently in every worker
+    load_frame(output_dir, start)
+    
+    segments = plan_segments(start, end, workers)
+    if len(segments) > 1 and shutil.which('ffmpeg') is None:
+        print("ffmpeg not found; rendering in a single process")
+        segments = [(start, end)]
+    
+    print(f"Rendering frames {start}-{end - 1} in {len(segments)} segment(s)...")
+    
+    if len(segments) == 1:
+        render_segment(video_path, output_dir, output_video, start, end, fps, size)
+    else:
+        with tempfile.TemporaryDirectory(dir=Path(output_video).resolve().parent) as tmp_dir:
+            segment_paths = [Path(tmp_dir) / f"segment_{i:04d}.mp4" for i in range(len(segments))]
+            
+            # Spawned so workers do not inherit the decoder threads of this process
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [
+                    pool.submit(render_segment, video_path, output_dir, path, seg_start, seg_end, fps, size)
+                    for path, (seg_start, seg_end) in zip(segment_paths, segments)
+                ]
+                for path, (seg_start, seg_end), future in zip(segment_paths, segments, futures):
+                    future.result()
+                    print(f"  Rendered frames {seg_start}-{seg_end - 1}")
+            
+            concat_segments(segment_paths, output_video)
+    
+    print(f"Saved annotated video to: {output_video}")
 
-def visualize_video(video_path, output_dir, output_video=None):
+def visualize_video(video_path, output_dir, output_video=None, frames=(0, None), workers=1):
     """Visualize ML processing results on video"""
     
+    if output_video:
+        save_video(video_path, output_dir, output_video, frames, workers)
+        return
+    
     # Load JSON data
-    pose_file = output_dir / "pose.json"
+    pose_store = PoseStore.open(output_dir)
     objects_file = output_dir / "objects.json"
     actions_file = output_dir / "actions.json"
     
-    pose_data = load_json_file(pose_file) if pose_file.exists() else {}
+    pose_data = pose_store.to_dict() if pose_store is not None else {}
     objects_data = load_json_file(objects_file) if objects_file.exists() else {}
     actions_data = load_json_file(actions_file) if actions_file.exists() else []
     
     # Open video
     cap = cv2.VideoCapture(str(video_path))
+    start, end = frames
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
     
-    if output_video:
-        # Setup video writer
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_video), fourcc, fps, (width, height))
+    # Interactive display mode
+    frame_num = start
+    print("Press 'q' to quit, 'space' to pause/resume")
+    paused = False
+    
+    while True:
+        if not paused:
+            ret, frame = cap.read()
+            if not ret or (end is not None and frame_num >= end):
+                print("End of video or restarting...")
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                frame_num = start
+                continue
         
-        # Process all frames for output video
-        frame_num = 0
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Create display frame
+        display_frame = frame.copy()
         
-        print(f"Processing {total_frames} frames...")
+        # Draw annotations
+        display_frame = draw_pose_keypoints(display_frame, pose_data, frame_num)
+        display_frame = draw_objects(display_frame, objects_data, frame_num)
+        display_frame = draw_actions(display_frame, actions_data, frame_num)
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Create display frame
-            display_frame = frame.copy()
-            
-            # Draw annotations
-            display_frame = draw_pose_keypoints(display_frame, pose_data, frame_num)
-            display_frame = draw_objects(display_frame, objects_data, frame_num)
-            display_frame = draw_actions(display_frame, actions_data, frame_num)
-            
-            # Add frame number
-            cv2.putText(display_frame, f"Frame: {frame_num}", (10, frame.shape[0]-10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            # Write to output video
-            out.write(display_frame)
-            
-            if frame_num % 10 == 0:
-                print(f"  Processed frame {frame_num}/{total_frames}")
-            
-            frame_num += 1
+        # Add frame number
+        display_frame = draw_frame_number(display_frame, frame_num)
         
-        out.release()
-        print(f"Saved annotated video to: {output_video}")
-    
-    else:
-        # Interactive display mode
-        frame_num = 0
-        print("Press 'q' to quit, 'space' to pause/resume")
-        paused = False
+        # Display frame
+        cv2.imshow("ML Processing Results", display_frame)
         
-        while True:
-            if not paused:
-                ret, frame = cap.read()
-                if not ret:
-                    print("End of video or restarting...")
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                    frame_num = 0
-                    continue
-            
-            # Create display frame
-            display_frame = frame.copy()
-            
-            # Draw annotations
-            display_frame = draw_pose_keypoints(display_frame, pose_data, frame_num)
-            display_frame = draw_objects(display_frame, objects_data, frame_num)
-            display_frame = draw_actions(display_frame, actions_data, frame_num)
-            
-            # Add frame number
-            cv2.putText(display_frame, f"Frame: {frame_num}", (10, frame.shape[0]-10),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            # Display frame
-            cv2.imshow("ML Processing Results", display_frame)
-            
-            # Handle key press
-            key = cv2.waitKey(30 if not paused else 0) & 0xFF
-            if key == ord('q'):
-                break
-            elif key == ord(' '):
-                paused = not paused
-            
-            if not paused:
-                frame_num += 1
+        # Handle key press
+        key = cv2.waitKey(30 if not paused else 0) & 0xFF
+        if key == ord('q'):
+            break
+        elif key == ord(' '):
+            paused = not paused
         
-        cv2.destroyAllWindows()
+        if not paused:
+            frame_num += 1
+    
+    cv2.destroyAllWindows()
     
     # Cleanup
     cap.release()
@@ -211,6 +196,10 @@ def main():
     parser.add_argument("--video", required=True, help="Path to input video")
     parser.add_argument("--output", required=True, help="Directory containing JSON output files")
     parser.add_argument("--save", help="Path to save annotated video (optional)")
+    parser.add_argument("--frames", type=parse_frames, default=(0, None),
+                        help="Frame range START:END to visualize, END exclusive (default: all)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes that render segments of the saved video in parallel (default: 1)")
     
     args = parser.parse_args()
     
@@ -230,7 +219,7 @@ def main():
     print(f"Visualizing results from {output_dir}")
     print(f"Video: {video_path}")
     
-    visualize_video(video_path, output_dir, output_video)
+    visualize_video(video_path, output_dir, output_video, args.frames, max(1, args.workers))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
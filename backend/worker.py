@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Video Processing Worker Pool
+============================
+Runs worker processes that take jobs from the persistent job queue
+(data/jobs.db) and process them outside the API process. Jobs survive
+restarts of both the API and the workers: a job whose worker stops sending
+heartbeats is put back in the queue and picked up again.
+
+Each worker loads the ML models once when it starts and keeps them warm,
+so a job does not pay for imports and model loading.
+
+Usage:
+    python worker.py [--workers 4] [--video-workers 8] [--db data/jobs.db]
+        [--backend onnxruntime --model yolov8n.onnx] [--threads 2]
+
+Run it from the backend directory, next to main.py.
+"""
+
+import os
+import time
+import signal
+import socket
+import argparse
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from services.job_queue import JobQueue, DEFAULT_DB_PATH, MAX_ATTEMPTS
+from services.dataset_export import write_dataset
+from services.inference import BACKENDS, DEFAULT_BACKEND
+from services import result_cache
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 1.0
+
+# Processes each job splits its video across; set per worker by worker_loop
+video_workers = 1
+
+# backend, model_path and threads of the object detector; set by worker_loop
+detector_options: Dict[str, Any] = {}
+
+# Models loaded once per worker process and reused by every job it runs
+models: Dict[str, Any] = {}
+
+# Package versions, detector settings and pipeline code the cached results
+# of this worker are keyed by; set by load_models
+fingerprint: Dict[str, Any] = {}
+
+
+def load_models():
+    """Load the ML models, and the chunk processes if videos are split"""
+    # Imported here so the supervisor process never loads the ML libraries
+    import process_video
+
+    started = time.monotonic()
+    models["pose"] = process_video.PoseExtractor()
+    models["objects"] = process_video.ObjectDetector(**detector_options)
+    if video_workers > 1:
+        models["executor"] = process_video.chunk_executor(video_workers, detector_options=models["objects"].options)
+    fingerprint.update(result_cache.pipeline_fingerprint(
+        {**models["objects"].options, "threads": detector_options.get("threads")}
+    ))
+    logger.info(f"Models loaded in {time.monotonic() - started:.1f}s")
+
+
+def process_video_job(job: Dict[str, Any], queue: JobQueue):
+    """Run the ML pipeline for an uploaded video with the warm models.
+
+    There is no time limit: the pipeline checkpoints finished chunks, so a
+    retried job resumes where the previous attempt stopped.
+    """
+    import process_video
+
+    video_id = job["id"]
+    video_path = job["payload"]["video_path"]
+    content_hash = job["payload"].get("content_hash")
+    key = result_cache.result_key(content_hash, fingerprint) if content_hash else None
+
+    # Create output directory
+    output_dir = Path(f"data/{video_id}")
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # The same file was already processed by this pipeline
+    if key is not None and result_cache.restore(key, output_dir, video_path, fingerprint):
+        logger.info(f"Reused cached results for video {video_id}")
+        return
+
+    logger.info(f"Running ML processing for video {video_id}")
+    processor = process_video.VideoProcessor(
+        video_path, str(output_dir),
+        workers=video_workers,
+        progress_callback=lambda progress: queue.update_progress(video_id, progress),
+        pose_extractor=models.get("pose"),
+        object_detector=models.get("objects"),
+        executor=models.get("executor")
+    )
+    if not processor.process():
+        if "executor" in models:
+            # A chunk process that died leaves the pool unusable; start over
+            models["executor"].shutdown(wait=True, cancel_futures=True)
+            models["executor"] = process_video.chunk_executor(
+                video_workers, detector_options=models["objects"].options
+            )
+        raise RuntimeError(f"ML processing failed: {processor.error}")
+    logger.info(f"ML processing completed for video {video_id}")
+
+    # Let later uploads of the same file reuse these outputs
+    if key is not None:
+        try:
+            result_cache.store(key, output_dir, content_hash, video_id, fingerprint)
+        except OSError as e:
+            # The results themselves are complete; only the reuse is lost
+            logger.warning(f"Failed to cache results of video {video_id}: {e}")
+
+
+def export_dataset_job(job: Dict[str, Any], queue: JobQueue):
+    """Write the shards of a bulk dataset export, resuming after finished shards"""
+    payload = job["payload"]
+    logger.info(f"Exporting {len(payload['video_ids'])} videos for export {job['id']}")
+    write_dataset(
+        job["id"],
+        payload["video_ids"],
+        format=payload["format"],
+        videos_per_shard=payload["videos_per_shard"],
+        progress=lambda progress: queue.update_progress(job["id"], progress)
+    )
+
+
+# Job handlers by job kind
+HANDLERS = {
+    "process": process_video_job,
+    "export": export_dataset_job,
+}
+
+
+def _heartbeat_loop(queue: JobQueue, job_id: str, stop: threading.Event):
+    while not stop.wait(HEARTBEAT_SECONDS):
+        queue.heartbeat(job_id)
+
+
+def run_job(queue: JobQueue, job: Dict[str, Any]):
+    """Run one claimed job and record its outcome"""
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat_loop, args=(queue, job["id"], stop), daemon=True)
+    heartbeat.start()
+
+    try:
+        HANDLERS[job["kind"]](job, queue)
+        queue.complete(job["id"])
+        logger.info(f"Job {job['id']} completed")
+    except Exception as e:
+        if job["attempts"] < MAX_ATTEMPTS:
+            logger.warning(f"Job {job['id']} failed, will retry: {e}")
+            queue.retry(job["id"], str(e))
+        else:
+            logger.error(f"Job {job['id']} failed: {e}")
+            queue.fail(job["id"], str(e))
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def worker_loop(db_path: str, stop: "multiprocessing.synchronize.Event", processes_per_video: int = 1,
+                options: Optional[Dict[str, Any]] = None):
+    """Claim and run jobs until asked to stop"""
+    global video_workers, detector_options
+    video_workers = processes_per_video
+    detector_options = options or {}
+
+    # The supervisor handles Ctrl+C; workers finish their current job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    queue = JobQueue(db_path)
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    load_models()
+    logger.info(f"Worker {worker_name} started")
+
+    while not stop.is_set():
+        job = queue.claim(worker_name, kinds=list(HANDLERS))
+        if job is None:
+            stop.wait(POLL_SECONDS)
+            continue
+        logger.info(f"Claimed {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        run_job(queue, job)
+
+    if "executor" in models:
+        models["executor"].shutdown(wait=True)
+
+
+def run_pool(num_workers: int, db_path: str = DEFAULT_DB_PATH, processes_per_video: int = 1,
+             options: Optional[Dict[str, Any]] = None):
+    """Start the worker processes and keep them running"""
+    queue = JobQueue(db_path)
+    stop = multiprocessing.Event()
+
+    def start_worker(index: int) -> multiprocessing.Process:
+        process = multiprocessing.Process(
+            target=worker_loop, args=(db_path, stop, processes_per_video, options), name=f"worker-{index}"
+        )
+        process.start()
+        return process
+
+    workers = [start_worker(i) for i in range(num_workers)]
+
+    # Setting the shared event from a signal handler can deadlock with a
+    # wait on it in the same thread, so the handler only flips a local flag
+    shutdown_requested = threading.Event()
+
+    def shutdown(signum, frame):
+        shutdown_requested.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    while not shutdown_requested.is_set():
+        # Recover jobs from workers that died, in this pool or a previous run
+        requeued = queue.requeue_stale()
+        if requeued:
+            logger.info(f"Requeued {requeued} stale job(s)")
+
+        for i, process in enumerate(workers):
+            if not process.is_alive():
+                logger.warning(f"{process.name} exited with code {process.exitcode}, restarting")
+                workers[i] = start_worker(i)
+
+        shutdown_requested.wait(HEARTBEAT_SECONDS)
+
+    logger.info("Stopping workers after their current jobs...")
+    stop.set()
+    for process in workers:
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run video processing workers.')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=max(1, (os.cpu_count() or 2) // 2),
+        help='Number of worker processes (default: half the CPU cores)'
+    )
+    parser.add_argument(
+        '--db',
+        type=str,
+        default=DEFAULT_DB_PATH,
+        help=f'Path to the job queue database (default: {DEFAULT_DB_PATH})'
+    )
+    parser.add_argument(
+        '--video-workers',
+        type=int,
+        default=None,
+        help='Processes each video is split across (default: CPU cores / workers)'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help=f'Runtime for object detection; see export_model.py (default: {DEFAULT_BACKEND})'
+    )
+    parser.add_argument(
+        '--model',
+        type=str,
+        default=None,
+        help='YOLOv8 weights, or exported ONNX model for onnxruntime/openvino'
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=None,
+        help='Intra-op threads of the object detector of each worker (default: all cores)'
+    )
+    args = parser.parse_args()
+
+    # Split the cores between the jobs that can run at the same time
+    processes_per_video = args.video_workers or max(1, (os.cpu_count() or 1) // args.workers)
+    options = {'backend': args.backend, 'model_path': args.model, 'threads': args.threads}
+    run_pool(args.workers, args.db, processes_per_video, options)
+
+
+if __name__ == '__main__':
+    main()
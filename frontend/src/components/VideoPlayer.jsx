@@ -3,7 +3,7 @@ import React, { forwardRef, useEffect, useState } from 'react';
 const VideoPlayer = forwardRef(({ videoId, onFrameChange, isPlaying, setIsPlaying }, ref) => {
   const [currentTime, setCurrentTime] = useState(0);
   const [duration, setDuration] = useState(0);
-  const videoUrl = `http://localhost:8000/api/video/${videoId}/file`;
+  const videoUrl = `http://localhost:8000/api/video/${videoId}/proxy`;
   
   useEffect(() => {
     if (ref.current) {
@@ -5,7 +5,7 @@ const VideoViewer = ({ videoId, currentFrame, onFrameChange }) => {
   const [isPlaying, setIsPlaying] = useState(false);
   const [duration, setDuration] = useState(0);
   
-  const videoUrl = `http://localhost:8000/uploads/${videoId}.mp4`;
+  const videoUrl = `http://localhost:8000/api/video/${videoId}/proxy`;
   const fps = 30; // Assuming 30 fps
 
   useEffect(() => {
@@ -25,7 +25,7 @@ const DemoAnnotatePage = () => {
       const videoResponse = await fetch(`http://localhost:8000/api/videos/${videoId}`);
       if (videoResponse.ok) {
         const videoData = await videoResponse.json();
-        setVideoUrl(`http://localhost:8000${videoData.video_url}`);
+        setVideoUrl(`http://localhost:8000${videoData.proxy_url || videoData.video_url}`);
       }
     } catch (error) {
       console.error('Error fetching video:', error);
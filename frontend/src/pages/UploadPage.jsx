@@ -1,6 +1,22 @@
 import React, { useState, useCallback } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { uploadVideo, getProcessingStatus } from '../services/api';
+import { uploadVideo, getProcessingStatus, subscribeToProcessingEvents } from '../services/api';
+
+const formatProgress = (progress) => {
+  if (!progress || progress.percent == null) {
+    return 'Processing video with AI models...';
+  }
+  if (progress.stage === 'saving') {
+    return 'Saving results...';
+  }
+  let text = `Processing video with AI models... ${Math.round(progress.percent)}%`;
+  if (progress.eta_seconds != null) {
+    const minutes = Math.floor(progress.eta_seconds / 60);
+    const seconds = Math.round(progress.eta_seconds % 60);
+    text += ` (about ${minutes > 0 ? `${minutes}m ` : ''}${seconds}s left)`;
+  }
+  return text;
+};
 
 const UploadPage = () => {
   const navigate = useNavigate();
@@ -50,28 +66,37 @@ const UploadPage = () => {
     setProgress('Uploading video...');
     
     try {
-      const response = await uploadVideo(file);
+      const response = await uploadVideo(file, (fraction) => {
+        setProgress(`Uploading video... ${Math.round(fraction * 100)}%`);
+      });
       const videoId = response.video_id;
       
       setUploading(false);
       setProcessing(true);
       setProgress('Processing video with AI models...');
       
-      // Poll for processing status
+      const handleStatus = (status) => {
+        if (status.status === 'completed') {
+          setProgress('Processing complete!');
+          setTimeout(() => {
+            navigate(`/annotate/${videoId}`);
+          }, 1000);
+          return true;
+        }
+        if (status.status.startsWith('error')) {
+          setError(`Processing error: ${status.status}`);
+          setProcessing(false);
+          return true;
+        }
+        setProgress(formatProgress(status.progress));
+        return false;
+      };
+      
+      // Poll for processing status if the event stream is unavailable
       const checkStatus = async () => {
         try {
           const status = await getProcessingStatus(videoId);
-          
-          if (status.status === 'completed') {
-            setProgress('Processing complete!');
-            setTimeout(() => {
-              navigate(`/annotate/${videoId}`);
-            }, 1000);
-          } else if (status.status.startsWith('error')) {
-            setError(`Processing error: ${status.status}`);
-            setProcessing(false);
-          } else {
-            // Continue polling
+          if (!handleStatus(status)) {
             setTimeout(checkStatus, 2000);
           }
         } catch (err) {
@@ -80,7 +105,9 @@ const UploadPage = () => {
         }
       };
       
-      setTimeout(checkStatus, 2000);
+      subscribeToProcessingEvents(videoId, handleStatus, () => {
+        setTimeout(checkStatus, 2000);
+      });
       
     } catch (err) {
       setError('Failed to upload video. Please try again.');
@@ -10,16 +10,50 @@ const api = axios.create({
 });
 
 // Upload endpoints
-export const uploadVideo = async (file) => {
-  const formData = new FormData();
-  formData.append('video', file);
-  
-  const response = await api.post('/api/upload', formData, {
-    headers: {
-      'Content-Type': 'multipart/form-data',
-    },
+const UPLOAD_RETRIES = 5;
+
+const wait = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Sends the file in chunks through the resumable upload API. A failed chunk
+// is retried from the offset the server reports, so a dropped connection
+// only costs the chunk in flight. onProgress receives the fraction sent.
+export const uploadVideo = async (file, onProgress) => {
+  const { data: upload } = await api.post('/api/uploads', {
+    filename: file.name,
+    size: file.size,
   });
-  
+
+  let offset = upload.offset;
+  let failures = 0;
+  while (offset === null || offset < file.size) {
+    try {
+      if (offset === null) {
+        const { data } = await api.get(`/api/uploads/${upload.upload_id}`);
+        offset = data.offset;
+        continue;
+      }
+      const chunk = file.slice(offset, offset + upload.chunk_size);
+      const { data } = await api.put(`/api/uploads/${upload.upload_id}`, chunk, {
+        params: { offset },
+        headers: { 'Content-Type': 'application/octet-stream' },
+      });
+      offset = data.offset;
+      failures = 0;
+      if (onProgress) {
+        onProgress(offset / file.size);
+      }
+    } catch (err) {
+      failures += 1;
+      if (failures > UPLOAD_RETRIES) {
+        throw err;
+      }
+      // Ask the server where to continue before retrying
+      offset = null;
+      await wait(1000 * failures);
+    }
+  }
+
+  const response = await api.post(`/api/uploads/${upload.upload_id}/finalize`);
   return response.data;
 };
 
@@ -28,6 +62,33 @@ export const getProcessingStatus = async (videoId) => {
   return response.data;
 };
 
+// Streams status and progress updates until processing finishes.
+// Returns a function that closes the stream.
+export const subscribeToProcessingEvents = (videoId, onEvent, onError) => {
+  const source = new EventSource(`${API_URL}/api/video/${videoId}/events`);
+
+  source.addEventListener('progress', (e) => {
+    const event = JSON.parse(e.data);
+    onEvent(event);
+    if (event.status === 'completed' || event.status.startsWith('error')) {
+      source.close();
+    }
+  });
+
+  source.onerror = (err) => {
+    // The server closes the stream once processing finishes
+    if (source.readyState === EventSource.CLOSED) {
+      return;
+    }
+    source.close();
+    if (onError) {
+      onError(err);
+    }
+  };
+
+  return () => source.close();
+};
+
 export const getVideoInfo = async (videoId) => {
   const response = await api.get(`/api/video/${videoId}/info`);
   return response.data;
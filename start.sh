@@ -49,6 +49,11 @@ echo -e "${GREEN}✓ Starting FastAPI server on port 8000${NC}"
 uvicorn main:app --reload --port 8000 &
 BACKEND_PID=$!
 
+# Start video processing workers
+echo -e "${GREEN}✓ Starting video processing workers${NC}"
+python worker.py &
+WORKER_PID=$!
+
 # Start frontend
 echo -e "\n${YELLOW}Starting frontend...${NC}"
 cd ../frontend
@@ -77,6 +82,7 @@ echo "Press Ctrl+C to stop all servers"
 shutdown() {
     echo -e "\n${YELLOW}Shutting down HumanoSync...${NC}"
     kill $BACKEND_PID 2>/dev/null
+    kill $WORKER_PID 2>/dev/null
     kill $FRONTEND_PID 2>/dev/null
     echo -e "${GREEN}✓ Shutdown complete${NC}"
     exit 0